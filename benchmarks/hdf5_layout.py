@@ -0,0 +1,102 @@
+# Copyright (C) 2021 The InstanceLib Authors. All Rights Reserved.
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+"""Compare the chunk layouts and compression filters of
+:class:`~instancelib.instances.hdf5vector.HDF5VectorStorage`.
+
+For every setting, the script writes a random matrix, scans it with
+``matrices_chunker`` and reads random samples with ``get_matrix``.
+It reports the throughput of each operation and the file size.
+
+Usage::
+
+    python -m benchmarks.hdf5_layout --rows 100000 --dim 768
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from instancelib.instances.hdf5vector import HDF5VectorStorage
+
+SETTINGS: List[Tuple[str, Dict[str, Any]]] = [
+    ("h5py default", {}),
+    ("auto", {"chunks": "auto"}),
+    ("auto + 16 MiB cache", {"chunks": "auto", "chunk_cache_size": 2 ** 24}),
+    ("auto + lzf", {"chunks": "auto", "compression": "lzf"}),
+    ("auto + gzip(4) + shuffle",
+     {"chunks": "auto", "compression": "gzip", "compression_opts": 4, "shuffle": True}),
+]
+
+
+def run_setting(path: str, matrix: np.ndarray, batch_size: int,
+                n_samples: int, options: Dict[str, Any]) -> Dict[str, float]:
+    keys = list(range(matrix.shape[0]))
+    megabytes = matrix.nbytes / 2 ** 20
+    start = time.perf_counter()
+    with HDF5VectorStorage[int, np.float32](path, "w", access_rows=batch_size, **options) as storage:  # type: ignore
+        for offset in range(0, len(keys), 10 * batch_size):
+            stop = offset + 10 * batch_size
+            storage.add_bulk_matrix(keys[offset:stop], matrix[offset:stop])
+    write_time = time.perf_counter() - start
+
+    storage = HDF5VectorStorage[int, np.float32](path, session=True, access_rows=batch_size, **options)  # type: ignore
+    start = time.perf_counter()
+    for _ in storage.matrices_chunker(batch_size):
+        pass
+    scan_time = time.perf_counter() - start
+
+    sample = np.random.default_rng(0).choice(len(keys), n_samples, replace=False).tolist()
+    start = time.perf_counter()
+    for _ in storage.get_matrix_chunked(sample, batch_size):
+        pass
+    sample_time = time.perf_counter() - start
+    storage.close()
+    return {
+        "write MB/s": megabytes / write_time,
+        "scan MB/s": megabytes / scan_time,
+        "sample rows/s": n_samples / sample_time,
+        "size MB": os.path.getsize(path) / 2 ** 20,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--samples", type=int, default=5000)
+    args = parser.parse_args()
+
+    generator = np.random.default_rng(42)
+    # Embeddings are not uniformly random; rounding makes them compressible
+    matrix = np.round(generator.normal(size=(args.rows, args.dim)), 2).astype(np.float32)
+    folder = tempfile.mkdtemp()
+    print(f"{'setting':<28}{'write MB/s':>12}{'scan MB/s':>12}{'sample rows/s':>15}{'size MB':>10}")
+    for name, options in SETTINGS:
+        path = os.path.join(folder, "vectors.h5")
+        result = run_setting(path, matrix, args.batch_size, args.samples, options)
+        print(f"{name:<28}{result['write MB/s']:>12.1f}{result['scan MB/s']:>12.1f}"
+              f"{result['sample rows/s']:>15.0f}{result['size MB']:>10.1f}")
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# Copyright (C) 2021 The InstanceLib Authors. All Rights Reserved.
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+"""Compare the memory usage of the instance classes with a ``__dict__``
+and their ``__slots__`` variants.
+
+For every variant, the script builds a provider (or a list of table rows)
+with the same keys and texts, and measures the memory that is allocated
+while building it with :mod:`tracemalloc`. The texts and row dictionaries
+are created beforehand, so the numbers show the overhead of the
+instances and the provider itself.
+
+Usage::
+
+    python -m benchmarks.instance_memory --instances 1000000
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+from typing import Any, Callable, List, Sequence, Tuple
+
+from instancelib.instances.memory import DataPointProvider, SlottedDataPointProvider
+from instancelib.instances.tablebacked import table_instance_builder
+from instancelib.instances.text import SlottedTextInstanceProvider, TextInstanceProvider
+
+
+def measure(build: Callable[[], Any]) -> Tuple[int, float]:
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    duration = time.perf_counter() - start
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return allocated, duration
+
+
+def build_rows(keys: Sequence[int], rows: Sequence[Any], slotted: bool) -> Callable[[], List[Any]]:
+    builder = table_instance_builder("data", slotted=slotted)
+    return lambda: [builder(key, row, None) for key, row in zip(keys, rows)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--instances", type=int, default=1_000_000)
+    args = parser.parse_args()
+    keys = list(range(args.instances))
+    texts = [f"document {i}" for i in keys]
+    rows = [{"data": text} for text in texts]
+    variants = [
+        ("DataPointProvider", lambda: DataPointProvider.from_data_and_indices(keys, texts)),
+        ("SlottedDataPointProvider", lambda: SlottedDataPointProvider.from_data_and_indices(keys, texts)),
+        ("TextInstanceProvider", lambda: TextInstanceProvider.from_data_and_indices(keys, texts)),
+        ("SlottedTextInstanceProvider", lambda: SlottedTextInstanceProvider.from_data_and_indices(keys, texts)),
+        ("TableInstance rows", build_rows(keys, rows, False)),
+        ("SlottedTableInstance rows", build_rows(keys, rows, True)),
+    ]
+    print(f"{'variant':<30}{'bytes/instance':>16}{'total MiB':>12}{'build s':>10}")
+    for name, build in variants:
+        allocated, duration = measure(build)
+        print(f"{name:<30}{allocated / args.instances:>16.1f}"
+              f"{allocated / 2 ** 20:>12.1f}{duration:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
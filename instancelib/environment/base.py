@@ -181,6 +181,22 @@ class Environment(
         """
         self.all_instances.bulk_add_vectors(keys, vectors)
 
+    def add_matrix(self, keys: Sequence[KT], matrix: Any) -> None:
+        """This method adds the rows of a feature matrix as the vectors of
+        the instances associated with the keys in the first parameter.
+        Row `i` of `matrix` belongs to ``keys[i]``. Providers that keep their
+        vectors in a vector storage store the matrix without splitting it
+        into rows.
+
+        Parameters
+        ----------
+        keys : Sequence[KT]
+            A sequence of keys
+        matrix : Any
+            A dense array or a sparse matrix with a row for each key
+        """
+        self.all_instances.bulk_add_matrix(keys, matrix)
+
     def create(self, *args: Any, **kwargs: Any) -> InstanceType:
         """Create a new Instance
 
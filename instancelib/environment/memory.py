@@ -23,18 +23,26 @@ from typing import (
     Dict,
     Iterator,
     Mapping,
+    Optional,
+    Tuple,
     TypeVar,
     Any,
     Union,
 )
 from typing_extensions import Self
 
+import random
+
 from ..instances.base import Instance, InstanceProvider
+from ..instances.bitmap import BitmapBucketProvider
 from ..instances.memory import (
     MemoryBucketProvider,
     AbstractMemoryProvider,
 )
+from ..instances.interning import KeyInterner
+from ..instances.sharedvector import SharedMemoryVectorStorage, share_vectors
 from ..labels.base import LabelProvider
+from ..labels.interned import InternedLabelProvider
 from ..labels.memory import MemoryLabelProvider
 
 from .base import AbstractEnvironment
@@ -104,6 +112,10 @@ class AbstractMemoryEnvironment(
         str, InstanceProvider[InstanceType, KT, DT, VT, RT]
     ] = dict()
     """All user generated providers that were given a name"""
+    _interner: Optional[KeyInterner[Any]] = None
+    """The key interner, created on first use"""
+    _bitmap_buckets: bool = False
+    """Create :class:`~instancelib.instances.bitmap.BitmapBucketProvider` buckets"""
 
     def __contains__(self, __o: object) -> bool:
         return __o in self._named_providers
@@ -142,10 +154,82 @@ class AbstractMemoryEnvironment(
     def create_bucket(
         self, keys: Iterable[KT]
     ) -> InstanceProvider[InstanceType, KT, DT, VT, RT]:
+        if self._bitmap_buckets:
+            return BitmapBucketProvider[InstanceType, KT, DT, VT, RT](
+                self._dataset, keys, self.interner
+            )
         return MemoryBucketProvider[InstanceType, KT, DT, VT, RT](
             self._dataset, keys
         )
 
+    def _bitmap(
+        self, provider: Iterable[KT]
+    ) -> BitmapBucketProvider[InstanceType, KT, DT, VT, RT]:
+        if (
+            isinstance(provider, BitmapBucketProvider)
+            and provider.interner is self.interner
+        ):
+            return provider
+        keys = provider.key_list if isinstance(provider, InstanceProvider) else provider
+        return BitmapBucketProvider[InstanceType, KT, DT, VT, RT](
+            self._dataset, keys, self.interner
+        )
+
+    def train_test_split(
+        self,
+        source: InstanceProvider[InstanceType, KT, DT, VT, RT],
+        train_size: Union[float, int],
+    ) -> Tuple[
+        InstanceProvider[InstanceType, KT, DT, VT, RT],
+        InstanceProvider[InstanceType, KT, DT, VT, RT],
+    ]:
+        if not self._bitmap_buckets:
+            return super().train_test_split(source, train_size)
+        bucket = self._bitmap(source)
+        ids = bucket.ids()
+        if isinstance(train_size, float):
+            n_train_docs = round(train_size * len(ids))
+        else:
+            n_train_docs = train_size
+        # Seed from the random module, so random.seed() still makes splits reproducible
+        rng = np.random.default_rng(random.getrandbits(64))
+        train_ids = rng.choice(ids, n_train_docs, replace=False)
+        train = BitmapBucketProvider.from_ids(self._dataset, self.interner, train_ids)
+        return train, bucket.difference(train)
+
+    def combine(
+        self,
+        *providers: InstanceProvider[InstanceType, KT, DT, VT, RT],
+    ) -> InstanceProvider[InstanceType, KT, DT, VT, RT]:
+        if not self._bitmap_buckets or not providers:
+            return super().combine(*providers)
+        first, *rest = providers
+        return self._bitmap(first).union(*rest)
+
+    def get_subset_by_labels(
+        self,
+        provider: InstanceProvider[InstanceType, KT, DT, VT, RT],
+        *labels: LT,
+        labelprovider: Optional[LabelProvider[KT, LT]] = None,
+    ) -> InstanceProvider[InstanceType, KT, DT, VT, RT]:
+        l_provider = self.labels if labelprovider is None else labelprovider
+        if not (
+            self._bitmap_buckets
+            and isinstance(l_provider, InternedLabelProvider)
+            and l_provider.interner is self.interner
+        ):
+            return super().get_subset_by_labels(
+                provider, *labels, labelprovider=labelprovider
+            )
+        ids = np.unique(
+            np.concatenate(
+                [l_provider.ids_by_label(label) for label in labels]
+                + [np.zeros(0, dtype=np.int64)]
+            )
+        )
+        by_label = BitmapBucketProvider.from_ids(self._dataset, self.interner, ids)
+        return by_label.intersection(self._bitmap(provider))
+
     def create_empty_provider(
         self,
     ) -> InstanceProvider[InstanceType, KT, DT, VT, RT]:
@@ -162,6 +246,53 @@ class AbstractMemoryEnvironment(
         self._named_providers[name] = self.create_empty_provider()
         return self._named_providers[name]
 
+    @property
+    def interner(self) -> KeyInterner[KT]:
+        """The :class:`~instancelib.instances.interning.KeyInterner` that is
+        shared by the components of this environment. It is created on first
+        use from the keys of all instances; keys that are added later are
+        interned by the components that use them.
+
+        Returns
+        -------
+        KeyInterner[KT]
+            The interner
+        """
+        interner = self._interner
+        if interner is None:
+            interner = KeyInterner(self._dataset.key_list)
+            self._interner = interner
+        return interner
+
+    def intern_labels(self) -> InternedLabelProvider[KT, LT]:
+        """Replace the label provider of this environment with an
+        :class:`~instancelib.labels.interned.InternedLabelProvider`
+        that uses the :attr:`interner` of the environment
+
+        Returns
+        -------
+        InternedLabelProvider[KT, LT]
+            The new label provider
+        """
+        if not isinstance(self._labelprovider, InternedLabelProvider):
+            self._labelprovider = InternedLabelProvider.from_provider(
+                self._labelprovider, self.interner)
+        return self._labelprovider
+
+    def share_vectors(self) -> SharedMemoryVectorStorage[KT, Any]:
+        """Move the vectors of all instances to shared memory. Afterwards,
+        pickling the environment (e.g., to send it to the workers of a
+        :class:`multiprocessing.Pool`) no longer copies the vectors; the
+        workers attach to the shared memory instead.
+
+        Returns
+        -------
+        SharedMemoryVectorStorage[KT, Any]
+            The storage that owns the shared memory. Keep it alive while
+            the workers run and close it afterwards.
+        """
+        return share_vectors(self._dataset)
+
 
 class MemoryEnvironment(
     AbstractMemoryEnvironment[InstanceType, KT, DT, VT, RT, LT],
@@ -233,6 +364,7 @@ class MemoryEnvironment(
         self,
         dataset: InstanceProvider[InstanceType, KT, DT, VT, RT],
         labelprovider: LabelProvider[KT, LT],
+        bitmap_buckets: bool = False,
     ):
         """[summary]
 
@@ -242,11 +374,15 @@ class MemoryEnvironment(
             [description]
         labelprovider : MemoryLabelProvider[KT, LT]
             [description]
+        bitmap_buckets : bool, optional
+            Store buckets as masks over the ids of the :attr:`interner`
+            (:class:`~instancelib.instances.bitmap.BitmapBucketProvider`),
+            which makes splits, combinations and label subsets vectorized,
+            by default False
         """
         self._dataset = dataset
-        self._public_dataset = MemoryBucketProvider[
-            InstanceType, KT, DT, VT, RT
-        ](dataset, dataset.key_list)
+        self._bitmap_buckets = bitmap_buckets
+        self._public_dataset = self.create_bucket(dataset.key_list)
         self._labelprovider = labelprovider
         self._named_providers = dict()
 
@@ -21,7 +21,8 @@ from typing_extensions import Self
 
 from instancelib.instances.base import InstanceProvider
 
-from ..instances.text import TextInstanceProvider, MemoryTextInstance
+from ..instances.text import (MemoryTextInstance, SlottedTextInstanceProvider,
+                              TextInstanceProvider)
 from ..labels.memory import MemoryLabelProvider
 from .memory import MemoryEnvironment
 
@@ -44,8 +45,10 @@ class TextEnvironment(
         data: Sequence[str],
         ground_truth: Sequence[Iterable[LT]],
         vectors: Optional[Sequence[VT]],
+        slotted: bool = False,
     ) -> Self:
-        dataset = TextInstanceProvider[KT, VT].from_data_and_indices(
+        provider_class = SlottedTextInstanceProvider if slotted else TextInstanceProvider
+        dataset = provider_class[KT, VT].from_data_and_indices(
             indices, data, vectors
         )
         truth = MemoryLabelProvider[Union[KT, UUID], LT].from_data(
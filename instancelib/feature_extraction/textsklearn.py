@@ -19,6 +19,8 @@ from __future__ import annotations
 from typing import Sequence, Optional, Any
 
 import numpy as np
+import numpy.typing as npt
+import scipy.sparse as sp  # type: ignore
 
 from sklearn.base import BaseEstimator  # type: ignore
 from sklearn.exceptions import NotFittedError  # type: ignore
@@ -28,7 +30,23 @@ from .base import BaseVectorizer
 
 
 class SklearnVectorizer(BaseVectorizer[str], SaveableInnerModel):
+    """Wraps a scikit-learn vectorizer (e.g., a `TfidfVectorizer`)
+
+    Parameters
+    ----------
+    vectorizer : BaseEstimator
+        The scikit-learn vectorizer
+    storage_location : Optional[str], optional
+        The location where the model can be stored, by default None
+    filename : Optional[str], optional
+        The filename of the stored model, by default None
+    sparse : bool, optional
+        Return the output of the vectorizer as a sparse CSR matrix instead
+        of a dense array, by default False. For large vocabularies, dense
+        output does not fit in memory.
+    """
     innermodel: BaseEstimator
+    sparse: bool = False
     _name = "SklearnVectorizer"
 
     def __init__(
@@ -36,11 +54,13 @@ class SklearnVectorizer(BaseVectorizer[str], SaveableInnerModel):
         vectorizer: BaseEstimator,
         storage_location: Optional[str] = None,
         filename: Optional[str] = None,
+        sparse: bool = False,
     ) -> None:
         BaseVectorizer.__init__(self)  # type: ignore
         SaveableInnerModel.__init__(
             self, vectorizer, storage_location, filename
         )
+        self.sparse = sparse
 
     @SaveableInnerModel.load_model_fallback
     def fit(self, x_data: Sequence[str], **kwargs: Any) -> SklearnVectorizer:
@@ -51,8 +71,12 @@ class SklearnVectorizer(BaseVectorizer[str], SaveableInnerModel):
     @SaveableInnerModel.load_model_fallback
     def transform(self, x_data: Sequence[str], **kwargs: Any) -> npt.NDArray[Any]:  # type: ignore
         if self.fitted:
-            # TODO Check for performance issues with .toarray()
-            return self.innermodel.transform(x_data).toarray()  # type: ignore
+            matrix = self.innermodel.transform(x_data)  # type: ignore
+            if self.sparse:
+                return sp.csr_matrix(matrix)  # type: ignore
+            if sp.issparse(matrix):
+                return matrix.toarray()  # type: ignore
+            return matrix  # type: ignore
         raise NotFittedError
 
     def fit_transform(self, x_data: Sequence[str], **kwargs: Any) -> npt.NDArray[Any]:  # type: ignore
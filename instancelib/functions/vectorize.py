@@ -22,6 +22,7 @@ from ..environment import AbstractEnvironment
 from ..feature_extraction import BaseVectorizer
 from ..instances import Instance, InstanceProvider
 from ..typehints.typevars import KT
+from ..utils.chunks import prefetch
 from ..utils.numpy import matrix_tuple_to_vectors
 from ..utils.to_key import to_key
 
@@ -54,13 +55,32 @@ def vectorize_provider(
         Any,
     ],
     chunk_size: int = 200,
+    prefetch_chunks: int = 0,
 ) -> Iterator[Tuple[Sequence[KT], Sequence[npt.NDArray[Any]]]]:
-    instance_chunks = provider.instance_chunker(chunk_size)
+    for keys, matrix in vectorize_provider_matrix(
+        vectorizer, provider, chunk_size, prefetch_chunks
+    ):
+        ret_keys, vectors = matrix_tuple_to_vectors(keys, matrix)
+        yield ret_keys, vectors
+
+
+def vectorize_provider_matrix(
+    vectorizer: BaseVectorizer[Instance[KT, Any, npt.NDArray[Any], Any]],
+    provider: InstanceProvider[
+        Instance[KT, Any, npt.NDArray[Any], Any],
+        Any,
+        Any,
+        npt.NDArray[Any],
+        Any,
+    ],
+    chunk_size: int = 200,
+    prefetch_chunks: int = 0,
+) -> Iterator[Tuple[Sequence[KT], Any]]:
+    instance_chunks = prefetch(provider.instance_chunker(chunk_size), prefetch_chunks)
     for instance_chunk in instance_chunks:
         matrix = vectorizer.transform(instance_chunk)
         keys: List[KT] = list(map(to_key, instance_chunk))  # type: ignore
-        ret_keys, vectors = matrix_tuple_to_vectors(keys, matrix)
-        yield ret_keys, vectors
+        yield keys, matrix
 
 
 def vectorize(
@@ -95,6 +115,7 @@ def vectorize(
     ] = None,
     fit_chunk_size: Optional[int] = None,
     transform_chunk_size: Optional[int] = None,
+    prefetch_chunks: int = 0,
 ):
     # Set parameters
     f_chunk_size = chunk_size if fit_chunk_size is None else fit_chunk_size
@@ -117,8 +138,13 @@ def vectorize(
     # Vectorization Procedure
     if fit:
         vectorizer = fit_vectorizer(vectorizer, source_provider, f_chunk_size)
-    results = vectorize_provider(vectorizer, target_provider, t_chunk_size)
+    # With prefetch_chunks > 0, instances are read on a background thread
+    # while the vectorizer transforms
+    results = vectorize_provider_matrix(
+        vectorizer, target_provider, t_chunk_size, prefetch_chunks
+    )
 
-    # Store the vectors in the Environment
-    for keys, vecs in results:
-        environment.add_vectors(keys, vecs)
+    # Store the matrices in the Environment; providers with a vector storage
+    # keep them as a whole, so sparse matrices are never split into rows
+    for keys, matrix in results:
+        environment.add_matrix(keys, matrix)
@@ -0,0 +1,540 @@
+# Copyright (C) 2021 The InstanceLib Authors. All Rights Reserved.
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+"""Storage backed by Apache Arrow IPC or Parquet files.
+
+This module requires the optional dependency ``pyarrow``
+(``pip install instancelib[arrow]``).
+
+The files are read in segments: the record batches of an IPC file or
+the row groups of a Parquet file. Opening a file only reads the metadata
+and the key column. IPC files are memory-mapped, so the vectors are
+returned as zero-copy NumPy views on the file.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from io import UnsupportedOperation
+from os import PathLike
+from typing import (Any, Callable, Dict, Generic, Iterable, Iterator, List, Mapping,
+                    Optional, Sequence, Tuple, Union)
+
+import numpy as np
+import numpy.typing as npt
+import pyarrow as pa  # type: ignore
+import pyarrow.ipc  # type: ignore
+import pyarrow.parquet as pq  # type: ignore
+
+from ..typehints import KT, DType
+from ..utils.chunks import divide_sequence
+from ..utils.numpy import matrix_to_vector_list, rows_to_selector
+from .keyindex import INT_KEYS, SortedKeyIndex
+from .tablebacked import IT, TableProviderRO, table_instance_builder
+from .vectorstorage import VectorStorage, ensure_writeable
+
+IPC = "ipc"
+PARQUET = "parquet"
+
+
+def vectors_to_arrow(matrix: npt.NDArray[Any]) -> pa.FixedSizeListArray:
+    """Convert a 2-D matrix to an Arrow ``FixedSizeList`` array without copying
+
+    Parameters
+    ----------
+    matrix : npt.NDArray[Any]
+        The matrix, one vector per row
+
+    Returns
+    -------
+    pa.FixedSizeListArray
+        An array with one list of ``matrix.shape[1]`` values per row
+    """
+    values = pa.array(np.ascontiguousarray(matrix).reshape(-1))
+    return pa.FixedSizeListArray.from_arrays(values, matrix.shape[1])
+
+
+def fixed_size_list_to_numpy(array: Union[pa.Array, pa.ChunkedArray]) -> npt.NDArray[Any]:
+    """Convert an Arrow ``FixedSizeList`` array to a 2-D matrix.
+    This is a zero-copy view if the array consists of a single chunk
+    without null values.
+
+    Parameters
+    ----------
+    array : Union[pa.Array, pa.ChunkedArray]
+        The array
+
+    Returns
+    -------
+    npt.NDArray[Any]
+        The matrix, one vector per row
+    """
+    if isinstance(array, pa.ChunkedArray):
+        array = array.chunk(0) if array.num_chunks == 1 else array.combine_chunks()
+    dim = array.type.list_size
+    values = array.flatten().to_numpy(zero_copy_only=False)
+    return values.reshape((len(array), dim))
+
+
+class ArrowSource:
+    """A segmented, read-only view on an Arrow IPC file or a Parquet file
+
+    Parameters
+    ----------
+    path : Union[str, PathLike[str]]
+        The path of the file
+    file_format : str, optional
+        Either ``"ipc"`` (Arrow IPC file format, memory-mapped) or
+        ``"parquet"``, by default ``"ipc"``
+    cache_segments : int, optional
+        The number of decoded Parquet row groups that are kept in memory,
+        by default 2. IPC files do not need a cache.
+    """
+
+    def __init__(self,
+                 path: "Union[str, PathLike[str]]",
+                 file_format: str = IPC,
+                 cache_segments: int = 2) -> None:
+        assert file_format in (IPC, PARQUET), f"Unknown file format {file_format}"
+        self.path = path
+        self.file_format = file_format
+        self.cache_segments = cache_segments
+        self._cache: "OrderedDict[Tuple[int, Tuple[str, ...]], pa.Table]" = OrderedDict()
+        self.open()
+
+    def open(self) -> None:
+        """(Re)open the file and read its metadata
+        """
+        self._cache.clear()
+        if self.file_format == IPC:
+            self._reader = pa.ipc.open_file(pa.memory_map(str(self.path), "r"))
+            self.schema: pa.Schema = self._reader.schema
+            sizes = [self._reader.get_batch(i).num_rows
+                     for i in range(self._reader.num_record_batches)]
+        else:
+            self._reader = pq.ParquetFile(str(self.path), memory_map=True)
+            self.schema = self._reader.schema_arrow
+            metadata = self._reader.metadata
+            sizes = [metadata.row_group(i).num_rows
+                     for i in range(metadata.num_row_groups)]
+        self.starts = np.concatenate([[0], np.cumsum(sizes, dtype=np.int64)])
+
+    def close(self) -> None:
+        self._cache.clear()
+        self._reader = None
+
+    @property
+    def n_segments(self) -> int:
+        return len(self.starts) - 1
+
+    @property
+    def n_rows(self) -> int:
+        return int(self.starts[-1])
+
+    def segment(self, index: int, columns: Sequence[str]) -> pa.Table:
+        """Return the `columns` of one segment
+
+        Parameters
+        ----------
+        index : int
+            The number of the segment (record batch or row group)
+        columns : Sequence[str]
+            The columns that should be read
+
+        Returns
+        -------
+        pa.Table
+            A table with the rows of the segment
+        """
+        if self.file_format == IPC:
+            batch = self._reader.get_batch(index)
+            return pa.Table.from_batches([batch]).select(list(columns))
+        cache_key = (index, tuple(columns))
+        if cache_key in self._cache:
+            self._cache.move_to_end(cache_key)
+            return self._cache[cache_key]
+        table = self._reader.read_row_group(index, columns=list(columns))
+        self._cache[cache_key] = table
+        while len(self._cache) > self.cache_segments:
+            self._cache.popitem(last=False)
+        return table
+
+    def column(self, name: str) -> pa.ChunkedArray:
+        """Read a complete column
+
+        Parameters
+        ----------
+        name : str
+            The name of the column
+
+        Returns
+        -------
+        pa.ChunkedArray
+            The column
+        """
+        if self.file_format == IPC:
+            return self._reader.read_all().column(name)
+        return self._reader.read(columns=[name]).column(name)
+
+    def locate(self, rows: npt.NDArray[np.int64]) -> npt.NDArray[np.int64]:
+        """Determine the segment of every row
+
+        Parameters
+        ----------
+        rows : npt.NDArray[np.int64]
+            Row numbers
+
+        Returns
+        -------
+        npt.NDArray[np.int64]
+            The segment numbers
+        """
+        return np.searchsorted(self.starts, rows, side="right") - 1
+
+    def key_index(self, key_column: str) -> SortedKeyIndex[Any]:
+        """Build a key index from the key column
+
+        Parameters
+        ----------
+        key_column : str
+            The name of the column that contains the keys
+
+        Returns
+        -------
+        SortedKeyIndex[Any]
+            An index that maps the keys to row numbers
+        """
+        keys = self.column(key_column)
+        if pa.types.is_integer(keys.type):
+            return SortedKeyIndex(keys.to_numpy().astype(np.int64), INT_KEYS)
+        return SortedKeyIndex.from_keys(keys.to_pylist())
+
+
+class ArrowVectorStorage(VectorStorage[KT, npt.NDArray[DType], npt.NDArray[DType]], Generic[KT, DType]):
+    """A read-only :class:`VectorStorage` that reads the vectors from a
+    ``FixedSizeList`` column of an Arrow IPC or Parquet file.
+
+    Matrices that consist of consecutive rows of a single segment
+    (for example, all chunks of :meth:`matrices_chunker`) are zero-copy
+    views on the memory-mapped IPC file or on the decoded Parquet row group.
+
+    Parameters
+    ----------
+    source : ArrowSource
+        The file
+    key_column : str, optional
+        The column that contains the keys, by default ``"key"``
+    vector_column : str, optional
+        The ``FixedSizeList`` column that contains the vectors, by default ``"vector"``
+    index : Optional[SortedKeyIndex[KT]], optional
+        A key index that was built from the same file, by default None
+        (the index is built from the key column)
+    """
+
+    def __init__(self,
+                 source: ArrowSource,
+                 key_column: str = "key",
+                 vector_column: str = "vector",
+                 index: Optional[SortedKeyIndex[KT]] = None) -> None:
+        self.source = source
+        self.key_column = key_column
+        self.vector_column = vector_column
+        self.index: SortedKeyIndex[KT] = (
+            source.key_index(key_column) if index is None else index)
+
+    @classmethod
+    def from_ipc(cls, path: "Union[str, PathLike[str]]", **kwargs: Any) -> ArrowVectorStorage[KT, DType]:
+        return cls(ArrowSource(path, IPC), **kwargs)
+
+    @classmethod
+    def from_parquet(cls, path: "Union[str, PathLike[str]]", **kwargs: Any) -> ArrowVectorStorage[KT, DType]:
+        return cls(ArrowSource(path, PARQUET), **kwargs)
+
+    @property
+    def writeable(self) -> bool:
+        return False
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, item: object) -> bool:
+        return item in self.index
+
+    def __iter__(self) -> Iterator[KT]:
+        yield from self.index
+
+    def _segment_matrix(self, segment: int) -> npt.NDArray[DType]:
+        table = self.source.segment(segment, [self.vector_column])
+        return fixed_size_list_to_numpy(table.column(self.vector_column))
+
+    def _get_rows(self, rows: npt.NDArray[np.int64]) -> npt.NDArray[DType]:
+        """Return the vectors of `rows`, in the same order
+
+        Parameters
+        ----------
+        rows : npt.NDArray[np.int64]
+            Row numbers
+
+        Returns
+        -------
+        npt.NDArray[DType]
+            The matrix
+        """
+        segments = self.source.locate(rows)
+        first = int(segments[0]) if len(rows) else 0
+        if len(rows) and (segments == first).all():
+            # Consecutive rows of a single segment become a view
+            start = self.source.starts[first]
+            return self._segment_matrix(first)[rows_to_selector(rows - start)]
+        result: Optional[npt.NDArray[DType]] = None
+        for segment in np.unique(segments):
+            mask = segments == segment
+            matrix = self._segment_matrix(int(segment))
+            if result is None:
+                result = np.empty((len(rows), matrix.shape[1]), dtype=matrix.dtype)
+            result[mask] = matrix[rows[mask] - self.source.starts[segment]]
+        if result is None:
+            return np.empty((0, self.source.schema.field(self.vector_column).type.list_size))
+        return result
+
+    def __getitem__(self, k: KT) -> npt.NDArray[DType]:
+        return self._get_rows(self.index.rows([k]))[0]
+
+    @ensure_writeable
+    def __setitem__(self, k: KT, value: npt.NDArray[DType]) -> None:
+        raise NotImplementedError
+
+    @ensure_writeable
+    def __delitem__(self, v: KT) -> None:
+        raise NotImplementedError
+
+    @ensure_writeable
+    def add_bulk(self, input_keys: Sequence[KT], input_values: Sequence[npt.NDArray[DType]]) -> None:
+        raise NotImplementedError
+
+    @ensure_writeable
+    def add_bulk_matrix(self, keys: Sequence[KT], matrix: npt.NDArray[DType]) -> None:
+        raise NotImplementedError
+
+    def get_matrix(self, keys: Sequence[KT]) -> Tuple[Sequence[KT], npt.NDArray[DType]]:
+        """Return a matrix with the vectors of `keys`. Keys that are not
+        present are skipped; the other keys keep their order.
+
+        Parameters
+        ----------
+        keys : Sequence[KT]
+            The keys
+
+        Returns
+        -------
+        Tuple[Sequence[KT], npt.NDArray[DType]]
+            The keys that were found and the matrix
+        """
+        found, rows = self.index.lookup(keys)
+        ret_keys = [key for key, present in zip(keys, found) if present]
+        return ret_keys, self._get_rows(rows[found])
+
+    def get_matrix_chunked(self, keys: Sequence[KT], chunk_size: int = 200) -> Iterator[Tuple[Sequence[KT], npt.NDArray[DType]]]:
+        for key_chunk in divide_sequence(keys, chunk_size):
+            ret_keys, matrix = self.get_matrix(key_chunk)
+            if ret_keys:
+                yield ret_keys, matrix
+
+    def get_vectors(self, keys: Sequence[KT]) -> Tuple[Sequence[KT], Sequence[npt.NDArray[DType]]]:
+        ret_keys, matrix = self.get_matrix(keys)
+        return ret_keys, matrix_to_vector_list(matrix)
+
+    def get_vectors_chunked(self, keys: Sequence[KT], chunk_size: int = 200) -> Iterator[Tuple[Sequence[KT], Sequence[npt.NDArray[DType]]]]:
+        for ret_keys, matrix in self.get_matrix_chunked(keys, chunk_size):
+            yield ret_keys, matrix_to_vector_list(matrix)
+
+    def get_vectors_zipped(self, keys: Sequence[KT], chunk_size: int = 200) -> Iterator[Sequence[Tuple[KT, npt.NDArray[DType]]]]:
+        for ret_keys, vectors in self.get_vectors_chunked(keys, chunk_size):
+            yield list(zip(ret_keys, vectors))
+
+    def matrices_chunker(self, chunk_size: int = 200) -> Iterator[Tuple[Sequence[KT], npt.NDArray[DType]]]:
+        for segment in range(self.source.n_segments):
+            start = int(self.source.starts[segment])
+            matrix = self._segment_matrix(segment)
+            for offset in range(0, matrix.shape[0], chunk_size):
+                stop = min(offset + chunk_size, matrix.shape[0])
+                rows = slice(start + offset, start + stop)
+                yield self.index.keys_for_rows(rows), matrix[offset:stop]
+
+    def vectors_chunker(self, chunk_size: int = 200) -> Iterator[Sequence[Tuple[KT, npt.NDArray[DType]]]]:
+        for keys, matrix in self.matrices_chunker(chunk_size):
+            yield list(zip(keys, matrix_to_vector_list(matrix)))
+
+    def __enter__(self) -> ArrowVectorStorage[KT, DType]:
+        return self
+
+    def __exit__(self, type: Any, value: Any, traceback: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.source.close()
+
+    def reload(self) -> None:
+        self.source.open()
+        self.index = self.source.key_index(self.key_column)
+
+
+class ArrowRowMapping(Mapping[KT, Mapping[str, Any]], Generic[KT]):
+    """A read-only mapping from keys to the rows of an Arrow or Parquet file.
+    Only the rows that are requested are converted to Python objects.
+
+    Parameters
+    ----------
+    source : ArrowSource
+        The file
+    index : SortedKeyIndex[KT]
+        The key index of the file
+    columns : Sequence[str]
+        The columns that are included in the rows
+    """
+
+    def __init__(self, source: ArrowSource, index: SortedKeyIndex[KT], columns: Sequence[str]) -> None:
+        self.source = source
+        self.index = index
+        self.columns = list(columns)
+
+    def __getitem__(self, key: KT) -> Mapping[str, Any]:
+        found, rows = self.index.lookup([key])
+        if not found[0]:
+            raise KeyError(key)
+        return self.take(rows)[0]
+
+    def __iter__(self) -> Iterator[KT]:
+        yield from self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.index
+
+    def take(self, rows: npt.NDArray[np.int64]) -> List[Dict[str, Any]]:
+        """Convert the given rows to dictionaries
+
+        Parameters
+        ----------
+        rows : npt.NDArray[np.int64]
+            Row numbers
+
+        Returns
+        -------
+        List[Dict[str, Any]]
+            The rows, in the order of `rows`
+        """
+        result: List[Dict[str, Any]] = [dict()] * len(rows)
+        segments = self.source.locate(rows)
+        for segment in np.unique(segments):
+            positions = np.flatnonzero(segments == segment)
+            table = self.source.segment(int(segment), self.columns)
+            local = rows[positions] - self.source.starts[segment]
+            for position, row in zip(positions, table.take(local).to_pylist()):
+                result[position] = row
+        return result
+
+
+class ArrowProviderRO(TableProviderRO[IT, KT, Any, Any, Any, Any], Generic[IT, KT]):
+    """A read-only provider that serves the instance data and the vectors
+    from the same Arrow IPC or Parquet file.
+
+    Parameters
+    ----------
+    source : ArrowSource
+        The file
+    key_column : str, optional
+        The column that contains the identifiers, by default ``"key"``
+    vector_column : Optional[str], optional
+        The ``FixedSizeList`` column with the vectors, by default ``"vector"``.
+        If the file does not contain this column, the instances have no vectors.
+    columns : Optional[Sequence[str]], optional
+        The columns that are included in the instance data, by default None
+        (all columns except the key and vector columns)
+    builder : Optional[Callable[[KT, Mapping[str, Any], Optional[Any]], IT]], optional
+        A function that creates an instance from the key, the row and the vector.
+        By default, a :class:`~instancelib.instances.tablebacked.TableInstance`
+        with the column `data_column` as data and representation
+    data_column : str, optional
+        The column used by the default builder, by default ``"data"``
+    """
+
+    def __init__(self,
+                 source: ArrowSource,
+                 key_column: str = "key",
+                 vector_column: Optional[str] = "vector",
+                 columns: Optional[Sequence[str]] = None,
+                 builder: Optional[Callable[[KT, Mapping[str, Any], Optional[Any]], IT]] = None,
+                 data_column: str = "data") -> None:
+        index: SortedKeyIndex[KT] = source.key_index(key_column)
+        if columns is None:
+            columns = [name for name in source.schema.names
+                       if name not in (key_column, vector_column)]
+        if builder is None:
+            builder = table_instance_builder(data_column) # type: ignore
+        if vector_column is not None and vector_column in source.schema.names:
+            vectors: VectorStorage[KT, Any, Any] = ArrowVectorStorage(
+                source, key_column, vector_column, index)
+        else:
+            vectors = _EmptyVectorStorage()
+        super().__init__(ArrowRowMapping(source, index, columns), columns, vectors, builder) # type: ignore
+        self.source = source
+        self.index = index
+
+    @classmethod
+    def from_ipc(cls, path: "Union[str, PathLike[str]]", **kwargs: Any) -> ArrowProviderRO[IT, KT]:
+        return cls(ArrowSource(path, IPC), **kwargs)
+
+    @classmethod
+    def from_parquet(cls, path: "Union[str, PathLike[str]]", **kwargs: Any) -> ArrowProviderRO[IT, KT]:
+        return cls(ArrowSource(path, PARQUET), **kwargs)
+
+    def data_chunker_selector(self, keys: Iterable[KT], batch_size: int = 200,
+                              keep_order: bool = True) -> Iterator[Sequence[Tuple[KT, Any]]]:
+        keylist = list(keys)
+        found, rows = self.index.lookup(keylist)
+        selected = np.flatnonzero(found)
+        if not keep_order:
+            selected = selected[np.argsort(rows[selected], kind="stable")]
+        for positions in divide_sequence(selected, batch_size):
+            chunk_keys = [keylist[i] for i in positions]
+            chunk_rows = self.storage.take(rows[positions]) # type: ignore
+            yield [(key, self.builder(key, row, None).data)
+                   for key, row in zip(chunk_keys, chunk_rows)]
+
+    def clear(self) -> None:
+        raise UnsupportedOperation("An ArrowProviderRO is read-only")
+
+
+class _EmptyVectorStorage(ArrowVectorStorage[Any, Any]):
+    """The vector storage of a file without a vector column"""
+
+    def __init__(self) -> None:
+        self.index = SortedKeyIndex.empty()
+
+    def get_matrix(self, keys: Sequence[Any]) -> Tuple[Sequence[Any], npt.NDArray[Any]]:
+        return [], np.empty((0, 0))
+
+    def matrices_chunker(self, chunk_size: int = 200) -> Iterator[Tuple[Sequence[Any], npt.NDArray[Any]]]:
+        yield from []
+
+    def close(self) -> None:
+        pass
+
+    def reload(self) -> None:
+        pass
@@ -39,6 +39,7 @@ from typing import (
 
 from ..utils.chunks import divide_iterable_in_lists
 from ..utils.func import filter_snd_none_zipped
+from ..utils.numpy import matrix_to_vector_list, stack_vectors
 
 from ..typehints import KT, DT, VT, RT
 
@@ -87,6 +88,8 @@ class Instance(ABC, Generic[KT, DT, VT, RT]):
     different operations like predictions, annotatation and transformation.
     """
 
+    __slots__ = ()
+
     @property
     @abstractmethod
     def data(self) -> DT:
@@ -481,13 +484,30 @@ class ROInstanceProvider(
         yield from chunks
 
     def data_chunker_selector(
-        self, keys: Iterable[KT], batch_size: int = 200
+        self, keys: Iterable[KT], batch_size: int = 200, keep_order: bool = True
     ) -> Iterator[Sequence[Tuple[KT, DT]]]:
-        keyset = frozenset(keys)
+        """Iterate over the data of the instances in `keys`. Only the
+        requested keys are visited; keys that are not in this provider
+        are skipped.
+
+        Parameters
+        ----------
+        keys : Iterable[KT]
+            The requested keys
+        batch_size : int, optional
+            The batch size, by default 200
+        keep_order : bool, optional
+            Return the data in the order of `keys`. If False, the provider
+            may reorder the keys to read them in storage order. By default True
+
+        Yields
+        -------
+        Sequence[Tuple[KT, DT]]
+            Lists of key data pairs with length `batch_size`. The last list
+            may have a shorter length.
+        """
         datapoints = (
-            (ins.identifier, ins.data)
-            for ins in self.values()
-            if ins.identifier in keyset
+            (key, self[key].data) for key in keys if key in self
         )
         chunks = divide_iterable_in_lists(datapoints, batch_size)
         yield from chunks
@@ -528,10 +548,12 @@ class ROInstanceProvider(
         yield from chunks
 
     def vector_chunker_selector(
-        self, keys: Iterable[KT], batch_size: int = 200
+        self, keys: Iterable[KT], batch_size: int = 200, keep_order: bool = True
     ) -> Iterator[Sequence[Tuple[KT, VT]]]:
         """Iterate over all instances (with or without vectors) in belonging the identifier
-        :class:`Iterable` in the `keys` parameter.
+        :class:`Iterable` in the `keys` parameter. Only the requested keys are
+        visited; their vectors are fetched with :meth:`bulk_get_vectors`
+        in batches.
 
         Parameters
         ----------
@@ -541,6 +563,10 @@ class ROInstanceProvider(
         batch_size : int
             The batch size, the generator will return lists with size `batch_size`
 
+        keep_order : bool
+            Return the vectors in the order of `keys`. If False, the provider
+            may reorder the keys to read them in storage order. By default True
+
         Yields
         -------
         Sequence[Instance[KT, DT, VT, RT]]]
@@ -552,13 +578,13 @@ class ROInstanceProvider(
         Iterator[Sequence[Tuple[KT, VT]]]
             An iterator over sequences of key vector tuples
         """
-        included_ids = frozenset(self.key_list).intersection(keys)
-        id_vecs = (
-            (elem.identifier, elem.vector)
-            for elem in self.values()
-            if elem.vector is not None and elem.identifier in included_ids
-        )
-        chunks = divide_iterable_in_lists(id_vecs, batch_size)
+        def fetch() -> Iterator[Tuple[KT, VT]]:
+            present = (key for key in keys if key in self)
+            for key_chunk in divide_iterable_in_lists(present, batch_size):
+                ret_keys, vectors = self.bulk_get_vectors(key_chunk)
+                yield from zip(ret_keys, vectors)
+
+        chunks = divide_iterable_in_lists(fetch(), batch_size)
         return chunks
 
     def vector_chunker(
@@ -584,6 +610,69 @@ class ROInstanceProvider(
         """
         yield from self.vector_chunker_selector(self.key_list, batch_size)
 
+    def matrix_chunker_selector(
+        self, keys: Iterable[KT], batch_size: int = 200
+    ) -> Iterator[Tuple[Sequence[KT], Any]]:
+        """Iterate over the vectors of the instances in `keys` as stacked
+        matrices. Instances without a vector are skipped. Sparse vectors are
+        stacked into a :class:`scipy.sparse.csr_matrix`.
+
+        Providers that keep their vectors in a
+        :class:`~instancelib.instances.vectorstorage.VectorStorage` override
+        this method to read the matrices directly from the storage.
+
+        Parameters
+        ----------
+        keys : Iterable[KT]
+            The keys of the instances
+        batch_size : int, optional
+            The number of rows per matrix, by default 200
+
+        Yields
+        ------
+        Tuple[Sequence[KT], Any]
+            The keys of the rows and the matrix
+        """
+        for chunk in self.vector_chunker_selector(keys, batch_size):
+            ret_keys, vectors = filter_snd_none_zipped(chunk)
+            if ret_keys:
+                yield ret_keys, stack_vectors(vectors)
+
+    def matrix_chunker(
+        self, batch_size: int = 200
+    ) -> Iterator[Tuple[Sequence[KT], Any]]:
+        """Iterate over the vectors of all instances in this provider as
+        stacked matrices. See :meth:`matrix_chunker_selector`.
+
+        Parameters
+        ----------
+        batch_size : int, optional
+            The number of rows per matrix, by default 200
+
+        Yields
+        ------
+        Tuple[Sequence[KT], Any]
+            The keys of the rows and the matrix
+        """
+        yield from self.matrix_chunker_selector(self.key_list, batch_size)
+
+    def bulk_add_matrix(self, keys: Sequence[KT], matrix: Any) -> None:
+        """Add the rows of `matrix` as the vectors of the instances in `keys`.
+        Row `i` belongs to ``keys[i]``.
+
+        Providers that keep their vectors in a
+        :class:`~instancelib.instances.vectorstorage.VectorStorage` store
+        the matrix without splitting it into rows.
+
+        Parameters
+        ----------
+        keys : Sequence[KT]
+            A sequence of keys
+        matrix : Any
+            A dense array or a sparse matrix
+        """
+        self.bulk_add_vectors(keys, matrix_to_vector_list(matrix))
+
     def bulk_get_all(self) -> List[InstanceType]:
         """Returns a list of all instances in this provider.
 
@@ -1063,22 +1152,43 @@ class AbstractBucketProvider(
         return results
 
     def data_chunker_selector(
-        self, keys: Iterable[KT], batch_size: int = 200
+        self, keys: Iterable[KT], batch_size: int = 200, keep_order: bool = True
     ) -> Iterator[Sequence[Tuple[KT, DT]]]:
-        keyset = frozenset(self.key_list).intersection(keys)
-        results = self.dataset.data_chunker_selector(keyset, batch_size)
+        selected = (key for key in keys if self._in_bucket(key))
+        results = self.dataset.data_chunker_selector(selected, batch_size, keep_order)
         return results
 
     def vector_chunker_selector(
-        self, keys: Iterable[KT], batch_size: int = 200
+        self, keys: Iterable[KT], batch_size: int = 200, keep_order: bool = True
     ) -> Iterator[Sequence[Tuple[KT, VT]]]:
-        keyset = frozenset(self.key_list).intersection(keys)
-        results = self.dataset.vector_chunker_selector(keyset, batch_size)
+        selected = (key for key in keys if self._in_bucket(key))
+        results = self.dataset.vector_chunker_selector(selected, batch_size, keep_order)
         return results
 
+    def matrix_chunker(
+        self, batch_size: int = 200
+    ) -> Iterator[Tuple[Sequence[KT], Any]]:
+        return self.dataset.matrix_chunker_selector(self.key_list, batch_size)
+
+    def matrix_chunker_selector(
+        self, keys: Iterable[KT], batch_size: int = 200
+    ) -> Iterator[Tuple[Sequence[KT], Any]]:
+        selected = (key for key in keys if self._in_bucket(key))
+        return self.dataset.matrix_chunker_selector(selected, batch_size)
+
     def clear(self) -> None:
         self._clear_bucket()
 
+    @property
+    def without_vector(self) -> FrozenSet[KT]:
+        return frozenset(
+            key for key in self.dataset.without_vector if self._in_bucket(key)
+        )
+
+    @property
+    def with_vector(self) -> FrozenSet[KT]:
+        return frozenset(self._bucket).difference(self.without_vector)
+
     @property
     def empty(self) -> bool:
         return not self
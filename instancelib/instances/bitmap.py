@@ -0,0 +1,275 @@
+# Copyright (C) 2021 The InstanceLib Authors. All Rights Reserved.
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+from __future__ import annotations
+
+from typing import (Any, Generic, Iterable, Iterator, List, Optional, Sequence,
+                    TypeVar)
+
+import numpy as np
+import numpy.typing as npt
+
+from ..typehints import DT, KT, RT, VT
+from .base import AbstractBucketProvider, InstanceProvider
+from .interning import KeyInterner
+
+InstanceType = TypeVar("InstanceType", bound="Any")
+
+
+class BitmapBucketProvider(
+    AbstractBucketProvider[InstanceType, KT, DT, VT, RT],
+    Generic[InstanceType, KT, DT, VT, RT],
+):
+    """A bucket that stores its keys as a boolean mask over the ids of a
+    :class:`~instancelib.instances.interning.KeyInterner`, instead of a
+    set of keys. The mask costs one byte per interned key, membership
+    tests and ``len`` are constant time, the keys are iterated in id order
+    and the set operations (:meth:`union`, :meth:`intersection`, :meth:`difference`
+    and the operators ``|``, ``&`` and ``-``) are vectorized when both buckets
+    share the same interner.
+
+    Parameters
+    ----------
+    dataset : InstanceProvider[InstanceType, KT, DT, VT, RT]
+        The provider that contains the instances
+    instances : Iterable[KT]
+        The keys of the instances in this bucket
+    interner : Optional[KeyInterner[KT]], optional
+        The interner, by default None (a new interner for the keys of `dataset`).
+        Buckets of the same environment should share the interner.
+    """
+
+    def __init__(
+        self,
+        dataset: InstanceProvider[InstanceType, KT, DT, VT, RT],
+        instances: Iterable[KT],
+        interner: Optional[KeyInterner[KT]] = None,
+    ):
+        self.dataset = dataset
+        self.interner: KeyInterner[KT] = (
+            KeyInterner(dataset.key_list) if interner is None else interner)
+        self._mask: npt.NDArray[np.bool_] = np.zeros(len(self.interner), dtype=np.bool_)
+        self._count = 0
+        self.add_keys(list(instances))
+
+    @classmethod
+    def from_ids(
+        cls,
+        dataset: InstanceProvider[InstanceType, KT, DT, VT, RT],
+        interner: KeyInterner[KT],
+        ids: Any,
+    ) -> BitmapBucketProvider[InstanceType, KT, DT, VT, RT]:
+        """Create a bucket from an array of ids or a boolean mask over the ids
+
+        Parameters
+        ----------
+        dataset : InstanceProvider[InstanceType, KT, DT, VT, RT]
+            The provider that contains the instances
+        interner : KeyInterner[KT]
+            The interner that assigned the ids
+        ids : Any
+            An integer array of ids or a boolean mask
+
+        Returns
+        -------
+        BitmapBucketProvider[InstanceType, KT, DT, VT, RT]
+            The new bucket
+        """
+        bucket = cls(dataset, [], interner)
+        bucket._set_mask(np.asarray(ids))
+        return bucket
+
+    def _set_mask(self, ids: npt.NDArray[Any]) -> None:
+        if ids.dtype == np.bool_:
+            mask = np.zeros(max(len(ids), len(self.interner)), dtype=np.bool_)
+            mask[:len(ids)] = ids
+        else:
+            mask = np.zeros(len(self.interner), dtype=np.bool_)
+            mask[ids] = True
+        self._mask = mask
+        self._count = int(np.count_nonzero(mask))
+
+    def _reserve(self, n_ids: int) -> None:
+        if n_ids > len(self._mask):
+            mask = np.zeros(max(n_ids, len(self._mask) + len(self._mask) // 2), dtype=np.bool_)
+            mask[:len(self._mask)] = self._mask
+            self._mask = mask
+
+    def _id(self, key: Any) -> int:
+        found, ids = self.interner.lookup([key])
+        return int(ids[0]) if found[0] else -1
+
+    def _add_to_bucket(self, key: KT) -> None:
+        key_id = self.interner.intern_key(key)
+        self._reserve(key_id + 1)
+        if not self._mask[key_id]:
+            self._mask[key_id] = True
+            self._count += 1
+
+    def _remove_from_bucket(self, key: KT) -> None:
+        key_id = self._id(key)
+        if 0 <= key_id < len(self._mask) and self._mask[key_id]:
+            self._mask[key_id] = False
+            self._count -= 1
+
+    def _clear_bucket(self) -> None:
+        self._mask = np.zeros(len(self.interner), dtype=np.bool_)
+        self._count = 0
+
+    def _in_bucket(self, key: KT) -> bool:
+        key_id = self._id(key)
+        return 0 <= key_id < len(self._mask) and bool(self._mask[key_id])
+
+    def _len_bucket(self) -> int:
+        return self._count
+
+    @property
+    def _bucket(self) -> Iterable[KT]:
+        ids = self.ids()
+        for start in range(0, len(ids), 10000):
+            yield from self.interner.keys(ids[start:start + 10000])
+
+    @property
+    def empty(self) -> bool:
+        return not self._count
+
+    @property
+    def key_list(self) -> List[KT]:
+        return self.interner.keys(self.ids())
+
+    def add_keys(self, keys: Sequence[KT]) -> None:
+        """Add many keys at once
+
+        Parameters
+        ----------
+        keys : Sequence[KT]
+            The keys
+        """
+        if not len(keys):
+            return
+        ids = self.interner.intern(keys)
+        self._reserve(len(self.interner))
+        self._mask[ids] = True
+        self._count = int(np.count_nonzero(self._mask))
+
+    def ids(self) -> npt.NDArray[np.int64]:
+        """Return the ids of the keys in this bucket
+
+        Returns
+        -------
+        npt.NDArray[np.int64]
+            The ids, in ascending order
+        """
+        return np.flatnonzero(self._mask)
+
+    def mask(self, size: Optional[int] = None) -> npt.NDArray[np.bool_]:
+        """Return the membership mask of this bucket
+
+        Parameters
+        ----------
+        size : Optional[int], optional
+            The length of the mask, by default None (the number of interned keys)
+
+        Returns
+        -------
+        npt.NDArray[np.bool_]
+            A boolean array that is True for the ids in this bucket
+        """
+        size = len(self.interner) if size is None else size
+        mask = np.zeros(size, dtype=np.bool_)
+        n_ids = min(size, len(self._mask))
+        mask[:n_ids] = self._mask[:n_ids]
+        return mask
+
+    def _other_mask(self, other: Iterable[Any]) -> npt.NDArray[np.bool_]:
+        if isinstance(other, BitmapBucketProvider) and other.interner is self.interner:
+            return other.mask()
+        if isinstance(other, InstanceProvider):
+            return self.interner.mask(other.key_list)
+        return self.interner.mask(other)
+
+    def _combine(self, mask: npt.NDArray[np.bool_]) -> BitmapBucketProvider[InstanceType, KT, DT, VT, RT]:
+        return type(self).from_ids(self.dataset, self.interner, mask)
+
+    def union(self, *others: Iterable[Any]) -> BitmapBucketProvider[InstanceType, KT, DT, VT, RT]:
+        """Return a new bucket with the keys of this bucket and `others`
+
+        Parameters
+        ----------
+        others : Iterable[Any]
+            Other buckets, providers or collections of keys
+
+        Returns
+        -------
+        BitmapBucketProvider[InstanceType, KT, DT, VT, RT]
+            The new bucket
+        """
+        for other in others:
+            if not isinstance(other, BitmapBucketProvider) or other.interner is not self.interner:
+                # Intern keys that have not been seen before
+                self.interner.intern(list(other.key_list if isinstance(other, InstanceProvider) else other))
+        mask = self.mask()
+        for other in others:
+            mask |= self._other_mask(other)
+        return self._combine(mask)
+
+    def intersection(self, *others: Iterable[Any]) -> BitmapBucketProvider[InstanceType, KT, DT, VT, RT]:
+        """Return a new bucket with the keys that are in this bucket and in all `others`
+
+        Parameters
+        ----------
+        others : Iterable[Any]
+            Other buckets, providers or collections of keys
+
+        Returns
+        -------
+        BitmapBucketProvider[InstanceType, KT, DT, VT, RT]
+            The new bucket
+        """
+        mask = self.mask()
+        for other in others:
+            mask &= self._other_mask(other)
+        return self._combine(mask)
+
+    def difference(self, *others: Iterable[Any]) -> BitmapBucketProvider[InstanceType, KT, DT, VT, RT]:
+        """Return a new bucket with the keys of this bucket that are not in `others`
+
+        Parameters
+        ----------
+        others : Iterable[Any]
+            Other buckets, providers or collections of keys
+
+        Returns
+        -------
+        BitmapBucketProvider[InstanceType, KT, DT, VT, RT]
+            The new bucket
+        """
+        mask = self.mask()
+        for other in others:
+            mask &= ~self._other_mask(other)
+        return self._combine(mask)
+
+    def __or__(self, other: Iterable[Any]) -> BitmapBucketProvider[InstanceType, KT, DT, VT, RT]:
+        return self.union(other)
+
+    def __and__(self, other: Iterable[Any]) -> BitmapBucketProvider[InstanceType, KT, DT, VT, RT]:
+        return self.intersection(other)
+
+    def __sub__(self, other: Iterable[Any]) -> BitmapBucketProvider[InstanceType, KT, DT, VT, RT]:
+        return self.difference(other)
+
+    def __iter__(self) -> Iterator[KT]:
+        yield from self._bucket
@@ -0,0 +1,313 @@
+# Copyright (C) 2021 The InstanceLib Authors. All Rights Reserved.
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+from __future__ import annotations
+
+import sys
+import threading
+from collections import OrderedDict
+from typing import (Any, Dict, Generic, Iterable, Iterator, List, Optional,
+                    Sequence, Tuple)
+
+import numpy as np
+import scipy.sparse as sp  # type: ignore
+
+from ..typehints import KT, MT, VT
+from ..utils.chunks import divide_sequence
+from ..utils.numpy import matrix_to_vector_list, stack_vectors
+from .vectorstorage import VectorStorage
+
+
+def vector_nbytes(vector: Any) -> int:
+    """Estimate the memory that a vector occupies
+
+    Parameters
+    ----------
+    vector : Any
+        A NumPy array, a SciPy sparse matrix or another object
+
+    Returns
+    -------
+    int
+        The size in bytes
+    """
+    if isinstance(vector, np.ndarray):
+        return vector.nbytes
+    if sp.issparse(vector):
+        csr = sp.csr_matrix(vector)
+        return csr.data.nbytes + csr.indices.nbytes + csr.indptr.nbytes
+    return sys.getsizeof(vector)
+
+
+class CachedVectorStorage(VectorStorage[KT, VT, MT], Generic[KT, VT, MT]):
+    """A :class:`VectorStorage` decorator that keeps recently read vectors
+    in memory.
+
+    The cache is bounded by the number of bytes that the cached vectors
+    occupy. When it is full, the least recently used vectors are evicted.
+    Read requests are served from the cache where possible; the
+    missing vectors are fetched from the wrapped storage in one batched
+    read. Writes are passed to the wrapped storage and invalidate the
+    cached vectors of the affected keys.
+
+    Full scans with :meth:`matrices_chunker` and :meth:`vectors_chunker`
+    bypass the cache, so that a single pass over the dataset does not
+    evict the frequently used vectors. Changes that are made directly
+    to the wrapped storage (available as :attr:`storage`) are not seen
+    by the cache; call :meth:`clear_cache` or :meth:`reload` afterwards.
+
+    Parameters
+    ----------
+    storage : VectorStorage[KT, VT, MT]
+        The storage that is wrapped, for example a
+        :class:`~instancelib.instances.hdf5vector.HDF5VectorStorage`
+    max_bytes : int, optional
+        The maximum size of the cache in bytes, by default 256 MiB
+
+    Attributes
+    ----------
+    hits : int
+        The number of vectors that were served from the cache
+    misses : int
+        The number of vectors that were read from the wrapped storage
+    evictions : int
+        The number of vectors that were evicted to stay within `max_bytes`
+    """
+
+    def __init__(self, storage: VectorStorage[KT, VT, MT], max_bytes: int = 2 ** 28) -> None:
+        self.storage = storage
+        self.max_bytes = max_bytes
+        self._cache: "OrderedDict[KT, VT]" = OrderedDict()
+        self._sizes: Dict[KT, int] = dict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Incremented by every invalidation; reads that started before
+        # an invalidation do not insert their (possibly stale) vectors
+        self._epoch = 0
+
+    @property
+    def writeable(self) -> bool:
+        return self.storage.writeable
+
+    @property
+    def hit_rate(self) -> float:
+        """The fraction of requested vectors that were served from the cache
+
+        Returns
+        -------
+        float
+            A number between 0 and 1
+        """
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the counters of the cache, which can be used to choose
+        a suitable `max_bytes`
+
+        Returns
+        -------
+        Dict[str, Any]
+            A dictionary with the hits, misses, evictions, the number of cached
+            vectors and their total size in bytes
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hit_rate,
+            "entries": len(self._cache),
+            "nbytes": self.nbytes,
+            "max_bytes": self.max_bytes,
+        }
+
+    def reset_stats(self) -> None:
+        """Set the hit, miss and eviction counters to zero
+        """
+        self.hits, self.misses, self.evictions = 0, 0, 0
+
+    def clear_cache(self) -> None:
+        """Remove all vectors from the cache. The wrapped storage is not changed.
+        """
+        with self._lock:
+            self._cache.clear()
+            self._sizes.clear()
+            self.nbytes = 0
+            self._epoch += 1
+
+    def invalidate(self, keys: Iterable[KT]) -> None:
+        """Remove the vectors of `keys` from the cache
+
+        Parameters
+        ----------
+        keys : Iterable[KT]
+            The keys whose cached vectors are no longer valid
+        """
+        with self._lock:
+            self._epoch += 1
+            for key in keys:
+                if key in self._cache:
+                    del self._cache[key]
+                    self.nbytes -= self._sizes.pop(key)
+
+    def _insert(self, keys: Sequence[KT], vectors: Sequence[VT], epoch: int) -> None:
+        with self._lock:
+            if epoch != self._epoch:
+                # A write happened while the vectors were read
+                return
+            for key, vector in zip(keys, vectors):
+                size = vector_nbytes(vector)
+                if size > self.max_bytes or key in self._cache:
+                    continue
+                if isinstance(vector, np.ndarray) and vector.base is not None:
+                    # Do not keep the whole matrix of a batch alive
+                    vector = vector.copy()
+                self._cache[key] = vector # type: ignore
+                self._sizes[key] = size
+                self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                key, _ = self._cache.popitem(last=False)
+                self.nbytes -= self._sizes.pop(key)
+                self.evictions += 1
+
+    def _lookup(self, keys: Sequence[KT]) -> Tuple[List[KT], List[VT]]:
+        """Return the vectors of `keys` from the cache and fetch
+        the missing vectors in one read from the wrapped storage
+
+        Parameters
+        ----------
+        keys : Sequence[KT]
+            The keys
+
+        Returns
+        -------
+        Tuple[List[KT], List[VT]]
+            The keys that are present and their vectors, in the order of `keys`
+        """
+        found: Dict[KT, VT] = dict()
+        missing: List[KT] = list()
+        with self._lock:
+            for key in keys:
+                vector = self._cache.get(key)
+                if vector is None:
+                    missing.append(key)
+                else:
+                    self._cache.move_to_end(key)
+                    found[key] = vector
+            self.hits += len(found)
+            self.misses += len(missing)
+            epoch = self._epoch
+        if missing:
+            ret_keys, matrix = self.storage.get_matrix(missing)
+            vectors = matrix_to_vector_list(matrix) # type: ignore
+            self._insert(ret_keys, vectors, epoch) # type: ignore
+            found.update(zip(ret_keys, vectors)) # type: ignore
+        ret_keys = [key for key in keys if key in found]
+        return ret_keys, [found[key] for key in ret_keys]
+
+    def __getitem__(self, k: KT) -> VT:
+        with self._lock:
+            vector = self._cache.get(k)
+            if vector is not None:
+                self._cache.move_to_end(k)
+                self.hits += 1
+                return vector
+            self.misses += 1
+            epoch = self._epoch
+        vector = self.storage[k]
+        self._insert([k], [vector], epoch)
+        return vector
+
+    def __setitem__(self, k: KT, value: VT) -> None:
+        # Invalidate after the write, so that concurrent reads cannot cache the old vector
+        try:
+            self.storage[k] = value
+        finally:
+            self.invalidate([k])
+
+    def __delitem__(self, k: KT) -> None:
+        try:
+            del self.storage[k]
+        finally:
+            self.invalidate([k])
+
+    def __contains__(self, item: object) -> bool:
+        return item in self._cache or item in self.storage
+
+    def __iter__(self) -> Iterator[KT]:
+        return iter(self.storage)
+
+    def __len__(self) -> int:
+        return len(self.storage)
+
+    def add_bulk(self, input_keys: Sequence[KT], input_values: Sequence[VT]) -> None:
+        try:
+            self.storage.add_bulk(input_keys, input_values)
+        finally:
+            self.invalidate(input_keys)
+
+    def add_bulk_matrix(self, keys: Sequence[KT], matrix: MT) -> None:
+        try:
+            self.storage.add_bulk_matrix(keys, matrix)
+        finally:
+            self.invalidate(keys)
+
+    def get_vectors(self, keys: Sequence[KT]) -> Tuple[Sequence[KT], Sequence[VT]]:
+        return self._lookup(keys)
+
+    def get_matrix(self, keys: Sequence[KT]) -> Tuple[Sequence[KT], MT]:
+        ret_keys, vectors = self._lookup(keys)
+        if not ret_keys:
+            # Let the wrapped storage build an empty matrix with the right shape and dtype
+            return self.storage.get_matrix([])
+        return ret_keys, stack_vectors(vectors) # type: ignore
+
+    def get_matrix_chunked(self, keys: Sequence[KT], chunk_size: int = 200) -> Iterator[Tuple[Sequence[KT], MT]]:
+        for key_chunk in divide_sequence(keys, chunk_size):
+            ret_keys, matrix = self.get_matrix(key_chunk)
+            if ret_keys:
+                yield ret_keys, matrix
+
+    def get_vectors_chunked(self, keys: Sequence[KT], chunk_size: int = 200) -> Iterator[Tuple[Sequence[KT], Sequence[VT]]]:
+        for key_chunk in divide_sequence(keys, chunk_size):
+            ret_keys, vectors = self._lookup(key_chunk)
+            if ret_keys:
+                yield ret_keys, vectors
+
+    def get_vectors_zipped(self, keys: Sequence[KT], chunk_size: int = 200) -> Iterator[Sequence[Tuple[KT, VT]]]:
+        for ret_keys, vectors in self.get_vectors_chunked(keys, chunk_size):
+            yield list(zip(ret_keys, vectors))
+
+    def matrices_chunker(self, chunk_size: int = 200) -> Iterator[Tuple[Sequence[KT], MT]]:
+        yield from self.storage.matrices_chunker(chunk_size)
+
+    def vectors_chunker(self, chunk_size: int = 200) -> Iterator[Sequence[Tuple[KT, VT]]]:
+        for keys, matrix in self.storage.matrices_chunker(chunk_size):
+            yield list(zip(keys, matrix_to_vector_list(matrix))) # type: ignore
+
+    def __enter__(self) -> CachedVectorStorage[KT, VT, MT]:
+        self.storage.__enter__()
+        return self
+
+    def __exit__(self, type: Any, value: Any, traceback: Any) -> None:
+        self.storage.__exit__(type, value, traceback)
+
+    def reload(self) -> None:
+        self.clear_cache()
+        self.storage.reload()
@@ -0,0 +1,565 @@
+# Copyright (C) 2021 The InstanceLib Authors. All Rights Reserved.
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+from __future__ import annotations
+
+from typing import (Any, Dict, FrozenSet, Generic, Iterable, Iterator, List,
+                    Optional, Sequence, Set, Tuple, Union)
+from uuid import uuid4
+
+import numpy as np
+import numpy.typing as npt
+
+from ..typehints import DT, KT, RT, VT
+from ..utils.chunks import divide_iterable_in_lists, divide_sequence
+from ..utils.numpy import matrix_to_vector_list
+from .base import Instance, InstanceProvider
+from .children import MemoryChildrenMixin
+from .keyindex import INT_KEYS, UUID_KEYS, SortedKeyIndex, infer_key_kind
+
+
+class ObjectColumn:
+    """A growable column of Python objects, stored in a NumPy object array
+
+    Parameters
+    ----------
+    values : Sequence[Any], optional
+        The initial values, by default empty
+    """
+
+    def __init__(self, values: Sequence[Any] = ()) -> None:
+        self._values: npt.NDArray[Any] = np.empty(max(len(values), 16), dtype=object)
+        self._values[:len(values)] = list(values)
+        self._size = len(values)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, values: Sequence[Any]) -> None:
+        needed = self._size + len(values)
+        if needed > len(self._values):
+            grown = np.empty(max(needed, 2 * len(self._values)), dtype=object)
+            grown[:self._size] = self._values[:self._size]
+            self._values = grown
+        self._values[self._size:needed] = list(values)
+        self._size = needed
+
+    def __getitem__(self, row: int) -> Any:
+        return self._values[row]
+
+    def __setitem__(self, row: int, value: Any) -> None:
+        self._values[row] = value
+
+    def take(self, rows: Union[slice, npt.NDArray[np.int64]]) -> List[Any]:
+        return self._values[:self._size][rows].tolist()
+
+
+class TextColumn:
+    """A growable column of strings, stored as UTF-8 bytes in one buffer
+    with a start and end offset per row. This avoids one Python object per
+    string; the strings are decoded when they are read. Replacing a string
+    appends the new value to the buffer.
+
+    Parameters
+    ----------
+    values : Sequence[str], optional
+        The initial values, by default empty
+    """
+
+    def __init__(self, values: Sequence[str] = ()) -> None:
+        self._buffer: npt.NDArray[np.uint8] = np.empty(0, dtype=np.uint8)
+        self._n_bytes = 0
+        self._starts: npt.NDArray[np.int64] = np.empty(0, dtype=np.int64)
+        self._ends: npt.NDArray[np.int64] = np.empty(0, dtype=np.int64)
+        self._size = 0
+        self.append(values)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _write(self, encoded: bytes) -> int:
+        needed = self._n_bytes + len(encoded)
+        if needed > len(self._buffer):
+            grown = np.empty(max(needed, 2 * len(self._buffer)), dtype=np.uint8)
+            grown[:self._n_bytes] = self._buffer[:self._n_bytes]
+            self._buffer = grown
+        start = self._n_bytes
+        self._buffer[start:needed] = np.frombuffer(encoded, dtype=np.uint8)
+        self._n_bytes = needed
+        return start
+
+    def append(self, values: Sequence[str]) -> None:
+        encoded = [value.encode("utf-8") for value in values]
+        lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+        start = self._write(b"".join(encoded))
+        ends = start + np.cumsum(lengths)
+        needed = self._size + len(encoded)
+        if needed > len(self._starts):
+            capacity = max(needed, 2 * len(self._starts), 16)
+            self._starts = np.resize(self._starts, capacity)
+            self._ends = np.resize(self._ends, capacity)
+        self._starts[self._size:needed] = ends - lengths
+        self._ends[self._size:needed] = ends
+        self._size = needed
+
+    def __getitem__(self, row: int) -> str:
+        return self._buffer[self._starts[row]:self._ends[row]].tobytes().decode("utf-8")
+
+    def __setitem__(self, row: int, value: str) -> None:
+        encoded = value.encode("utf-8")
+        start = self._write(encoded)
+        self._starts[row], self._ends[row] = start, start + len(encoded)
+
+    def take(self, rows: Union[slice, npt.NDArray[np.int64]]) -> List[str]:
+        starts = self._starts[:self._size][rows]
+        ends = self._ends[:self._size][rows]
+        buffer = self._buffer
+        return [buffer[start:end].tobytes().decode("utf-8")
+                for start, end in zip(starts.tolist(), ends.tolist())]
+
+
+class ColumnarInstance(Instance[KT, DT, VT, RT], Generic[KT, DT, VT, RT]):
+    """A view on one row of a :class:`ColumnarProvider`.
+    The view stores only the provider and the key; all properties
+    are read from (and written to) the columns of the provider.
+    """
+
+    def __init__(self, provider: ColumnarProvider[KT, DT, VT, RT], identifier: KT) -> None:
+        self._provider = provider
+        self._identifier = identifier
+
+    @property
+    def identifier(self) -> KT:
+        return self._identifier
+
+    @identifier.setter
+    def identifier(self, value: KT) -> None:
+        raise AttributeError("The identifier of a columnar instance cannot be changed")
+
+    @property
+    def data(self) -> DT:
+        return self._provider._data[self._provider._row(self._identifier)]
+
+    @property
+    def representation(self) -> RT:
+        return self._provider._get_representation(self._provider._row(self._identifier))
+
+    @property
+    def vector(self) -> Optional[VT]:
+        return self._provider._get_vector(self._provider._row(self._identifier))
+
+    @vector.setter
+    def vector(self, value: Optional[VT]) -> None:  # type: ignore
+        if value is not None:
+            self._provider.bulk_add_vectors([self._identifier], [value])
+
+
+class ColumnarProvider(MemoryChildrenMixin[ColumnarInstance[KT, DT, VT, RT], KT, DT, VT, RT],
+                       InstanceProvider[ColumnarInstance[KT, DT, VT, RT], KT, DT, VT, RT],
+                       Generic[KT, DT, VT, RT]):
+    """An in-memory provider that stores its instances in columns instead of
+    one Python object per instance:
+
+    - The keys in a :class:`~instancelib.instances.keyindex.SortedKeyIndex`
+    - The data in a NumPy object array, or in a single UTF-8 buffer
+      (`text_buffer`)
+    - The vectors in one preallocated 2-D matrix with a mask for the rows
+      that have a vector
+    - The representations only if they differ from the data
+
+    Instances are materialized as :class:`ColumnarInstance` views on
+    ``__getitem__``. The chunkers and :meth:`bulk_get_vectors` slice
+    the columns directly. Deleted rows are masked and reused when
+    their key is added again. Keys that are added one by one are buffered
+    and merged into the sorted index in batches.
+
+    Only dense (NumPy) vectors are supported.
+
+    Parameters
+    ----------
+    keys : Sequence[KT], optional
+        The identifiers, by default empty
+    data : Sequence[DT], optional
+        The data of each instance, by default empty
+    vectors : Optional[Union[Sequence[Optional[VT]], npt.NDArray[Any]]], optional
+        A vector (or None) per instance or a matrix with a row per instance,
+        by default None
+    representations : Optional[Sequence[RT]], optional
+        The representation of each instance, by default None (the data)
+    text_buffer : bool, optional
+        Store the data (which should be strings) in a UTF-8 buffer, by default False
+    """
+
+    def __init__(self,
+                 keys: Sequence[KT] = (),
+                 data: Sequence[DT] = (),
+                 vectors: Optional[Union[Sequence[Optional[VT]], npt.NDArray[Any]]] = None,
+                 representations: Optional[Sequence[RT]] = None,
+                 text_buffer: bool = False) -> None:
+        assert len(keys) == len(data)
+        self.text_buffer = text_buffer
+        self.index: SortedKeyIndex[KT] = SortedKeyIndex.from_keys(keys)
+        if len(self.index) and len(np.unique(self.index.row_keys)) != len(keys):
+            raise ValueError("The keys should be unique")
+        self._pending: Dict[KT, int] = dict()
+        self._pending_keys: List[KT] = list()
+        self._data: Union[ObjectColumn, TextColumn] = (
+            TextColumn(data) if text_buffer else ObjectColumn(data)) # type: ignore
+        self._representations: Optional[ObjectColumn] = None
+        self._alive: npt.NDArray[np.bool_] = np.ones(len(keys), dtype=np.bool_)
+        self._n_alive = len(keys)
+        self._vectors: Optional[npt.NDArray[Any]] = None
+        self._has_vector: npt.NDArray[np.bool_] = np.zeros(len(keys), dtype=np.bool_)
+        self.children: Dict[KT, Set[KT]] = dict()
+        self.parents: Dict[KT, KT] = dict()
+        if representations is not None:
+            self._set_representations(np.arange(len(keys)), data, representations)
+        if vectors is not None:
+            self._set_vectors(np.arange(len(keys)), vectors)
+
+    @classmethod
+    def from_provider(cls,
+                      provider: InstanceProvider[Any, KT, DT, VT, RT],
+                      text_buffer: bool = False,
+                      batch_size: int = 10000) -> ColumnarProvider[KT, DT, VT, RT]:
+        """Convert another provider to a columnar provider
+
+        Parameters
+        ----------
+        provider : InstanceProvider[Any, KT, DT, VT, RT]
+            The provider
+        text_buffer : bool, optional
+            Store the data in a UTF-8 buffer, by default False
+        batch_size : int, optional
+            The number of instances that is converted at once, by default 10000
+
+        Returns
+        -------
+        ColumnarProvider[KT, DT, VT, RT]
+            A new provider with the same instances
+        """
+        columnar = cls(text_buffer=text_buffer)
+        for chunk in provider.instance_chunker(batch_size):
+            columnar.add_columns(
+                [ins.identifier for ins in chunk],
+                [ins.data for ins in chunk],
+                [ins.vector for ins in chunk],
+                [ins.representation for ins in chunk])
+        return columnar
+
+    @classmethod
+    def from_data_and_indices(cls,
+                              indices: Sequence[KT],
+                              raw_data: Sequence[DT],
+                              vectors: Optional[Sequence[Optional[VT]]] = None,
+                              ) -> ColumnarProvider[KT, DT, VT, RT]:
+        if vectors is not None and len(vectors) != len(indices):
+            vectors = None
+        return cls(indices, raw_data, vectors)
+
+    @classmethod
+    def from_data(cls, raw_data: Sequence[DT]) -> ColumnarProvider[int, DT, VT, RT]:
+        return cls(list(range(len(raw_data))), raw_data) # type: ignore
+
+    def _flush_pending(self) -> None:
+        """Merge the buffered keys into the sorted index"""
+        if self._pending_keys:
+            self.index.append(self._pending_keys)
+            self._pending.clear()
+            self._pending_keys = list()
+
+    @property
+    def _n_rows(self) -> int:
+        return len(self.index) + len(self._pending_keys)
+
+    def _lookup(self, keys: Sequence[Any]) -> Tuple[npt.NDArray[np.bool_], npt.NDArray[np.int64]]:
+        """Find the rows of the keys that are present
+
+        Parameters
+        ----------
+        keys : Sequence[Any]
+            The keys
+
+        Returns
+        -------
+        Tuple[npt.NDArray[np.bool_], npt.NDArray[np.int64]]
+            A mask of the keys that are present and the rows of all keys
+        """
+        if len(keys) > 1:
+            self._flush_pending()
+        found, rows = self.index.lookup(keys)
+        if self._pending:
+            for i, key in enumerate(keys):
+                if not found[i] and key in self._pending:
+                    found[i], rows[i] = True, self._pending[key] # type: ignore
+        alive = np.zeros(len(keys), dtype=np.bool_)
+        alive[found] = self._alive[rows[found]]
+        return alive, rows
+
+    def _row(self, key: Any) -> int:
+        found, rows = self._lookup([key])
+        if not found[0]:
+            raise KeyError(key)
+        return int(rows[0])
+
+    def _reserve(self, n_rows: int) -> None:
+        if n_rows > len(self._alive):
+            capacity = max(n_rows, 2 * len(self._alive), 1024)
+            self._alive = np.resize(self._alive, capacity)
+            self._has_vector = np.resize(self._has_vector, capacity)
+            self._alive[self._n_rows:] = False
+            self._has_vector[self._n_rows:] = False
+            if self._vectors is not None:
+                vectors = np.zeros((capacity, self._vectors.shape[1]), dtype=self._vectors.dtype)
+                vectors[:self._vectors.shape[0]] = self._vectors[:capacity]
+                self._vectors = vectors
+
+    def _set_vectors(self, rows: npt.NDArray[np.int64],
+                     vectors: Union[Sequence[Optional[VT]], npt.NDArray[Any]]) -> None:
+        if isinstance(vectors, np.ndarray) and vectors.ndim == 2:
+            present = np.ones(len(rows), dtype=np.bool_)
+            matrix = vectors
+        else:
+            present = np.fromiter((v is not None for v in vectors), dtype=np.bool_, count=len(rows))
+            if not present.any():
+                return
+            matrix = np.vstack([v for v in vectors if v is not None]) # type: ignore
+        if self._vectors is None:
+            self._vectors = np.zeros((len(self._alive), matrix.shape[1]), dtype=matrix.dtype)
+        assert matrix.shape[1] == self._vectors.shape[1], "The vector dimension does not match"
+        self._vectors[rows[present]] = matrix
+        self._has_vector[rows[present]] = True
+
+    def _get_vector(self, row: int) -> Optional[VT]:
+        if self._vectors is None or not self._has_vector[row]:
+            return None
+        return self._vectors[row] # type: ignore
+
+    def _set_representations(self, rows: npt.NDArray[np.int64],
+                             data: Sequence[Any], representations: Sequence[Any]) -> None:
+        for row, value, rep in zip(rows.tolist(), data, representations):
+            same = rep is None or rep is value or (isinstance(rep, str) and rep == value)
+            if same and self._representations is None:
+                continue
+            if self._representations is None:
+                self._representations = ObjectColumn([None] * len(self._data))
+            if len(self._representations) < len(self._data):
+                self._representations.append([None] * (len(self._data) - len(self._representations)))
+            self._representations[row] = None if same else rep
+
+    def _get_representation(self, row: int) -> RT:
+        if self._representations is not None and row < len(self._representations):
+            rep = self._representations[row]
+            if rep is not None:
+                return rep
+        return self._data[row] # type: ignore
+
+    def add_columns(self,
+                    keys: Sequence[KT],
+                    data: Sequence[DT],
+                    vectors: Optional[Union[Sequence[Optional[VT]], npt.NDArray[Any]]] = None,
+                    representations: Optional[Sequence[RT]] = None) -> None:
+        """Add or replace instances in bulk
+
+        Parameters
+        ----------
+        keys : Sequence[KT]
+            The identifiers
+        data : Sequence[DT]
+            The data of each instance
+        vectors : Optional[Union[Sequence[Optional[VT]], npt.NDArray[Any]]], optional
+            A vector (or None) per instance or a matrix, by default None
+        representations : Optional[Sequence[RT]], optional
+            The representation of each instance, by default None (the data)
+        """
+        assert len(keys) == len(data)
+        if not len(keys):
+            return
+        self._flush_pending()
+        found, rows = self.index.lookup(keys)
+        new_idxs = np.flatnonzero(~found)
+        if len(new_idxs):
+            new_keys = [keys[i] for i in new_idxs]
+            if len(set(new_keys)) != len(new_keys):
+                raise ValueError("The keys should be unique")
+            self._reserve(self._n_rows + len(new_keys))
+            rows[new_idxs] = self.index.append(new_keys)
+            self._data.append([data[i] for i in new_idxs]) # type: ignore
+        for i in np.flatnonzero(found).tolist():
+            self._data[rows[i]] = data[i]
+        self._n_alive += int(np.count_nonzero(~self._alive[rows[found]])) + len(new_idxs)
+        self._alive[rows] = True
+        # Replaced instances lose their old vector and representation
+        self._has_vector[rows] = False
+        if self._representations is not None or representations is not None:
+            self._set_representations(
+                rows, data, representations if representations is not None else [None] * len(keys))
+        if vectors is not None:
+            self._set_vectors(rows, vectors)
+
+    def __iter__(self) -> Iterator[KT]:
+        for rows in divide_sequence(np.flatnonzero(self._alive[:len(self.index)]), 10000):
+            yield from self.index.keys_for_rows(rows)
+        for key, row in list(self._pending.items()):
+            if self._alive[row]:
+                yield key
+
+    def __getitem__(self, key: KT) -> ColumnarInstance[KT, DT, VT, RT]:
+        self._row(key)
+        return ColumnarInstance(self, key)
+
+    def __setitem__(self, key: KT, value: Instance[KT, DT, VT, RT]) -> None:
+        if (key in self._pending
+                or not len(self.index)
+                or infer_key_kind([key]) != self.index.kind
+                or len(self._pending_keys) >= max(1024, len(self.index) // 64)
+                or bool(self.index.lookup([key])[0][0])):
+            self.add_columns([key], [value.data], [value.vector], [value.representation])
+            return
+        # Buffer the new key instead of merging it into the sorted index directly
+        row = self._n_rows
+        self._reserve(row + 1)
+        self._pending[key] = row
+        self._pending_keys.append(key)
+        self._data.append([value.data]) # type: ignore
+        self._alive[row] = True
+        self._n_alive += 1
+        self._set_representations(np.array([row]), [value.data], [value.representation])
+        if value.vector is not None:
+            self._set_vectors(np.array([row]), [value.vector])
+
+    def __delitem__(self, key: KT) -> None:
+        row = self._row(key)
+        self._alive[row] = False
+        self._has_vector[row] = False
+        self._n_alive -= 1
+
+    def __len__(self) -> int:
+        return self._n_alive
+
+    def __contains__(self, key: object) -> bool:
+        found, _ = self._lookup([key])
+        return bool(found[0])
+
+    @property
+    def empty(self) -> bool:
+        return not self._n_alive
+
+    def get_all(self) -> Iterator[ColumnarInstance[KT, DT, VT, RT]]:
+        for key in self:
+            yield ColumnarInstance(self, key)
+
+    def clear(self) -> None:
+        self.__init__(text_buffer=self.text_buffer) # type: ignore
+
+    def create(self, *args: Any, **kwargs: Any) -> ColumnarInstance[KT, DT, VT, RT]:
+        """Create a new instance with a new identifier (the next integer for
+        integer keys, a new UUID otherwise)
+
+        Returns
+        -------
+        ColumnarInstance[KT, DT, VT, RT]
+            The new instance
+        """
+        from .memory import DataPoint
+        self._flush_pending()
+        new_key: Any
+        if self.index.kind == INT_KEYS and len(self.index):
+            new_key = int(self.index.sorted_keys[-1]) + 1
+        elif self.index.kind == UUID_KEYS or not len(self.index):
+            new_key = uuid4()
+        else:
+            new_key = str(uuid4())
+        self[new_key] = DataPoint(new_key, *args, **kwargs)
+        return self[new_key]
+
+    def _live_rows(self, keys: Sequence[KT], keep_order: bool = True) -> Tuple[List[KT], npt.NDArray[np.int64]]:
+        found, rows = self._lookup(keys)
+        ret_keys = [key for key, present in zip(keys, found) if present]
+        rows = rows[found]
+        if not keep_order:
+            order = np.argsort(rows, kind="stable")
+            ret_keys, rows = [ret_keys[i] for i in order], rows[order]
+        return ret_keys, rows
+
+    def bulk_add_vectors(self, keys: Sequence[KT], values: Sequence[VT]) -> None:
+        ret_keys, rows = self._live_rows(keys)
+        if len(ret_keys) != len(keys):
+            raise KeyError("Some of the keys are not present in this provider")
+        self._set_vectors(rows, values)
+
+    def bulk_get_vectors(self, keys: Sequence[KT]) -> Tuple[Sequence[KT], Sequence[VT]]:
+        ret_keys, rows = self._live_rows(keys)
+        with_vector = self._has_vector[rows]
+        if self._vectors is None or not with_vector.any():
+            return [], []
+        ret_keys = [key for key, present in zip(ret_keys, with_vector) if present]
+        return ret_keys, matrix_to_vector_list(self._vectors[rows[with_vector]])
+
+    @property
+    def with_vector(self) -> FrozenSet[KT]:
+        self._flush_pending()
+        mask = (self._alive & self._has_vector)[:len(self.index)]
+        return frozenset(self.index.keys_for_rows(np.flatnonzero(mask)))
+
+    @property
+    def without_vector(self) -> FrozenSet[KT]:
+        self._flush_pending()
+        mask = (self._alive & ~self._has_vector)[:len(self.index)]
+        return frozenset(self.index.keys_for_rows(np.flatnonzero(mask)))
+
+    def data_chunker(self, batch_size: int = 200) -> Iterator[Sequence[Tuple[KT, DT]]]:
+        self._flush_pending()
+        for rows in divide_sequence(np.flatnonzero(self._alive[:len(self.index)]), batch_size):
+            yield list(zip(self.index.keys_for_rows(rows), self._data.take(rows)))
+
+    def data_chunker_selector(self, keys: Iterable[KT], batch_size: int = 200,
+                              keep_order: bool = True) -> Iterator[Sequence[Tuple[KT, DT]]]:
+        if keep_order:
+            for key_chunk in divide_iterable_in_lists(keys, batch_size):
+                ret_keys, rows = self._live_rows(key_chunk)
+                if ret_keys:
+                    yield list(zip(ret_keys, self._data.take(rows)))
+            return
+        ret_keys, rows = self._live_rows(list(keys), keep_order=False)
+        for start in range(0, len(ret_keys), batch_size):
+            chunk_rows = rows[start:start + batch_size]
+            yield list(zip(ret_keys[start:start + batch_size], self._data.take(chunk_rows)))
+
+    def instance_chunker(self, batch_size: int = 200) -> Iterator[Sequence[ColumnarInstance[KT, DT, VT, RT]]]:
+        for chunk in divide_iterable_in_lists(self, batch_size):
+            yield [ColumnarInstance(self, key) for key in chunk]
+
+    def vector_chunker_selector(self, keys: Iterable[KT], batch_size: int = 200,
+                                keep_order: bool = True) -> Iterator[Sequence[Tuple[KT, VT]]]:
+        if not keep_order:
+            keys = self._live_rows(list(keys), keep_order=False)[0]
+        for key_chunk in divide_iterable_in_lists(keys, batch_size):
+            ret_keys, vectors = self.bulk_get_vectors(key_chunk)
+            if ret_keys:
+                yield list(zip(ret_keys, vectors))
+
+    def vector_chunker(self, batch_size: int = 200) -> Iterator[Sequence[Tuple[KT, VT]]]:
+        self._flush_pending()
+        if self._vectors is None:
+            return
+        mask = (self._alive & self._has_vector)[:len(self.index)]
+        for rows in divide_sequence(np.flatnonzero(mask), batch_size):
+            keys = self.index.keys_for_rows(rows)
+            yield list(zip(keys, matrix_to_vector_list(self._vectors[rows])))
+
+    def bulk_get_all(self) -> List[ColumnarInstance[KT, DT, VT, RT]]:
+        return list(self.get_all())
@@ -23,6 +23,7 @@ from .memory import AbstractMemoryProvider
 
 
 class UpdateHookInstance(Instance[KT, DT, VT, RT], ABC, Generic[KT, DT, VT, RT]):
+    __slots__ = ()
     _update_hook: "Optional[Callable[[UpdateHookInstance[KT, DT, VT, RT]], Any]]"
 
     def register_hook(self, 
@@ -94,12 +95,33 @@ class CombinationProvider(InstanceProvider[IT, KT, DT, VT, RT],
     def __contains__(self, item: object) -> bool:
         return item in self.index_map
 
-    def _divide_keys(self, keys: Iterable[KT]) -> Mapping[UUID, FrozenSet[KT]]:
+    def _divide_keys(self, keys: Iterable[KT]) -> Mapping[UUID, Sequence[KT]]:
         splits: Dict[UUID, List[KT]] = dict()
         for key in keys:
-            splits.setdefault(self.index_map[key], list()).append(key)
-        result = {prov_id: frozenset(values) for prov_id, values in splits.items()}
-        return result      
+            if key in self.index_map:
+                splits.setdefault(self.index_map[key], list()).append(key)
+        return splits
+
+    def _runs(self, keys: Iterable[KT]) -> Iterator[Tuple[UUID, Sequence[KT]]]:
+        """Divide `keys` in consecutive runs of keys that belong to the same provider"""
+        run: List[KT] = list()
+        run_id: Optional[UUID] = None
+        for key in keys:
+            if key not in self.index_map:
+                continue
+            prov_id = self.index_map[key]
+            if prov_id != run_id and run:
+                yield run_id, run # type: ignore
+                run = list()
+            run_id = prov_id
+            run.append(key)
+        if run:
+            yield run_id, run # type: ignore
+
+    def _split_selection(self, keys: Iterable[KT], keep_order: bool) -> Iterable[Tuple[UUID, Sequence[KT]]]:
+        if keep_order:
+            return self._runs(keys)
+        return self._divide_keys(keys).items()
 
     @property
     def _all_keys(self) -> FrozenSet[KT]:
@@ -113,20 +135,30 @@ class CombinationProvider(InstanceProvider[IT, KT, DT, VT, RT],
         return iter(self.key_list)            
 
     def data_chunker(self, batch_size: int = 200) -> Iterator[Sequence[Tuple[KT, DT]]]:
-        yield from self.data_chunker_selector(self.key_list, batch_size)
+        yield from self.data_chunker_selector(self.key_list, batch_size, keep_order=False)
 
-    def data_chunker_selector(self, keys: Iterable[KT], batch_size: int = 200) -> Iterator[Sequence[Tuple[KT, DT]]]:
-        splitted = self._divide_keys(keys)
-        for prov_id, prov_keys in splitted.items():
-            yield from self.combined[prov_id].data_chunker_selector(prov_keys, batch_size)
+    def data_chunker_selector(self, keys: Iterable[KT], batch_size: int = 200, keep_order: bool = True) -> Iterator[Sequence[Tuple[KT, DT]]]:
+        for prov_id, prov_keys in self._split_selection(keys, keep_order):
+            yield from self.combined[prov_id].data_chunker_selector(prov_keys, batch_size, keep_order)
     
-    def vector_chunker_selector(self, keys: Iterable[KT], batch_size: int = 200) -> Iterator[Sequence[Tuple[KT, VT]]]:
-        splitted = self._divide_keys(keys)
-        for prov_id, prov_keys in splitted.items():
-            yield from self.combined[prov_id].vector_chunker_selector(prov_keys, batch_size)
+    def vector_chunker_selector(self, keys: Iterable[KT], batch_size: int = 200, keep_order: bool = True) -> Iterator[Sequence[Tuple[KT, VT]]]:
+        for prov_id, prov_keys in self._split_selection(keys, keep_order):
+            yield from self.combined[prov_id].vector_chunker_selector(prov_keys, batch_size, keep_order)
 
     def vector_chunker(self, batch_size: int = 200) -> Iterator[Sequence[Tuple[KT, VT]]]:
-        yield from self.vector_chunker_selector(self.key_list, batch_size)
+        yield from self.vector_chunker_selector(self.key_list, batch_size, keep_order=False)
+
+    @property
+    def without_vector(self) -> FrozenSet[KT]:
+        return frozenset(
+            key
+            for prov_id, provider in self.combined.items()
+            for key in provider.without_vector
+            if self.index_map.get(key) == prov_id)
+
+    @property
+    def with_vector(self) -> FrozenSet[KT]:
+        return self._all_keys.difference(self.without_vector)
 
     def create(self, *args: Any, **kwargs: Any) -> IT:
         provider = next(iter(self.new_data.values()))
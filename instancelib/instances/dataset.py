@@ -1,13 +1,16 @@
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
+from io import UnsupportedOperation
 from threading import local
 from typing import (
     Any,
     Callable,
+    Dict,
     FrozenSet,
     Generic,
     Iterable,
     Iterator,
+    List,
     Mapping,
     MutableMapping,
     Optional,
@@ -17,18 +20,21 @@ from typing import (
     Union,
 )
 
+import numpy as np
 import numpy.typing as npt
 import pandas as pd
 
 from instancelib.environment.memory import MemoryEnvironment
-from instancelib.utils.func import union
 
 from ..typehints import DT, KT, RT, VT
-from ..utils.chunks import divide_iterable_in_lists
+from ..utils.chunks import divide_iterable_in_lists, divide_sequence
 from .base import Instance, InstanceProvider
 from .external import ExternalProvider
+from .instancecache import CachedInstanceMixin, InstanceCache
 from .hdf5 import HDF5VectorInstanceProvider
-from .memory import AbstractMemoryProvider
+from .memory import AbstractMemoryProvider, DataPointProvider
+from .memoryvectorstorage import DenseMemoryStorage
+from .vectorstorage import VectorStorage
 
 IT = TypeVar("IT", bound="Instance[Any, Any, Any, Any]")
 
@@ -57,53 +63,128 @@ class ReadOnlyDataset(
     def __iter__(self) -> Iterator[KT]:
         return iter(self.identifiers)
 
+    @property
+    def key_list(self) -> Sequence[KT]:
+        return list(self)
+
 
 class PandasDataset(ReadOnlyDataset[int, Any]):
+    """A read-only dataset that serves the column `data_col` of a
+    :class:`pandas.DataFrame`. The keys are the row positions (``0`` to
+    ``len(df) - 1``).
+
+    The column is converted to a NumPy array once, so that single
+    lookups and :meth:`get_bulk` are positional array accesses instead
+    of row lookups in the DataFrame. Changes to `df` after construction
+    are not visible.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        The DataFrame
+    data_col : str
+        The column that contains the data
+    """
+
     def __init__(self, df: pd.DataFrame, data_col: str) -> None:
         self.df = df
         self.data_col = data_col
-        self.ids = frozenset(range(0, len(self.df)))
+        self.data: npt.NDArray[Any] = df[data_col].to_numpy()
+        self._ids: Optional[FrozenSet[int]] = None
 
     def __getitem__(self, __k: int) -> Any:
-        data: Any = self.df.iloc[__k][self.data_col]
-        return data
+        if __k not in self:
+            raise KeyError(__k)
+        return self.data[__k]
 
     def __len__(self) -> int:
-        return len(self.df)
+        return len(self.data)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(len(self.data)))
+
+    @property
+    def ids(self) -> FrozenSet[int]:
+        if self._ids is None:
+            self._ids = frozenset(range(len(self.data)))
+        return self._ids
 
     @property
     def identifiers(self) -> FrozenSet[int]:
         return self.ids
 
+    @property
+    def key_list(self) -> Sequence[int]:
+        return range(len(self.data))
+
     def __contains__(self, __o: object) -> bool:
-        return __o in self.ids
+        return (isinstance(__o, (int, np.integer))
+                and not isinstance(__o, bool)
+                and 0 <= __o < len(self.data))
 
     def get_bulk(self, keys: Sequence[int]) -> Sequence[Any]:
-        data: Sequence[Any] = self.df.iloc[keys][self.data_col]  # type: ignore
-        return data
+        if isinstance(keys, range):
+            data: Sequence[Any] = self.data[keys.start:keys.stop:keys.step].tolist()
+            return data
+        return self.data[np.asarray(keys, dtype=np.int64)].tolist()
 
 
 class ReadOnlyProvider(
-    InstanceProvider[IT, KT, DT, npt.NDArray[Any], RT], Generic[IT, KT, DT, RT]
+    CachedInstanceMixin[KT, IT],
+    InstanceProvider[IT, KT, DT, npt.NDArray[Any], RT],
+    Generic[IT, KT, DT, RT],
 ):
+    """A provider that builds its instances on demand from a
+    :class:`ReadOnlyDataset`. Instances that are added or replaced
+    are stored in `local_data`, which takes precedence over the dataset.
+    The instances that were built from the dataset are kept in
+    a bounded :class:`~instancelib.instances.instancecache.InstanceCache`.
+    The vectors of these instances are kept in `vectors`, so they survive
+    the eviction of the instance from the cache.
+
+    The list of keys (the keys of the dataset, followed by the keys that
+    only exist in `local_data`) is computed once and only recomputed
+    after `local_data` has changed.
+
+    Parameters
+    ----------
+    dataset : ReadOnlyDataset[KT, DT]
+        The dataset
+    from_data_builder : Callable[[KT, DT], IT]
+        A function that builds an instance from a key and its data
+    local_data : Optional[InstanceProvider[IT, KT, DT, npt.NDArray[Any], RT]], optional
+        The provider for the local instances, by default None (a new, empty
+        :class:`~instancelib.instances.memory.DataPointProvider`)
+    vectors : Optional[VectorStorage[KT, npt.NDArray[Any], npt.NDArray[Any]]], optional
+        The storage for the vectors of the dataset instances, by default None
+        (a new :class:`~instancelib.instances.memoryvectorstorage.DenseMemoryStorage`)
+    """
 
     local_data: InstanceProvider[IT, KT, DT, npt.NDArray[Any], RT]
+    vectors: VectorStorage[KT, npt.NDArray[Any], npt.NDArray[Any]]
     _stores: Sequence[Mapping[KT, Any]]
 
     def __init__(
         self,
         dataset: ReadOnlyDataset[KT, DT],
         from_data_builder: Callable[[KT, DT], IT],
-        local_data: InstanceProvider[IT, KT, DT, npt.NDArray[Any], RT],
+        local_data: Optional[InstanceProvider[IT, KT, DT, npt.NDArray[Any], RT]] = None,
+        vectors: Optional[VectorStorage[KT, npt.NDArray[Any], npt.NDArray[Any]]] = None,
     ) -> None:
-        self.instance_cache = dict()
+        self.instance_cache = InstanceCache()
         self.dataset = dataset
+        self.local_data = DataPointProvider([]) if local_data is None else local_data # type: ignore
+        self.vectors = DenseMemoryStorage.create() if vectors is None else vectors
         self._stores = (self.local_data, self.instance_cache, self.dataset)
         self.from_data_builder = from_data_builder
+        self._key_list: Optional[List[KT]] = None
+        self._local_len = -1
 
     def build_from_external(self, k: KT) -> IT:
         data = self.dataset[k]
         ins = self.from_data_builder(k, data)
+        if k in self.vectors:
+            ins.vector = self.vectors[k]
         return ins
 
     def update_external(
@@ -111,13 +192,20 @@ class ReadOnlyProvider(
     ) -> None:
         return super().update_external(ins)
 
+    def invalidate_index(self) -> None:
+        """Recompute the list of keys on the next access. Call this after
+        changing `local_data` directly (changes through this provider
+        invalidate the list automatically).
+        """
+        self._key_list = None
+
     def __getitem__(self, k: KT) -> IT:
-        if k in self.instance_cache:
-            instance = self.instance_cache[k]
-            return instance
         if k in self.local_data:
             instance = self.local_data[k]
             return instance
+        instance = self.instance_cache.get(k)
+        if instance is not None:
+            return instance
         if k in self.dataset:
             instance = self.build_from_external(k)
             self.instance_cache[k] = instance
@@ -126,69 +214,152 @@ class ReadOnlyProvider(
             f"Instance with key {k} is not present in this provider"
         )
 
-    def __contains__(self, item: object) -> bool:
-        disjunction = any(map(lambda x: item in x, self._stores))
-        return disjunction
-
-    def _get_local_keys(self, keys: Iterable[KT]) -> FrozenSet[KT]:
-        return frozenset(self.local_data).intersection(keys)
+    def __setitem__(self, k: KT, value: IT) -> None:
+        self.local_data[k] = value
+        self.instance_cache.pop(k, None)
+        self.invalidate_index()
 
-    def _get_cached_keys(self, keys: Iterable[KT]) -> FrozenSet[KT]:
-        return frozenset(self.instance_cache).intersection(keys)
+    def __delitem__(self, k: KT) -> None:
+        if k in self.dataset:
+            raise UnsupportedOperation(
+                f"Instance with key {k} is part of the read-only dataset")
+        del self.local_data[k]
+        self.invalidate_index()
 
-    def _get_external_keys(self, keys: Iterable[KT]) -> FrozenSet[KT]:
-        return frozenset(self.dataset).intersection(keys)
+    def __contains__(self, item: object) -> bool:
+        return item in self.dataset or item in self.local_data
 
-    def _cached_data(
-        self, keys: Iterable[KT], batch_size: int = 200
-    ) -> Iterator[Sequence[Tuple[KT, DT]]]:
-        chunks = divide_iterable_in_lists(keys, batch_size)
-        c = self.instance_cache
-        for chunk in chunks:
-            yield [(k, c[k].data) for k in chunk]
+    def __len__(self) -> int:
+        return len(self.key_list)
 
-    def _local_data(
-        self, keys: Iterable[KT], batch_size: int = 200
-    ) -> Iterator[Sequence[Tuple[KT, DT]]]:
-        return self.local_data.data_chunker_selector(keys, batch_size)
+    @property
+    def empty(self) -> bool:
+        return not self.key_list
 
-    def _external_data(
-        self, keys: Iterable[KT], batch_size: int = 200
-    ) -> Iterator[Sequence[Tuple[KT, DT]]]:
-        chunks = divide_iterable_in_lists(keys, batch_size)
-        for chunk in chunks:
-            datas = self.dataset.get_bulk(chunk)
-            result = list(zip(chunk, datas))
-            yield result
+    def get_all(self) -> Iterator[IT]:
+        for key in self.key_list:
+            yield self[key]
 
-    @property
-    def _all_keys(self) -> FrozenSet[KT]:
-        return union(*map(lambda x: frozenset(x.keys()), self._stores))
+    def clear(self) -> None:
+        raise UnsupportedOperation("The dataset of a ReadOnlyProvider is read-only")
 
     @property
-    def key_list(self) -> Sequence[KT]:
-        return list(self._all_keys)
+    def key_list(self) -> List[KT]:
+        if self._key_list is None or self._local_len != len(self.local_data):
+            keys = list(self.dataset.key_list)
+            keys.extend(k for k in self.local_data if k not in self.dataset)
+            self._key_list = keys
+            self._local_len = len(self.local_data)
+        return self._key_list
 
     def __iter__(self) -> Iterator[KT]:
         return iter(self.key_list)
 
+    def _chunk_data(self, chunk: Sequence[KT]) -> Sequence[Tuple[KT, DT]]:
+        local, cache = self.local_data, self.instance_cache
+        if not local and not cache:
+            return list(zip(chunk, self.dataset.get_bulk(chunk)))
+        found: Dict[KT, DT] = dict()
+        external: List[KT] = list()
+        for key in chunk:
+            if key in local:
+                found[key] = local[key].data
+            elif key in cache:
+                found[key] = cache[key].data
+            elif key in self.dataset:
+                external.append(key)
+        if external:
+            found.update(zip(external, self.dataset.get_bulk(external)))
+        return [(key, found[key]) for key in chunk if key in found]
+
     def data_chunker(
         self, batch_size: int = 200
     ) -> Iterator[Sequence[Tuple[KT, DT]]]:
-        yield from self.data_chunker_selector(self.key_list)
+        for chunk in divide_sequence(self.key_list, batch_size):
+            yield self._chunk_data(chunk)
 
     def data_chunker_selector(
-        self, keys: Iterable[KT], batch_size: int = 200
+        self, keys: Iterable[KT], batch_size: int = 200, keep_order: bool = True
     ) -> Iterator[Sequence[Tuple[KT, DT]]]:
-        keyset = frozenset(keys)
-        local_keys = self._get_local_keys(keyset)
-        yield from super().data_chunker_selector(local_keys, batch_size)
-        remaining_keys = frozenset(keyset).difference(local_keys)
-        cached_keys = self._get_cached_keys(remaining_keys)
-        yield from self._cached_data(cached_keys)
-        remaining_keys = remaining_keys.difference(cached_keys)
-        external_keys = self._get_external_keys(remaining_keys)
-        yield from self._external_data(external_keys)
+        present = (key for key in keys if key in self)
+        for chunk in divide_iterable_in_lists(present, batch_size):
+            yield self._chunk_data(chunk)
+
+    def _split_local(self, keys: Sequence[KT]) -> Tuple[List[int], List[int]]:
+        # The positions of the keys in `local_data` and in the dataset
+        local: List[int] = list()
+        external: List[int] = list()
+        for i, key in enumerate(keys):
+            (local if key in self.local_data else external).append(i)
+        return local, external
+
+    def _uncache(self, keys: Iterable[KT]) -> None:
+        # Cached instances are rebuilt with their new vector on the next access
+        for key in keys:
+            self.instance_cache.pop(key, None)
+
+    def bulk_add_vectors(
+        self, keys: Sequence[KT], values: Sequence[npt.NDArray[Any]]
+    ) -> None:
+        local, external = self._split_local(keys)
+        if local:
+            self.local_data.bulk_add_vectors(
+                [keys[i] for i in local], [values[i] for i in local])
+        if external:
+            ext_keys = [keys[i] for i in external]
+            self.vectors.add_bulk(ext_keys, [values[i] for i in external])
+            self._uncache(ext_keys)
+
+    def bulk_add_matrix(self, keys: Sequence[KT], matrix: Any) -> None:
+        local, _ = self._split_local(keys)
+        if local:
+            super().bulk_add_matrix(keys, matrix)
+            return
+        self.vectors.add_bulk_matrix(keys, matrix)
+        self._uncache(keys)
+
+    def bulk_get_vectors(
+        self, keys: Sequence[KT]
+    ) -> Tuple[Sequence[KT], Sequence[npt.NDArray[Any]]]:
+        local, external = self._split_local(keys)
+        found: Dict[KT, npt.NDArray[Any]] = dict()
+        if local:
+            found.update(zip(*self.local_data.bulk_get_vectors(
+                [keys[i] for i in local])))
+        ext_keys = [keys[i] for i in external if keys[i] in self.vectors]
+        if ext_keys:
+            found.update(zip(*self.vectors.get_vectors(ext_keys)))
+        ret_keys = [key for key in keys if key in found]
+        return ret_keys, [found[key] for key in ret_keys]
+
+    @property
+    def with_vector(self) -> FrozenSet[KT]:
+        external = frozenset(
+            key for key in self.vectors if key not in self.local_data)
+        return external.union(self.local_data.with_vector)
+
+    @property
+    def without_vector(self) -> FrozenSet[KT]:
+        return frozenset(self.key_list).difference(self.with_vector)
+
+    def get_children_keys(
+        self, parent: Union[KT, Instance[KT, DT, npt.NDArray[Any], RT]]
+    ) -> Sequence[KT]:
+        return self.local_data.get_children_keys(parent)
+
+    def get_children(self, parent: Union[KT, IT]) -> Sequence[IT]:
+        return self.local_data.get_children(parent)
+
+    def get_parent(self, child: Union[KT, IT]) -> IT:
+        return self.local_data.get_parent(child)
+
+    def add_child(self, parent: Union[KT, IT], child: Union[KT, IT]) -> None:
+        self.local_data.add_child(parent, child)
+
+    def discard_children(
+        self, parent: Union[KT, Instance[KT, DT, npt.NDArray[Any], RT]]
+    ) -> None:
+        self.local_data.discard_children(parent)
 
     def construct(*args: Any, **kwargs: Any) -> IT:
         raise NotImplementedError
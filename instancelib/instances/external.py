@@ -1,15 +1,18 @@
 from abc import abstractmethod
 from .base import InstanceProvider, Instance
+from .instancecache import CachedInstanceMixin
 from ..typehints import KT, DT, VT, RT
-from typing import Any, Dict, TypeVar, Generic
+from typing import Any, MutableMapping, TypeVar, Generic
 
 IT = TypeVar("IT", bound="Instance[Any, Any, Any, Any]")
 
 
 class ExternalProvider(
-    InstanceProvider[IT, KT, DT, VT, RT], Generic[IT, KT, DT, VT, RT]
+    CachedInstanceMixin[KT, IT],
+    InstanceProvider[IT, KT, DT, VT, RT],
+    Generic[IT, KT, DT, VT, RT],
 ):
-    instance_cache: Dict[KT, IT]
+    instance_cache: MutableMapping[KT, IT]
 
     @abstractmethod
     def build_from_external(self, k: KT) -> IT:
@@ -19,14 +22,11 @@ class ExternalProvider(
     def update_external(self, ins: Instance[KT, DT, VT, RT]) -> None:
         raise NotImplementedError
 
-    def clear_cache(self) -> None:
-        self.instance_cache.clear()
-
     def __getitem__(self, k: KT) -> IT:
+        instance = self.instance_cache.get(k)
+        if instance is not None:
+            return instance
         if k in self:
-            if k in self.instance_cache:
-                instance = self.instance_cache[k]
-                return instance
             instance = self.build_from_external(k)
             self.instance_cache[k] = instance
             return instance
@@ -3,6 +3,7 @@ from os import PathLike
 from .hdf5vector import HDF5VectorStorage
 from typing import (
     Any,
+    FrozenSet,
     Generic,
     Iterable,
     Iterator,
@@ -46,19 +47,31 @@ class ExternalVectorInstanceProvider(
         return ret_keys, vectors
 
     def vector_chunker_selector(
-        self, keys: Iterable[KT], batch_size: int = 200
+        self, keys: Iterable[KT], batch_size: int = 200, keep_order: bool = True
     ) -> Iterator[Sequence[Tuple[KT, VT]]]:
         if self.vectorstorage is None:
             self.vectorstorage = self.load_vectors()
-        results = self.vectorstorage.get_vectors_zipped(list(keys), batch_size)
+        results = self.vectorstorage.select_vectors(keys, batch_size, keep_order)
         return results
 
     def vector_chunker(
         self, batch_size: int = 200
     ) -> Iterator[Sequence[Tuple[KT, VT]]]:
-        results = self.vector_chunker_selector(self.key_list, batch_size)
+        results = self.vector_chunker_selector(self.key_list, batch_size, keep_order=False)
         return results
 
+    @property
+    def with_vector(self) -> FrozenSet[KT]:
+        if self.vectorstorage is None:
+            self.vectorstorage = self.load_vectors()
+        return frozenset(self).intersection(self.vectorstorage)
+
+    @property
+    def without_vector(self) -> FrozenSet[KT]:
+        if self.vectorstorage is None:
+            self.vectorstorage = self.load_vectors()
+        return frozenset(self).difference(self.vectorstorage)
+
 
 class HDF5VectorInstanceProvider(
     ExternalVectorInstanceProvider[
@@ -75,8 +88,11 @@ class HDF5VectorInstanceProvider(
     def bulk_add_vectors(
         self, keys: Sequence[KT], values: Sequence[npt.NDArray[Any]]
     ) -> None:
-        with HDF5VectorStorage[KT, Any](
-            self.vector_storage_location, "a"
-        ) as writeable_storage:
-            writeable_storage.add_bulk(keys, values)
-        self.vectorstorage = self.load_vectors()
+        if self.vectorstorage is None:
+            self.vectorstorage = self.load_vectors()
+        assert isinstance(self.vectorstorage, HDF5VectorStorage)
+        # Switch to a writeable mode once; the index in memory stays valid
+        # after writing, so the storage is not reloaded after every write
+        if not self.vectorstorage.writeable:
+            self.vectorstorage.reopen("a")
+        self.vectorstorage.add_bulk(keys, values)
@@ -17,15 +17,19 @@
 from __future__ import annotations
 
 from os import PathLike
-from typing import Any, Iterator, Optional, Sequence, Union
+from typing import Any, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 
+import numpy as np
 import numpy.typing as npt
 import pandas as pd  # type: ignore
 
+from ..utils.chunks import divide_iterable_in_lists, divide_sequence
 from .base import Instance
 from .external import ExternalProvider
+from .instancecache import InstanceCache
 from .hdf5 import HDF5VectorInstanceProvider
 from .hdf5vector import HDF5VectorStorage
+from .keyindex import SortedKeyIndex
 from .memory import DataPoint
 from .text import TextInstance
 
@@ -91,6 +95,30 @@ class HDF5TextProvider(
         HDF5TextInstance, Union[int, str], str, npt.NDArray[Any], str
     ],
 ):
+    """A provider for text stored in a pandas HDF5 file
+    (written with :meth:`pandas.DataFrame.to_hdf`), with the vectors stored
+    in a separate :class:`~instancelib.instances.hdf5vector.HDF5VectorStorage`.
+
+    The identifier column is read once to build an index from identifiers
+    to row positions. Instances are then read in batches: for files in the
+    ``table`` format, only the requested rows (by coordinate) or row groups
+    (by `start` and `stop`) are read. Files in the ``fixed`` format do not
+    support partial reads; they are read once and kept in memory.
+
+    Parameters
+    ----------
+    data_storage : PathLike[str]
+        The path of the pandas HDF5 file
+    vector_storage_location : PathLike[str]
+        The path of the vector file
+    hdf5_dataset : str
+        The key of the DataFrame in the HDF5 file
+    id_col : str
+        The column that contains the identifiers
+    data_cols : Sequence[str]
+        The columns that are joined (separated by spaces) to form the text
+    """
+
     def __init__(
         self,
         data_storage: "PathLike[str]",
@@ -99,7 +127,7 @@ class HDF5TextProvider(
         id_col: str,
         data_cols: Sequence[str],
     ) -> None:
-        self.instance_cache = {}
+        self.instance_cache = InstanceCache()
         self.hdf5_dataset = hdf5_dataset
         self.id_col = id_col
         self.data_cols: Sequence[str] = data_cols
@@ -108,25 +136,109 @@ class HDF5TextProvider(
         self.vectorstorage = HDF5VectorStorage[Union[int, str], Any](
             vector_storage_location
         )
+        self._index: Optional[SortedKeyIndex[Union[int, str]]] = None
+        self._is_table = True
+        self._frame: Optional[pd.DataFrame] = None
 
-    def build_from_external(self, k: Union[int, str]) -> HDF5TextInstance:
+    @property
+    def index(self) -> SortedKeyIndex[Union[int, str]]:
+        """The index from identifiers to row positions, which is built
+        from the identifier column on first use
+        """
+        if self._index is None:
+            self.reload_index()
+        assert self._index is not None
+        return self._index
+
+    def reload_index(self) -> None:
+        """Read the identifier column again, e.g., after the file has been replaced
+        """
+        with pd.HDFStore(self.data_storage, mode="r") as store:
+            self._is_table = store.get_storer(self.hdf5_dataset).is_table
+            if self._is_table:
+                ids = store.select(self.hdf5_dataset, columns=[self.id_col])[self.id_col]
+                self._frame = None
+            else:
+                self._frame = store.select(self.hdf5_dataset)
+                ids = self._frame[self.id_col]
+        self._index = SortedKeyIndex.from_keys(ids.tolist())
+
+    def _read_rows(
+        self,
+        rows: Union[npt.NDArray[np.int64], slice],
+        store: Optional[pd.HDFStore] = None,
+    ) -> pd.DataFrame:
+        """Read a batch of rows, given as ascending row positions or a slice.
+        Pass an open `store` to read several batches without reopening the file.
+        """
+        columns = [self.id_col, *self.data_cols]
+        if not self._is_table:
+            assert self._frame is not None
+            return self._frame.iloc[rows][columns]
+        if store is None:
+            with pd.HDFStore(self.data_storage, mode="r") as new_store:
+                return self._read_rows(rows, new_store)
+        if isinstance(rows, slice):
+            return store.select(
+                self.hdf5_dataset, start=rows.start, stop=rows.stop, columns=columns)
+        return store.select(self.hdf5_dataset, where=rows, columns=columns)
+
+    def _texts(self, frame: pd.DataFrame) -> List[str]:
+        texts = frame[self.data_cols[0]].astype(str)
+        for col in self.data_cols[1:]:
+            texts = texts + " " + frame[col].astype(str)
+        return texts.tolist()
+
+    def _row_batches(
+        self, keys: Iterable[Union[int, str]], batch_size: int, keep_order: bool
+    ) -> Iterator[Tuple[List[Union[int, str]], List[str]]]:
+        """Read the text of `keys` in batches. Keys that are not present
+        are skipped. Every batch is read with one coordinate selection.
+        """
+        keylist = list(keys)
+        found, rows = self.index.lookup(keylist)
+        selected = np.flatnonzero(found)
+        if not keep_order:
+            selected = selected[np.argsort(rows[selected], kind="stable")]
+        if not len(selected):
+            return
+        store = pd.HDFStore(self.data_storage, mode="r") if self._is_table else None
+        try:
+            for positions in divide_sequence(selected, batch_size):
+                # Coordinate selections require unique, ascending rows
+                unique_rows, inverse = np.unique(rows[positions], return_inverse=True)
+                texts = self._texts(self._read_rows(unique_rows, store))
+                ordered = [texts[i] for i in inverse.tolist()]
+                yield [keylist[i] for i in positions], ordered
+        finally:
+            if store is not None:
+                store.close()
+
+    def _build_instances(
+        self, keys: Sequence[Union[int, str]], texts: Sequence[str]
+    ) -> List[HDF5TextInstance]:
         if self.vectorstorage is None:
             self.vectorstorage = self.load_vectors()
-        df = self.dataframe
-        row = df[df[self.id_col] == k]  # type: ignore
-        vec = self.vectorstorage[k]
-        data: str = " ".join([row[col] for col in self.data_cols])  # type: ignore
-        ins = HDF5TextInstance(
-            k,
-            data,
-            vec,
-            data,
-            tokenized=None,
-            map_to_original=None,
-            split_marker=None,
-            external=self,
-        )
-        return ins
+        vec_keys, vectors = self.vectorstorage.get_vectors(keys)
+        vector_dict = dict(zip(vec_keys, vectors))
+        return [
+            HDF5TextInstance(
+                key,
+                text,
+                vector_dict.get(key),
+                text,
+                tokenized=None,
+                map_to_original=None,
+                split_marker=None,
+                external=self,
+            )
+            for key, text in zip(keys, texts)
+        ]
+
+    def build_from_external(self, k: Union[int, str]) -> HDF5TextInstance:
+        for keys, texts in self._row_batches([k], 1, True):
+            return self._build_instances(keys, texts)[0]
+        raise KeyError(k)
 
     def update_external(
         self, ins: Instance[Union[int, str], str, npt.NDArray[Any], str]
@@ -139,9 +251,11 @@ class HDF5TextProvider(
         return df
 
     def __iter__(self) -> Iterator[Union[int, str]]:
-        key_col = self.dataframe[self.id_col]
-        for _, key in key_col.items():  # type: ignore
-            yield int(key)  # type: ignore
+        return iter(self.index)
+
+    @property
+    def key_list(self) -> List[Union[int, str]]:
+        return list(self.index.keys_for_rows(slice(None)))
 
     def __setitem__(
         self, key: int, value: Instance[int, str, npt.NDArray[Any], str]
@@ -152,18 +266,81 @@ class HDF5TextProvider(
         pass
 
     def __len__(self) -> int:
-        return len(self.dataframe)
+        return len(self.index)
 
     def __contains__(self, key: object) -> bool:
-        df = self.dataframe
-        return len(df[df[self.id_col] == key]) > 0  # type: ignore
+        return key in self.index
 
     @property
     def empty(self) -> bool:
-        return not self.dataframe
+        return not len(self)
 
     def get_all(self):
         yield from list(self.values())
 
     def clear(self) -> None:
         pass
+
+    def create(self, *args: Any, **kwargs: Any) -> HDF5TextInstance:
+        raise NotImplementedError
+
+    def get_children(self, parent: Any) -> Sequence[HDF5TextInstance]:
+        return []
+
+    def get_children_keys(self, parent: Any) -> Sequence[Union[int, str]]:
+        return []
+
+    def get_parent(self, child: Any) -> HDF5TextInstance:
+        raise KeyError(f"The instance {child} has no parent")
+
+    def add_child(self, parent: Any, child: Any) -> None:
+        raise NotImplementedError
+
+    def discard_children(self, parent: Any) -> None:
+        pass
+
+    def data_chunker(
+        self, batch_size: int = 200
+    ) -> Iterator[Sequence[Tuple[Union[int, str], str]]]:
+        n_rows = len(self)
+        with pd.HDFStore(self.data_storage, mode="r") as store:
+            for start in range(0, n_rows, batch_size):
+                frame = self._read_rows(slice(start, start + batch_size), store)
+                yield list(zip(frame[self.id_col].tolist(), self._texts(frame)))
+
+    def data_chunker_selector(
+        self,
+        keys: Iterable[Union[int, str]],
+        batch_size: int = 200,
+        keep_order: bool = True,
+    ) -> Iterator[Sequence[Tuple[Union[int, str], str]]]:
+        for batch_keys, texts in self._row_batches(keys, batch_size, keep_order):
+            yield list(zip(batch_keys, texts))
+
+    def instance_chunker(
+        self, batch_size: int = 200
+    ) -> Iterator[Sequence[HDF5TextInstance]]:
+        # A full scan reuses cached instances, but does not add to the cache
+        cache = self.instance_cache
+        for chunk in self.data_chunker(batch_size):
+            found = {key: cache[key] for key, _ in chunk if key in cache}
+            missing = [(key, text) for key, text in chunk if key not in found]
+            if missing:
+                keys, texts = zip(*missing)
+                found.update(zip(keys, self._build_instances(keys, texts)))
+            yield [found[key] for key, _ in chunk]
+
+    def instance_chunker_selector(
+        self, keys: Iterable[Union[int, str]], batch_size: int = 200
+    ) -> Iterator[Sequence[HDF5TextInstance]]:
+        cache = self.instance_cache
+        for key_chunk in divide_iterable_in_lists(keys, batch_size):
+            found = {key: cache[key] for key in key_chunk if key in cache}
+            missing = [key for key in key_chunk if key not in found]
+            for batch_keys, texts in self._row_batches(missing, batch_size, True):
+                for ins in self._build_instances(batch_keys, texts):
+                    cache[ins.identifier] = ins
+                    found[ins.identifier] = ins
+            chunk = [found[key] for key in key_chunk if key in found]
+            if chunk:
+                yield chunk
@@ -15,25 +15,41 @@
 # Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
 import itertools
+import logging
+import os
 import pickle
+from io import UnsupportedOperation
 from os import PathLike
-from typing import (Any, Callable, Dict, Generic, Iterator, Optional, Sequence,
+from typing import (Any, Callable, Dict, Generic, Iterable, Iterator, Optional, Sequence,
                     Tuple, Union)
 import h5py  # type: ignore
 import numpy as np  # type: ignore
 import numpy.typing as npt
-from h5py._hl.dataset import Dataset  # type: ignore
 
 from ..exceptions import NoVectorsException
-from ..utils.chunks import divide_iterable_in_lists, get_range
-from ..utils.func import filter_snd_none, list_unzip, identity
+from ..utils.chunks import divide_sequence
+from ..utils.func import filter_snd_none, identity
+from ..utils.hdf5 import (AUTO_CHUNKS, HDF5Handle, HDF5HandlePool,
+                          auto_chunk_shape, plan_reads, read_rows)
 from ..utils.numpy import (matrix_to_vector_list, matrix_tuple_to_vectors,
-                           matrix_tuple_to_zipped, slicer)
+                           matrix_tuple_to_zipped)
+from ..utils.quantize import (INT8_DIM, INT8_ROW, FLOAT16, NO_QUANTIZATION,
+                              QUANTIZATIONS, QuantizedMatrix, int8_params,
+                              quantize_int8)
+from .keyindex import UUID_KEYS, SortedKeyIndex, decode_keys
 from .vectorstorage import VectorStorage, ensure_writeable
 
 
 from ..typehints import KT, DType
 
+LOGGER = logging.getLogger(__name__)
+
+KEY_KIND_ATTR = "key_kind"
+QUANTIZATION_ATTR = "quantization"
+TOMBSTONE_ROWS_ATTR = "rows"
+
+# Datasets that contain one element (or vector) per row
+ROW_DATASETS = ("vectors", "row_scale", "row_offset")
 
 def keys_wrapper(keys: Sequence[Any]) -> Sequence[Union[int, str]]:
     def key_wrapper(key: Any) -> Union[int, str]:
@@ -56,22 +72,157 @@ class HDF5VectorStorage(VectorStorage[KT, npt.NDArray[DType], npt.NDArray[DType]
     do fit in memory, enabling ordering all unlabeled instances for very large
     datasets.
 
+    The key index is stored in native HDF5 datasets: ``keys`` contains the key
+    of every row and ``key_order`` the permutation that sorts these keys
+    (see :class:`~instancelib.instances.keyindex.SortedKeyIndex`).
+    Files that contain the pickled ``dicts`` index of older versions are
+    migrated when they are opened in a writeable mode.
+
+    Deleted rows are marked in a tombstone bitmap (the ``tombstones`` dataset)
+    and are skipped by all read operations. Adding a deleted key again reuses
+    its row. The space of deleted rows is reclaimed by :meth:`compact`.
+
+    With ``swmr=True``, one process can append vectors while other processes
+    read them (HDF5 Single Writer Multiple Reader mode). The writer flushes
+    after every write operation; readers call :meth:`refresh` to see the new
+    rows. A refresh only reads the keys that were added since the previous
+    refresh and merges them into the index. In SWMR mode, the writer cannot
+    delete vectors or store string keys that are longer than the
+    keys in the first batch.
+
     Parameters
     ----------
         h5path : str
             The path to the hdf5 file
         mode : str, optional
             The file mode (see `h5py` documentation), by default "r"
-    """    
+        session : bool, optional
+            Keep the file open between operations, by default False.
+            In session mode, the storage keeps one open handle per process
+            (or a small pool of handles for threaded readers when the
+            file is opened read-only). The file is reopened after a fork
+            or when the mode changes (see :meth:`reopen`).
+        max_readers : int, optional
+            The maximum number of simultaneously open read handles 
+            in session mode, by default 4
+        max_read_gap : int, optional
+            When reading scattered rows, two runs of requested rows are
+            read with a single read if at most this number of unrequested
+            rows separates them, by default 8
+        rewrite_threshold : float, optional
+            When at least this fraction of all rows is updated at once,
+            the vectors are rewritten block by block from start to end instead
+            of writing each contiguous run of updated rows, by default 0.5
+        quantization : str, optional
+            How new vector datasets are stored, by default "none" (float32).
+            The options are "float16", "int8-row" (int8 codes with a scale
+            and offset per row) and "int8-dim" (int8 codes with a scale and
+            offset per dimension, calibrated on the first vectors that are
+            written; later values outside that range are clipped). For existing
+            files, the quantization stored in the file is used.
+        chunks : Union[bool, str, Tuple[int, int]], optional
+            The chunk shape of a new vectors dataset, by default True (chosen
+            by `h5py`). With "auto", every chunk holds complete rows and the number
+            of rows per chunk is aligned with `access_rows`
+            (see :func:`~instancelib.utils.hdf5.auto_chunk_shape`).
+        compression : Optional[str], optional
+            The compression filter of a new vectors dataset ("lzf" or "gzip"),
+            by default None
+        compression_opts : Optional[int], optional
+            The compression level for "gzip" (0-9), by default None
+        shuffle : bool, optional
+            Apply the shuffle filter before compression, by default False
+        chunk_cache_size : Optional[int], optional
+            The size of the chunk cache in bytes, by default None (the `h5py`
+            default of 1 MiB). The cache should hold at least the chunks that
+            are needed for one batch of rows.
+        access_rows : int, optional
+            The typical number of rows that is read at once 
+            (e.g., the `chunk_size` of :meth:`matrices_chunker`), by default 200
+        swmr : bool, optional
+            Open the file in Single Writer Multiple Reader mode, by default False.
+            This implies `session` mode. The file should be created by an
+            SWMR writer, and readers should open it after the writer has 
+            written the first vectors.
+    """
     
     __writemodes = ["a", "r+", "w", "w-", "x"]
-    def __init__(self, h5path: "PathLike[str]", mode: str = "r") -> None:
+    def __init__(self, 
+                 h5path: "PathLike[str]", 
+                 mode: str = "r", 
+                 session: bool = False, 
+                 max_readers: int = 4,
+                 max_read_gap: int = 8,
+                 rewrite_threshold: float = 0.5,
+                 quantization: str = NO_QUANTIZATION,
+                 chunks: Union[bool, str, Tuple[int, int]] = True,
+                 compression: Optional[str] = None,
+                 compression_opts: Optional[int] = None,
+                 shuffle: bool = False,
+                 chunk_cache_size: Optional[int] = None,
+                 access_rows: int = 200,
+                 swmr: bool = False) -> None:
+        assert quantization in QUANTIZATIONS
+        assert compression in (None, "lzf", "gzip")
+        assert chunks is not False, "Resizable datasets must be chunked"
         self.__mode = mode
         self.h5path = h5path
-        self.key_dict: Dict[KT, int] = dict()
-        self.inv_key_dict: Dict[int, KT] = dict()
+        self.swmr = swmr
+        self.session = session or swmr
+        self.max_read_gap = max_read_gap
+        self.rewrite_threshold = rewrite_threshold
+        self.quantization = quantization
+        self._dim_params: Optional[Tuple[npt.NDArray[np.float32], npt.NDArray[np.float32]]] = None
+        self.chunks = chunks
+        self.compression = compression
+        self.compression_opts = compression_opts
+        self.shuffle = shuffle
+        self.access_rows = access_rows
+        self._file_kwargs: Dict[str, Any] = dict()
+        if chunk_cache_size is not None:
+            self._file_kwargs["rdcc_nbytes"] = chunk_cache_size
+        self._handles = HDF5HandlePool(
+            h5path, mode, self.session, max_readers, swmr, **self._file_kwargs)
+        self._datasets_exist = False
+        self.index: SortedKeyIndex[KT] = SortedKeyIndex.empty()
+        self._index_dirty = False
+        self._dead: Optional[npt.NDArray[np.bool_]] = None
+        self._n_dead = 0
+        self._tombstones_dirty = False
         self.reload()
 
+    @property
+    def mode(self) -> str:
+        """The file mode of the storage
+
+        Returns
+        -------
+        str
+            The file mode (see `h5py` documentation)
+        """
+        return self.__mode
+
+    def reopen(self, mode: Optional[str] = None) -> None:
+        """Close the open file handles and continue in a (possibly) different mode.
+        If the storage is writeable, the index is stored first. The index is
+        only reloaded when switching to a writeable mode; after writing,
+        the index in memory is already up to date.
+
+        Parameters
+        ----------
+        mode : Optional[str], optional
+            The new file mode, by default None (keep the current mode)
+        """
+        was_writeable = self.writeable
+        self.close()
+        if mode is not None and mode != self.__mode:
+            self.__mode = mode
+            self._handles = HDF5HandlePool(
+                self.h5path, mode, self.session, self._handles.max_readers, 
+                self.swmr, **self._file_kwargs)
+            if self.writeable or not was_writeable:
+                self.reload()
+
     @property
     def writeable(self) -> bool:
         """Check if the storage is writeable
@@ -90,7 +241,21 @@ class HDF5VectorStorage(VectorStorage[KT, npt.NDArray[DType], npt.NDArray[DType]
         int
             The size of the dataset
         """        
-        return len(self.key_dict)
+        return len(self.index) - self._n_dead
+
+    @property
+    def fragmentation(self) -> float:
+        """The fraction of stored rows that belong to deleted keys.
+        A high fragmentation indicates that :meth:`compact` is worthwhile.
+
+        Returns
+        -------
+        float
+            A number between 0 and 1
+        """        
+        if not len(self.index):
+            return 0.0
+        return self._n_dead / len(self.index)
 
     @property
     def datasets_exist(self) -> bool:
@@ -101,42 +266,197 @@ class HDF5VectorStorage(VectorStorage[KT, npt.NDArray[DType], npt.NDArray[DType]
         bool
             True, if the file contains a dataset
         """        
-        with h5py.File(self.h5path, self.__mode) as hfile:
-            exist = "vectors" in hfile and "keys" in hfile
-        return exist    
+        if not self._datasets_exist:
+            with self._handles.acquire() as handle:
+                self._datasets_exist = "vectors" in handle and "keys" in handle
+        return self._datasets_exist
 
     def reload(self) -> None:
-        """Reload the index from disk
-        """        
-        with h5py.File(self.h5path, self.__mode) as hfile:
-            if "dicts" in hfile:
-                dicts = hfile["dicts"]
-                assert isinstance(dicts, Dataset)
-                self.key_dict = pickle.loads(dicts[0]) # type: ignore
-                self.inv_key_dict = pickle.loads(dicts[1]) # type: ignore
+        """Reload the index from disk. An SWMR reader only 
+        reads the keys that were added since the last reload 
+        (see :meth:`refresh`).
+        """        
+        if self.swmr and not self.writeable and len(self.index):
+            self.refresh()
+            return
+        legacy = False
+        with self._handles.acquire() as handle:
+            if "keys" in handle and KEY_KIND_ATTR in handle.dataset("keys").attrs:
+                key_set = handle.dataset("keys")
+                kind = str(key_set.attrs[KEY_KIND_ATTR])
+                row_keys = key_set[()]
+                order = handle.dataset("key_order")[()] if "key_order" in handle else None
+                self.index = SortedKeyIndex(row_keys, kind, order)
+                self._index_dirty = order is None or len(order) != len(row_keys)
+            elif "dicts" in handle:
+                # Index of an older version; only the inverse dictionary is needed
+                inv_key_dict: Dict[int, KT] = pickle.loads(handle.dataset("dicts")[1]) # type: ignore
+                row_keys = [inv_key_dict[i] for i in range(len(inv_key_dict))]
+                self.index = SortedKeyIndex.from_keys(row_keys)
+                legacy = True
+            if "vectors" in handle:
+                attrs = handle.dataset("vectors").attrs
+                self.quantization = str(attrs.get(QUANTIZATION_ATTR, NO_QUANTIZATION))
+                if self.quantization == INT8_DIM:
+                    self._dim_params = (handle.dataset("dim_scale")[()],
+                                        handle.dataset("dim_offset")[()])
+            self._dead, self._n_dead = None, 0
+            if "tombstones" in handle:
+                tombstones = handle.dataset("tombstones")
+                n_rows = int(tombstones.attrs[TOMBSTONE_ROWS_ATTR])
+                self._dead = np.unpackbits(tombstones[()], count=n_rows).astype(np.bool_)
+                self._n_dead = int(np.count_nonzero(self._dead))
+            self._tombstones_dirty = False
+        if legacy and self.writeable:
+            self.__migrate_index()
             
+    def refresh(self) -> int:
+        """Make the vectors that an SWMR writer has flushed since the
+        last refresh available to this reader. Only the new keys are
+        read from the file and merged into the index.
+
+        Returns
+        -------
+        int
+            The number of new rows
+        """        
+        if not self.swmr or self.writeable:
+            return 0
+        self._handles.refresh()
+        with self._handles.acquire() as handle:
+            if not ("keys" in handle and "vectors" in handle):
+                return 0
+            # The writer appends the keys before the vectors. Rows are only
+            # visible when all datasets contain them.
+            n_rows = min(handle.dataset(name).shape[0] 
+                         for name in ("keys", *ROW_DATASETS) if name in handle)
+            start = len(self.index)
+            if n_rows <= start:
+                return 0
+            key_set = handle.dataset("keys")
+            new_keys = key_set[start:n_rows]
+            if not start:
+                self.index = SortedKeyIndex(new_keys, str(key_set.attrs[KEY_KIND_ATTR]))
+                self.quantization = str(
+                    handle.dataset("vectors").attrs.get(QUANTIZATION_ATTR, NO_QUANTIZATION))
+                if self.quantization == INT8_DIM:
+                    self._dim_params = (handle.dataset("dim_scale")[()],
+                                        handle.dataset("dim_offset")[()])
+            else:
+                self.index.extend(new_keys)
+        return n_rows - start
+
+    @ensure_writeable
+    def __publish(self) -> None:
+        """Flush the file, so that SWMR readers can see the new rows. 
+        The first call stores the index and switches the file to SWMR mode
+        (after which no datasets can be created).
+        """        
+        with self._handles.acquire() as handle:
+            if not handle.file.swmr_mode:
+                self.__store_index()
+                handle.file.swmr_mode = True
+            handle.flush()
+
+    def __check_not_swmr(self, operation: str) -> None:
+        if self.swmr:
+            raise UnsupportedOperation(
+                f"The operation {operation} is not supported in SWMR mode")
+
     def __enter__(self):
         return self
 
+    def __write_keys(self, handle: HDF5Handle) -> None:
+        """(Re)write the complete ``keys`` dataset from the index
+
+        Parameters
+        ----------
+        handle : HDF5Handle
+            An open (writeable) handle
+        """        
+        if self.swmr and handle.file.swmr_mode:
+            raise UnsupportedOperation(
+                "The keys cannot be rewritten in SWMR mode. String keys cannot "
+                "be longer than the longest key of the first batch.")
+        if "keys" in handle:
+            del handle.file["keys"]
+            handle.invalidate("keys")
+            self._handles.invalidate("keys")
+        key_set = handle.file.create_dataset( # type: ignore
+            "keys", data=self.index.row_keys, maxshape=(None,), chunks=True)
+        key_set.attrs[KEY_KIND_ATTR] = self.index.kind
+        self._index_dirty = True
+
+    @ensure_writeable
+    def __migrate_index(self) -> None:
+        """Convert the pickled index dictionaries of older versions to
+        the native index format.
+        """        
+        LOGGER.info("Migrating the index of %s to the native format", self.h5path)
+        with self._handles.acquire() as handle:
+            self.__write_keys(handle)
+            if "dicts" in handle:
+                del handle.file["dicts"]
+                handle.invalidate("dicts")
+        self.__store_index()
+
     @ensure_writeable
-    def __store_dicts(self) -> None:
-        """Store the index dictionaries to disk in the HDF5 file
-        """        
-        with h5py.File(self.h5path, self.__mode) as hfile:
-            if "dicts" not in hfile:
-                dt = h5py.special_dtype(vlen=np.dtype("uint8")) # type: ignore
-                hfile.create_dataset("dicts", (2,), dtype=dt) # type: ignore
-            dicts = hfile["dicts"]
-            assert isinstance(dicts, Dataset)
-            dicts[0] = np.frombuffer( # type: ignore
-                pickle.dumps(self.key_dict), dtype="uint8") #type: ignore
-            dicts[1] = np.frombuffer( # type: ignore
-                pickle.dumps(self.inv_key_dict), dtype="uint8") # type: ignore
+    def __store_index(self) -> None:
+        """Store the sorting permutation of the index to disk in the HDF5 file.
+        The keys themselves are written when they are added.
+        """        
+        if not self._index_dirty:
+            return
+        with self._handles.acquire() as handle:
+            if "keys" not in handle:
+                return
+            order = self.index.order
+            if "key_order" in handle:
+                order_set = handle.dataset("key_order")
+                order_set.resize(size=(len(order),)) # type: ignore
+                order_set[:] = order
+            else:
+                handle.file.create_dataset( # type: ignore
+                    "key_order", data=order, maxshape=(None,), chunks=True)
+        self._index_dirty = False
+
+    @ensure_writeable
+    def __store_tombstones(self) -> None:
+        """Store the tombstone bitmap to disk. The bitmap is overwritten
+        in place, so repeated deletes do not leave unused space in the file.
+        """        
+        if not self._tombstones_dirty or self._dead is None:
+            return
+        packed = np.packbits(self._dead)
+        with self._handles.acquire() as handle:
+            if "tombstones" in handle and handle.dataset("tombstones").maxshape[0] is None:
+                tombstones = handle.dataset("tombstones")
+                tombstones.resize(size=(len(packed),)) # type: ignore
+                tombstones[:] = packed
+            else:
+                if "tombstones" in handle:
+                    # Written by an older version with a fixed size
+                    del handle.file["tombstones"]
+                    handle.invalidate("tombstones")
+                    self._handles.invalidate("tombstones")
+                tombstones = handle.file.create_dataset( # type: ignore
+                    "tombstones", data=packed, maxshape=(None,), chunks=True)
+            tombstones.attrs[TOMBSTONE_ROWS_ATTR] = len(self._dead)
+        self._handles.flush()
+        self._tombstones_dirty = False
     
     @ensure_writeable
     def rebuild_index(self, type_restorer: Callable[[Any], KT] = identity) -> None:
         """Rebuild the index after manual manipulation of a HDF5 file.
 
+        Parameters
+        ----------
+        type_restorer : Callable[[Any], KT], optional
+            A function that converts the stored keys (strings 
+            are decoded first) to the original key type, by default identity.
+            UUID keys are passed in their string form, so ``uuid.UUID``
+            restores them
+
         Raises
         ------
         NoVectorsException
@@ -144,24 +464,30 @@ class HDF5VectorStorage(VectorStorage[KT, npt.NDArray[DType], npt.NDArray[DType]
         """        
         if not self.datasets_exist:
             raise NoVectorsException("There are no vectors stored in this file, "
-                                     "therefore, the index dictionaries cannot "
+                                     "therefore, the index cannot "
                                      "be rebuilt.")
-        self.key_dict: Dict[KT, int] = dict()
-        self.inv_key_dict: Dict[int, KT] = dict()
-        with h5py.File(self.h5path, self.__mode) as hfile:
-            keys = hfile["keys"]
-            assert isinstance(keys, Dataset)
-            for i, key in enumerate(keys): # type: ignore
-                r_key = type_restorer(key)
-                self.key_dict[r_key] = i # type: ignore
-                self.inv_key_dict[i] = r_key # type: ignore
-        self.__store_dicts()
+        with self._handles.acquire() as handle:
+            key_set = handle.dataset("keys")
+            if KEY_KIND_ATTR in key_set.attrs:
+                kind = str(key_set.attrs[KEY_KIND_ATTR])
+                stored_keys = decode_keys(key_set[()], kind)
+                if kind == UUID_KEYS and type_restorer is not identity:
+                    stored_keys = [str(key) for key in stored_keys]
+            else:
+                stored_keys = [key.decode("utf-8") if isinstance(key, bytes) else key
+                               for key in key_set[()].tolist()]
+            restored = [type_restorer(key) for key in stored_keys]
+            self.index = SortedKeyIndex.from_keys(restored)
+            self.__write_keys(handle)
+        self.__store_index()
         
     
             
     def __exit__(self, type, value, traceback): # type: ignore
         if self.__mode in self.__writemodes:
-            self.__store_dicts()
+            self.__store_index()
+            self.__store_tombstones()
+        self._handles.close()
     
     def close(self) -> None:
         """Close the file and store changes to the index to disk
@@ -178,12 +504,76 @@ class HDF5VectorStorage(VectorStorage[KT, npt.NDArray[DType], npt.NDArray[DType]
         first_slice : npt.NDArray[DType]
             A matrix
         """        
-        vector_dim = first_slice.shape[1]
-        with h5py.File(self.h5path, self.__mode) as hfile:
-            if "vectors" not in hfile:
-                hfile.create_dataset( # type: ignore
-                    "vectors", data=first_slice, 
-                    maxshape=(None, vector_dim), dtype="f", chunks=True)
+        with self._handles.acquire() as handle:
+            if "vectors" in handle:
+                return
+            if self.quantization == INT8_DIM:
+                scale, offset = int8_params(first_slice, axis=0)
+                handle.file.create_dataset("dim_scale", data=scale) # type: ignore
+                handle.file.create_dataset("dim_offset", data=offset) # type: ignore
+                self._dim_params = (scale, offset)
+            encoded = self._encode(first_slice)
+            vectors = encoded.pop("vectors")
+            vector_options = self._vector_options(vectors)
+            handle.file.create_dataset( # type: ignore
+                "vectors", data=vectors, 
+                maxshape=(None, *vectors.shape[1:]), **vector_options)
+            for name, data in encoded.items():
+                # Align the chunks of the per-row parameters with the vectors
+                chunks = vector_options["chunks"]
+                row_chunks = (chunks[0],) if isinstance(chunks, tuple) else True
+                handle.file.create_dataset( # type: ignore
+                    name, data=data, maxshape=(None,), chunks=row_chunks)
+            handle.dataset("vectors").attrs[QUANTIZATION_ATTR] = self.quantization
+
+    def _vector_options(self, vectors: npt.NDArray[Any]) -> Dict[str, Any]:
+        """Determine the layout and filter options of a new vectors dataset
+
+        Parameters
+        ----------
+        vectors : npt.NDArray[Any]
+            The first (encoded) vectors
+
+        Returns
+        -------
+        Dict[str, Any]
+            Keyword arguments for :meth:`h5py.Group.create_dataset`
+        """        
+        chunks = self.chunks
+        if chunks == AUTO_CHUNKS:
+            chunks = auto_chunk_shape(vectors.shape[1:], vectors.dtype.itemsize, self.access_rows)
+        options: Dict[str, Any] = {"chunks": chunks, "shuffle": self.shuffle}
+        if self.compression is not None:
+            options["compression"] = self.compression
+            options["compression_opts"] = self.compression_opts
+        return options
+
+    def _encode(self, matrix: npt.NDArray[Any]) -> Dict[str, npt.NDArray[Any]]:
+        """Convert a matrix to the arrays that are stored for each row,
+        according to the quantization of this storage
+
+        Parameters
+        ----------
+        matrix : npt.NDArray[Any]
+            A matrix
+
+        Returns
+        -------
+        Dict[str, npt.NDArray[Any]]
+            A mapping from dataset name to the rows that should be stored in it
+        """        
+        if self.quantization == FLOAT16:
+            return {"vectors": np.asarray(matrix, dtype=np.float16)}
+        if self.quantization == INT8_ROW:
+            scale, offset = int8_params(matrix, axis=1)
+            return {"vectors": quantize_int8(matrix, scale, offset, per_row=True),
+                    "row_scale": scale, 
+                    "row_offset": offset}
+        if self.quantization == INT8_DIM:
+            assert self._dim_params is not None
+            scale, offset = self._dim_params
+            return {"vectors": quantize_int8(matrix, scale, offset, per_row=False)}
+        return {"vectors": np.asarray(matrix, dtype=np.float32)}
 
     @ensure_writeable
     def _create_keys(self, keys: Sequence[KT]) -> None:
@@ -194,14 +584,10 @@ class HDF5VectorStorage(VectorStorage[KT, npt.NDArray[DType], npt.NDArray[DType]
         keys : Sequence[KT]
             The keys that should be written
         """        
-        with h5py.File(self.h5path, self.__mode) as hfile:
-            converted_keys = keys_wrapper(keys)
-            if "keys" not in hfile:
-                hfile.create_dataset("keys", # type: ignore
-                    data = converted_keys, maxshape=(None,)) # type: ignore
-            for i, key in enumerate(keys):
-                self.key_dict[key] = i
-                self.inv_key_dict[i] = key
+        with self._handles.acquire() as handle:
+            if "keys" not in handle:
+                self.index = SortedKeyIndex.from_keys(keys)
+                self.__write_keys(handle)
   
     @ensure_writeable
     def _append_matrix(self, matrix: npt.NDArray[DType]) -> bool:
@@ -224,15 +610,13 @@ class HDF5VectorStorage(VectorStorage[KT, npt.NDArray[DType], npt.NDArray[DType]
         """        
         if not self.datasets_exist:
             raise NoVectorsException("Cannot append without existing vectors")
-        with h5py.File(self.h5path, self.__mode) as hfile:
-            dataset = hfile["vectors"]
-            assert isinstance(dataset, Dataset)
-            old_shape = dataset.shape # type: ignore
-            mat_shape = matrix.shape
-            assert mat_shape[1] == old_shape[1]
-            new_shape = (dataset.shape[0] + mat_shape[0], mat_shape[1]) # type: ignore
-            dataset.resize(size=new_shape) # type: ignore
-            dataset[-mat_shape[0]:,:] = matrix
+        with self._handles.acquire() as handle:
+            assert matrix.shape[1] == handle.dataset("vectors").shape[1]
+            for name, data in self._encode(matrix).items():
+                dataset = handle.dataset(name)
+                old_rows = dataset.shape[0] # type: ignore
+                dataset.resize(size=(old_rows + data.shape[0], *data.shape[1:])) # type: ignore
+                dataset[old_rows:] = data
         return True 
 
     @ensure_writeable
@@ -256,54 +640,218 @@ class HDF5VectorStorage(VectorStorage[KT, npt.NDArray[DType], npt.NDArray[DType]
         """        
         if not self.datasets_exist:
             raise NoVectorsException("Cannot append without existing vectors")
-        assert all(map(lambda k: k not in self.key_dict, keys))
-        new_keys = keys_wrapper(keys) # type: ignore
-        with h5py.File(self.h5path, self.__mode) as hfile:
-            key_set = hfile["keys"]
-            assert isinstance(key_set, Dataset)
-            old_shape = key_set.shape # type: ignore
-            arr_shape = (len(new_keys),)
-            new_shape = (old_shape[0] + arr_shape[0],) # type: ignore
-            key_set.resize(size=new_shape) # type: ignore
-            key_set[-arr_shape[0]:] = new_keys
-            start_index: int = old_shape[0] # type: ignore
-            for i, key in enumerate(keys):
-                hdf5_idx = start_index + i
-                self.key_dict[key] = hdf5_idx
-                self.inv_key_dict[hdf5_idx] = key
-        self.__store_dicts()
+        found, _ = self.index.lookup(keys)
+        assert not found.any()
+        new_rows = self.index.append(keys)
+        with self._handles.acquire() as handle:
+            key_set = handle.dataset("keys")
+            if key_set.dtype != self.index.row_keys.dtype:
+                # String keys that are longer than the stored width
+                self.__write_keys(handle)
+            else:
+                start_index = int(new_rows[0])
+                key_set.resize(size=(len(self.index),)) # type: ignore
+                key_set[start_index:] = self.index.row_keys[start_index:]
+        self._index_dirty = True
         return True
         
     def __getitem__(self, k: KT) -> npt.NDArray[DType]:
         if not self.datasets_exist:
             raise NoVectorsException("There are no vectors stored in this object")
-        h5_idx = self.key_dict[k]
-        with h5py.File(self.h5path, self.__mode) as hfile:
-            dataset = hfile["vectors"]
-            assert isinstance(dataset, Dataset)
-            data = dataset[h5_idx,:] # type: ignore
-        return data # type: ignore
+        found, rows = self._lookup_live([k])
+        if not found[0]:
+            raise KeyError(k)
+        _, matrix = self._get_matrix(rows)
+        return matrix[0]
 
     @ensure_writeable
     def __setitem__(self, k: KT, value: npt.NDArray[DType]) -> None:
         assert self.datasets_exist
         if k in self:
-            h5_idx = self.key_dict[k]
-            with h5py.File(self.h5path, self.__mode) as hfile:
-                dataset = hfile["vectors"]
-                assert isinstance(dataset, Dataset)
-                dataset[h5_idx] = value # type: ignore
+            self._update_vectors([k], np.asarray(value)[np.newaxis])
+            if self.swmr:
+                self.__publish()
             return
         raise KeyError 
 
     def __delitem__(self, v: KT) -> None:
-        raise NotImplementedError
-    
+        self.delete_bulk([v])
+
+    def _dead_rows(self, rows: npt.NDArray[np.int64]) -> npt.NDArray[np.bool_]:
+        """Check which of the `rows` are marked as deleted
+
+        Parameters
+        ----------
+        rows : npt.NDArray[np.int64]
+            Internal indices
+
+        Returns
+        -------
+        npt.NDArray[np.bool_]
+            A mask that is True for deleted rows
+        """        
+        dead = np.zeros(len(rows), dtype=np.bool_)
+        if self._dead is not None:
+            inside = rows < len(self._dead)
+            dead[inside] = self._dead[rows[inside]]
+        return dead
+
+    def _live_rows(self) -> npt.NDArray[np.int64]:
+        """Return the internal indices of all rows that are not deleted
+
+        Returns
+        -------
+        npt.NDArray[np.int64]
+            The sorted indices
+        """        
+        n_rows = len(self.index)
+        if not self._n_dead or self._dead is None:
+            return np.arange(n_rows)
+        dead = np.zeros(n_rows, dtype=np.bool_)
+        dead[:len(self._dead)] = self._dead[:n_rows]
+        return np.flatnonzero(~dead)
+
+    def _lookup_live(self, keys: Sequence[Any]) -> Tuple[npt.NDArray[np.bool_], npt.NDArray[np.int64]]:
+        """Look up keys in the index, treating deleted keys as not present
+
+        Parameters
+        ----------
+        keys : Sequence[Any]
+            The keys
+
+        Returns
+        -------
+        Tuple[npt.NDArray[np.bool_], npt.NDArray[np.int64]]
+            A mask of found keys and their rows
+        """        
+        found, rows = self.index.lookup(keys)
+        if self._n_dead:
+            found &= ~self._dead_rows(rows)
+        return found, rows
+
+    def _revive(self, rows: npt.NDArray[np.int64]) -> None:
+        """Clear the tombstones of `rows`, for example when a
+        deleted key is added again.
+
+        Parameters
+        ----------
+        rows : npt.NDArray[np.int64]
+            Internal indices
+        """        
+        if not self._n_dead or self._dead is None:
+            return
+        revived = np.unique(rows[self._dead_rows(rows)])
+        if len(revived):
+            self._dead[revived] = False
+            self._n_dead -= len(revived)
+            self._tombstones_dirty = True
+            self.__store_tombstones()
+
+    @ensure_writeable
+    def delete_bulk(self, keys: Sequence[KT]) -> None:
+        """Delete the vectors of `keys`. The rows are marked with a tombstone;
+        the space is reclaimed by :meth:`compact`.
+
+        Parameters
+        ----------
+        keys : Sequence[KT]
+            The keys that should be deleted
+
+        Raises
+        ------
+        KeyError
+            If one of the keys is not present
+        """        
+        self.__check_not_swmr("delete_bulk")
+        found, rows = self._lookup_live(keys)
+        if not found.all():
+            missing = [k for k, f in zip(keys, found) if not f]
+            raise KeyError(f"The keys {missing[:5]} are not present in the storage")
+        n_rows = len(self.index)
+        if self._dead is None or len(self._dead) < n_rows:
+            dead = np.zeros(n_rows, dtype=np.bool_)
+            if self._dead is not None:
+                dead[:len(self._dead)] = self._dead
+            self._dead = dead
+        deleted = np.unique(rows)
+        self._dead[deleted] = True
+        self._n_dead += len(deleted)
+        self._tombstones_dirty = True
+        # Persist the deletes right away, like appended keys
+        self.__store_tombstones()
+
+    @ensure_writeable
+    def compact(self) -> None:
+        """Remove the rows of deleted keys. The live rows are copied 
+        in large blocks to a new file, that replaces the current file 
+        with an atomic rename once it is complete. The key index is rebuilt
+        for the new row positions. Other storages or processes that 
+        still have the old file open keep reading the old version until
+        they reload.
+        """        
+        self.__check_not_swmr("compact")
+        if not self._n_dead:
+            return
+        live_rows = self._live_rows()
+        path = os.fspath(self.h5path)
+        tmp_path = f"{path}.compact.tmp"
+        new_index: SortedKeyIndex[KT] = SortedKeyIndex(
+            self.index.row_keys[live_rows], self.index.kind)
+        with self._handles.acquire() as handle, h5py.File(tmp_path, "w") as target:
+            source = handle.file
+            target.attrs.update(source.attrs)
+            for name in source:
+                if name in ROW_DATASETS:
+                    self.__copy_rows(handle.dataset(name), target, name, live_rows)
+                elif name not in ("keys", "key_order", "tombstones"):
+                    source.copy(source[name], target, name)
+            key_set = target.create_dataset(
+                "keys", data=new_index.row_keys, maxshape=(None,), chunks=True)
+            key_set.attrs[KEY_KIND_ATTR] = new_index.kind
+            target.create_dataset(
+                "key_order", data=new_index.order, maxshape=(None,), chunks=True)
+        LOGGER.info("Compacted %s: removed %d deleted rows", path, self._n_dead)
+        self._handles.close()
+        os.replace(tmp_path, path)
+        self.reload()
+
+    def __copy_rows(self, dataset: Any, target: Any, name: str, rows: npt.NDArray[np.int64]) -> None:
+        """Copy the given rows of a dataset to a new dataset with the same layout
+
+        Parameters
+        ----------
+        dataset : Dataset
+            The source dataset
+        target : h5py.File
+            The target file
+        name : str
+            The name of the new dataset
+        rows : npt.NDArray[np.int64]
+            The sorted rows that should be copied
+        """        
+        row_shape = dataset.shape[1:]
+        copy = target.create_dataset(
+            name, shape=(len(rows), *row_shape), maxshape=(None, *row_shape),
+            dtype=dataset.dtype, chunks=dataset.chunks or True, 
+            compression=dataset.compression, compression_opts=dataset.compression_opts,
+            shuffle=dataset.shuffle)
+        copy.attrs.update(dataset.attrs)
+        row_bytes = max(int(np.prod(row_shape)) * dataset.dtype.itemsize, 1)
+        block_size = max(2 ** 24 // row_bytes, 1)
+        for start in range(0, len(rows), block_size):
+            block = rows[start:start + block_size]
+            copy[start:start + len(block)] = read_rows(dataset, block, self.max_read_gap)
+
     def __contains__(self, item: object) -> bool:
-        return item in self.key_dict
+        found, _ = self._lookup_live([item])
+        return bool(found[0])
         
     def __iter__(self) -> Iterator[KT]:
-        yield from self.key_dict
+        if not self._n_dead:
+            yield from self.index
+            return
+        for chunk in divide_sequence(self._live_rows(), 10000):
+            yield from self.index.keys_for_rows(chunk)
 
     @ensure_writeable
     def add_bulk_matrix(self, keys: Sequence[KT], matrix: npt.NDArray[DType]) -> None:
@@ -317,34 +865,107 @@ class HDF5VectorStorage(VectorStorage[KT, npt.NDArray[DType], npt.NDArray[DType]
             A matrix. The rows should correspond with the identifiers in keys
         """        
         assert len(keys) == matrix.shape[0]
+        self.__add_matrix(keys, matrix)
+        if self.swmr:
+            self.__publish()
+
+    def __add_matrix(self, keys: Sequence[KT], matrix: npt.NDArray[DType]) -> None:
         if not self.datasets_exist:
             self._create_matrix(matrix)
             self._create_keys(keys)
             return
-        if all(map(lambda k: k not in self.key_dict, keys)):
-            if self._append_keys(keys):
-                self._append_matrix(matrix)
-            return
+        found, rows = self.index.lookup(keys)
+        if found.any():
+            # Overwrite the vectors of keys that are already stored
+            # (this also restores keys that have been deleted)
+            found_idxs = np.flatnonzero(found)
+            self._update_vectors([keys[i] for i in found_idxs], matrix[found_idxs])
+            self._revive(rows[found])
+            if found.all():
+                return
+            new_idxs = np.flatnonzero(~found)
+            keys = [keys[i] for i in new_idxs]
+            matrix = matrix[new_idxs]
+        if self._append_keys(keys):
+            self._append_matrix(matrix)
 
     @ensure_writeable
-    def _update_vectors(self, keys: Sequence[KT], values: Sequence[npt.NDArray[DType]]) -> None:
-        """Update vectors in bulk
+    def _update_vectors(self,
+                        keys: Sequence[KT],
+                        values: Union[npt.NDArray[DType], Sequence[npt.NDArray[DType]]],
+                        full_rewrite: Optional[bool] = None) -> None:
+        """Update vectors in bulk. The target rows are sorted and
+        every contiguous block of rows is written with a single slice assignment.
+
         Parameters
         ----------
         keys : Sequence[KT]
-            A list of identifiers
-        values : Sequence[npt.NDArray[DType]]
-            A list of new vectors
-        """        
+            A list of identifiers that are present in the storage
+        values : Union[npt.NDArray[DType], Sequence[npt.NDArray[DType]]]
+            A matrix or a list of new vectors
+        full_rewrite : Optional[bool], optional
+            Rewrite the complete dataset sequentially instead of
+            writing the blocks. By default None: rewrite if the fraction
+            of updated rows is at least :attr:`rewrite_threshold`
+        """
         assert len(keys) == len(values)
-        if values:
-            with h5py.File(self.h5path, self.__mode) as hfile:
-                dataset = hfile["vectors"]
-                assert isinstance(dataset, Dataset)
-                for key, value in zip(keys, values):
-                    h5_idx = self.key_dict[key]
-                    dataset[h5_idx] = value # type: ignore
-            
+        if not len(keys):
+            return
+        matrix = values if isinstance(values, np.ndarray) else np.vstack(values)
+        rows = self.index.rows(keys)
+        # Sort the rows; if a key occurs more than once, the last vector wins
+        sorted_rows, rev_positions = np.unique(rows[::-1], return_index=True)
+        sorted_matrix = matrix[len(rows) - 1 - rev_positions]
+        if full_rewrite is None:
+            full_rewrite = len(sorted_rows) >= self.rewrite_threshold * len(self.index)
+        encoded = self._encode(sorted_matrix)
+        starts, stops = plan_reads(sorted_rows)
+        with self._handles.acquire() as handle:
+            for name, data in encoded.items():
+                dataset = handle.dataset(name)
+                if full_rewrite:
+                    self.__rewrite_vectors(dataset, sorted_rows, data)
+                    continue
+                offset = 0
+                for start, stop in zip(starts.tolist(), stops.tolist()):
+                    length = stop - start
+                    dataset[start:stop] = data[offset:offset + length]
+                    offset += length
+
+    @staticmethod
+    def __rewrite_vectors(dataset: Any,
+                          sorted_rows: npt.NDArray[np.int64],
+                          sorted_matrix: npt.NDArray[DType]) -> None:
+        """Rewrite a dataset in place from start to end in large blocks.
+        Blocks that are only partially updated are read first.
+
+        Parameters
+        ----------
+        dataset : Dataset
+            The vectors dataset
+        sorted_rows : npt.NDArray[np.int64]
+            The sorted, unique rows that should be updated
+        sorted_matrix : npt.NDArray[DType]
+            The new vectors for `sorted_rows`
+        """
+        n_rows, row_shape = dataset.shape[0], dataset.shape[1:]
+        row_bytes = max(int(np.prod(row_shape)) * dataset.dtype.itemsize, 1)
+        block_size = max(2 ** 24 // row_bytes, dataset.chunks[0] if dataset.chunks else 1)
+        block_starts = np.arange(0, n_rows, block_size)
+        bounds = np.searchsorted(sorted_rows, np.append(block_starts, n_rows))
+        for block, start in enumerate(block_starts.tolist()):
+            stop = min(start + block_size, n_rows)
+            lo, hi = int(bounds[block]), int(bounds[block + 1])
+            if lo == hi:
+                continue
+            if hi - lo == stop - start:
+                dataset[start:stop] = sorted_matrix[lo:hi]
+                continue
+            buffer = np.empty((stop - start, *row_shape), dtype=dataset.dtype)
+            dataset.read_direct(buffer, np.s_[start:stop])
+            buffer[sorted_rows[lo:hi] - start] = sorted_matrix[lo:hi]
+            dataset[start:stop] = buffer
+
     @ensure_writeable
     def add_bulk(self, input_keys: Sequence[KT], input_values: Sequence[Optional[npt.NDArray[DType]]]) -> None:
         """Add a bulk of keys and values (vectors) to the vector storage
@@ -364,44 +985,21 @@ class HDF5VectorStorage(VectorStorage[KT, npt.NDArray[DType], npt.NDArray[DType]
         if not values:
             return
         
-        # Check if the vector storage exists
-        if not self.datasets_exist:
-            matrix: npt.NDArray[DType] = np.vstack(values) # type: ignore
-            self._create_keys(keys)
-            self._create_matrix(matrix)
-            return
-        
-        # Check if the keys do not already exist in storage
-        if all(map(lambda k: k not in self.key_dict, keys)):
-            # This is the ideal case, all vectors can directly
-            # be appended as a matrix
-            matrix = np.vstack(values) # type: ignore
-            self.add_bulk_matrix(keys, matrix)
-            return
-        
-        # Find out which (key, vector) pairs are already stored
-        not_in_storage = filter(lambda kv: kv[0] not in self.key_dict, zip(keys, values))
-        in_storage = filter(lambda kv: kv[0] in self.key_dict, zip(keys, values))
-        
-        # Update the already present key vector pairs
-        old_keys, updated_vectors = list_unzip(in_storage)
-        self._update_vectors(old_keys, updated_vectors)
-
-        # Append the new key vector pairs
-        new_keys, new_vectors = list_unzip(not_in_storage)
-        if new_vectors:
-            matrix: npt.NDArray[DType] = np.vstack(new_vectors) # type: ignore
-            self.add_bulk_matrix(new_keys, matrix)
+        # Stack the vectors once; add_bulk_matrix updates the vectors
+        # of keys that are already stored and appends the others
+        matrix: npt.NDArray[DType] = np.vstack(values) # type: ignore
+        self.add_bulk_matrix(keys, matrix)
 
     
 
-    def _get_matrix(self, h5_idxs: Sequence[int]) -> Tuple[Sequence[KT], npt.NDArray[DType]]:
+    def _get_matrix(self, h5_idxs: npt.NDArray[np.int64]) -> Tuple[Sequence[KT], npt.NDArray[DType]]:
         """Return a matrix that correspond with the internal `h5_idxs`.
+        The rows of the matrix are in the order of `h5_idxs`.
 
         Parameters
         ----------
-        h5_idxs : Sequence[int]
-            A list of internal indices that correspond with the indices
+        h5_idxs : npt.NDArray[np.int64]
+            An array of internal indices that correspond with the indices
 
         Returns
         -------
@@ -415,23 +1013,113 @@ class HDF5VectorStorage(VectorStorage[KT, npt.NDArray[DType], npt.NDArray[DType]
         NoVectorsException
             If there are no vectors stored in this object
         """        
+        included_keys, quantized = self._get_quantized(h5_idxs)
+        return included_keys, quantized.dequantize() # type: ignore
+
+    def _get_quantized(self, h5_idxs: npt.NDArray[np.int64]) -> Tuple[Sequence[KT], QuantizedMatrix]:
+        """Read the stored (possibly quantized) rows `h5_idxs`, 
+        in the order of `h5_idxs`.
+
+        Parameters
+        ----------
+        h5_idxs : npt.NDArray[np.int64]
+            An array of internal indices
+
+        Returns
+        -------
+        Tuple[Sequence[KT], QuantizedMatrix]
+            The keys and the stored block
+
+        Raises
+        ------
+        NoVectorsException
+            If there are no vectors stored in this object
+        """        
         if not self.datasets_exist:
             raise NoVectorsException("There are no vectors stored in this object")
-        with h5py.File(self.h5path, self.__mode) as dfile:
-            dataset = dfile["vectors"]
-            assert isinstance(dataset, Dataset)
-            slices = get_range(h5_idxs)
-            result_matrix: npt.NDArray[DType] = slicer(dataset, slices) # type: ignore
-            included_keys = list(map(lambda idx: self.inv_key_dict[idx], h5_idxs))
-        return included_keys, result_matrix # type: ignore
-
-    def get_vectors(self, keys: Sequence[KT]) -> Tuple[Sequence[KT], Sequence[npt.NDArray[DType]]]:
+        with self._handles.acquire() as handle:
+            codes = read_rows(handle.dataset("vectors"), h5_idxs, self.max_read_gap)
+            if self.quantization == INT8_ROW:
+                scale = read_rows(handle.dataset("row_scale"), h5_idxs, self.max_read_gap)
+                offset = read_rows(handle.dataset("row_offset"), h5_idxs, self.max_read_gap)
+                quantized = QuantizedMatrix(codes, scale, offset, per_row=True)
+            elif self.quantization == INT8_DIM:
+                assert self._dim_params is not None
+                quantized = QuantizedMatrix(codes, *self._dim_params, per_row=False)
+            else:
+                quantized = QuantizedMatrix(codes)
+        included_keys = self.index.keys_for_rows(h5_idxs)
+        return included_keys, quantized
+
+    def get_quantized_matrix(self, keys: Sequence[KT], keep_order: bool = False) -> Tuple[Sequence[KT], QuantizedMatrix]:
+        """Return the vectors of `keys` as they are stored, without 
+        dequantizing them. Consumers that can work with the 
+        int8 or float16 codes directly can avoid the conversion to float32.
+
+        Parameters
+        ----------
+        keys : Sequence[KT]
+            A list of identifier keys
+        keep_order : bool, optional
+            Return the rows in the order of `keys`, by default False
+
+        Returns
+        -------
+        Tuple[Sequence[KT], QuantizedMatrix]
+            The keys and the stored block
+        """        
+        return self._get_quantized(self._requested_rows(keys, keep_order))
+
+    def quantized_matrices_chunker(self, chunk_size: int = 200) -> Iterator[Tuple[Sequence[KT], QuantizedMatrix]]:
+        """Yield all vectors as they are stored in chunks of `chunk_size`,
+        without dequantizing them
+
+        Parameters
+        ----------
+        chunk_size : int, optional
+            The size of the chunks, by default 200
+
+        Yields
+        -------
+        Tuple[Sequence[KT], QuantizedMatrix]
+            The keys and the stored block
+        """        
+        if not self.datasets_exist:
+            return
+        chunks = divide_sequence(self._live_rows(), chunk_size)
+        yield from map(self._get_quantized, chunks)
+
+    def _requested_rows(self, keys: Sequence[KT], keep_order: bool) -> npt.NDArray[np.int64]:
+        """Determine the internal indices that should be read for `keys`.
+        Keys that are not in the storage are skipped.
+
+        Parameters
+        ----------
+        keys : Sequence[KT]
+            A list of identifier keys
+        keep_order : bool
+            If True, the indices follow the order of `keys`, otherwise,
+            the indices are sorted (and unique)
+
+        Returns
+        -------
+        npt.NDArray[np.int64]
+            The internal indices
+        """        
+        found, rows = self._lookup_live(keys)
+        if keep_order:
+            return rows[found]
+        return np.unique(rows[found])
+
+    def get_vectors(self, keys: Sequence[KT], keep_order: bool = False) -> Tuple[Sequence[KT], Sequence[npt.NDArray[DType]]]:
         """Return the vectors that correspond with the `keys` 
 
         Parameters
         ----------
         keys : Sequence[KT]
             A list of identifier keys
+        keep_order : bool, optional
+            Return the vectors in the order of `keys`, by default False
 
         Returns
         -------
@@ -441,17 +1129,21 @@ class HDF5VectorStorage(VectorStorage[KT, npt.NDArray[DType], npt.NDArray[DType]
                 - A list with identifier (order may differ from `keys` argument)
                 - A list with vectors 
         """        
-        ret_keys, ret_matrix = self.get_matrix(keys)
+        ret_keys, ret_matrix = self.get_matrix(keys, keep_order)
         ret_vectors = matrix_to_vector_list(ret_matrix)
         return ret_keys, ret_vectors
 
-    def get_matrix(self, keys: Sequence[KT]) -> Tuple[Sequence[KT], npt.NDArray[DType]]:
-        """Return a matrix containing the vectors that correspond with the `keys`
+    def get_matrix(self, keys: Sequence[KT], keep_order: bool = False) -> Tuple[Sequence[KT], npt.NDArray[DType]]:
+        """Return a matrix containing the vectors that correspond with the `keys`.
+        The requested rows are read in as few contiguous reads as possible.
 
         Parameters
         ----------
         keys : Sequence[KT]
             A list of identifier keys
+        keep_order : bool, optional
+            Return the rows in the order of `keys` (including duplicates),
+            by default False (storage order)
 
         Returns
         -------
@@ -470,14 +1162,12 @@ class HDF5VectorStorage(VectorStorage[KT, npt.NDArray[DType], npt.NDArray[DType]
         """        
         if not self.datasets_exist:
             raise NoVectorsException("There are no vectors stored in this object")
-        in_storage = frozenset(self.key_dict).intersection(keys)
-        h5py_idxs = map(lambda k: self.key_dict[k], in_storage)
-        sorted_keys = sorted(h5py_idxs)
-        return self._get_matrix(sorted_keys)
+        return self._get_matrix(self._requested_rows(keys, keep_order))
 
     def get_matrix_chunked(self, 
                            keys: Sequence[KT], 
-                           chunk_size: int = 200) -> Iterator[Tuple[Sequence[KT], npt.NDArray[DType]]]:
+                           chunk_size: int = 200,
+                           keep_order: bool = False) -> Iterator[Tuple[Sequence[KT], npt.NDArray[DType]]]:
         """Return matrices in chunks of `chunk_size` containing the vectors requested in `keys`
 
         Parameters
@@ -486,6 +1176,8 @@ class HDF5VectorStorage(VectorStorage[KT, npt.NDArray[DType], npt.NDArray[DType]
             A list of identifier keys
         chunk_size : int, optional
             The size of the chunks, by default 200
+        keep_order : bool, optional
+            Return the rows in the order of `keys`, by default False
 
         Yields
         -------
@@ -497,17 +1189,11 @@ class HDF5VectorStorage(VectorStorage[KT, npt.NDArray[DType], npt.NDArray[DType]
                 - A matrix containing the vectors 
                     (rows correspond with the returned list)
 
-        Raises
-        ------
-        StopIteration
-            When there are no more chunks to process
         """        
         if not self.datasets_exist:
-            raise StopIteration
-        in_storage = frozenset(self.key_dict).intersection(keys)
-        h5py_idxs = map(lambda k: self.key_dict[k], in_storage)
-        sorted_keys = sorted(h5py_idxs)
-        chunks = divide_iterable_in_lists(sorted_keys, chunk_size)
+            return
+        rows = self._requested_rows(keys, keep_order)
+        chunks = divide_sequence(rows, chunk_size)
         yield from map(self._get_matrix, chunks)
 
     def get_vectors_chunked(self, 
@@ -556,6 +1242,11 @@ class HDF5VectorStorage(VectorStorage[KT, npt.NDArray[DType], npt.NDArray[DType]
         yield from results # type: ignore
            
 
+    def select_vectors(self, keys: Iterable[KT], chunk_size: int = 200, keep_order: bool = False) -> Iterator[Sequence[Tuple[KT, npt.NDArray[DType]]]]:
+        results = itertools.starmap(
+            matrix_tuple_to_zipped, self.get_matrix_chunked(list(keys), chunk_size, keep_order))
+        yield from results # type: ignore
+
     def vectors_chunker(self, chunk_size: int = 200) -> Iterator[Sequence[Tuple[KT, npt.NDArray[DType]]]]:
         """Return vectors in chunks of `chunk_size`. This generator will yield all vectors contained
         in this object.
@@ -593,15 +1284,8 @@ class HDF5VectorStorage(VectorStorage[KT, npt.NDArray[DType], npt.NDArray[DType]
                 - A list with identifier keys
                 - A matrix containing the vectors 
                     (row indices correspond with the list indices)
-
-        Raises
-        ------
-        StopIteration
-            When there are no more chunks to process
         """        
         if not self.datasets_exist:
-            raise StopIteration
-        h5py_idxs = self.inv_key_dict.keys()
-        sorted_keys = sorted(h5py_idxs)
-        chunks = divide_iterable_in_lists(sorted_keys, chunk_size)
+            return
+        chunks = divide_sequence(self._live_rows(), chunk_size)
         yield from map(self._get_matrix, chunks)
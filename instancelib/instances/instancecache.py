@@ -0,0 +1,454 @@
+# Copyright (C) 2021 The InstanceLib Authors. All Rights Reserved.
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+from __future__ import annotations
+
+import sys
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import (Any, Callable, Container, Dict, Generic, Iterable,
+                    Iterator, List, MutableMapping, Optional, Set, TypeVar,
+                    Union)
+
+from ..typehints import KT
+from .cachedvector import vector_nbytes
+
+IT = TypeVar("IT")
+
+DEFAULT_MAX_ENTRIES = 10000
+
+_EMPTY = object()
+
+
+def instance_nbytes(instance: Any) -> int:
+    """Estimate the memory that an instance occupies, including its
+    data, vector and representation (but not objects that are shared
+    with other instances)
+
+    Parameters
+    ----------
+    instance : Any
+        An :class:`~instancelib.instances.base.Instance` or another object
+
+    Returns
+    -------
+    int
+        The size in bytes
+    """
+    size = sys.getsizeof(instance)
+    for attribute in ("data", "representation"):
+        value = getattr(instance, attribute, None)
+        if value is not None:
+            size += sys.getsizeof(value)
+    vector = getattr(instance, "vector", None)
+    if vector is not None:
+        size += vector_nbytes(vector)
+    return size
+
+
+class CachePolicy(ABC, Generic[KT]):
+    """Decides which entry of an :class:`InstanceCache` is evicted next.
+    The cache notifies the policy of every insertion, hit and removal.
+    """
+
+    @abstractmethod
+    def insert(self, key: KT) -> None:
+        """Register a new entry
+
+        Parameters
+        ----------
+        key : KT
+            The key of the entry
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def access(self, key: KT) -> None:
+        """Register a cache hit on an entry
+
+        Parameters
+        ----------
+        key : KT
+            The key of the entry
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def remove(self, key: KT) -> None:
+        """Forget an entry that was removed from the cache
+
+        Parameters
+        ----------
+        key : KT
+            The key of the entry
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def evict(self, is_pinned: Callable[[KT], bool]) -> Optional[KT]:
+        """Choose an entry that is not pinned and forget it
+
+        Parameters
+        ----------
+        is_pinned : Callable[[KT], bool]
+            A function that returns True for entries that may not be evicted
+
+        Returns
+        -------
+        Optional[KT]
+            The key of the evicted entry, or None if all entries are pinned
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Forget all entries
+        """
+        raise NotImplementedError
+
+
+class LRUPolicy(CachePolicy[KT], Generic[KT]):
+    """Evicts the least recently used entry"""
+
+    def __init__(self) -> None:
+        self._order: "OrderedDict[KT, None]" = OrderedDict()
+
+    def insert(self, key: KT) -> None:
+        self._order[key] = None
+
+    def access(self, key: KT) -> None:
+        self._order.move_to_end(key)
+
+    def remove(self, key: KT) -> None:
+        self._order.pop(key, None)
+
+    def evict(self, is_pinned: Callable[[KT], bool]) -> Optional[KT]:
+        for _ in range(len(self._order)):
+            key = next(iter(self._order))
+            if is_pinned(key):
+                # Pinned entries go to the back, so they are not checked again
+                self._order.move_to_end(key)
+                continue
+            del self._order[key]
+            return key
+        return None
+
+    def clear(self) -> None:
+        self._order.clear()
+
+
+class ClockPolicy(CachePolicy[KT], Generic[KT]):
+    """Approximates LRU with the CLOCK algorithm. A hit only sets a
+    reference bit, which makes hits cheaper than with :class:`LRUPolicy`.
+    On eviction, the hand sweeps over the entries, clears the reference bits
+    it passes and evicts the first entry whose bit was already cleared.
+    """
+
+    def __init__(self) -> None:
+        self._ring: List[Any] = list()
+        self._referenced: List[bool] = list()
+        self._slots: Dict[KT, int] = dict()
+        self._free: List[int] = list()
+        self._hand = 0
+
+    def insert(self, key: KT) -> None:
+        if self._free:
+            slot = self._free.pop()
+            self._ring[slot] = key
+            self._referenced[slot] = True
+        else:
+            slot = len(self._ring)
+            self._ring.append(key)
+            self._referenced.append(True)
+        self._slots[key] = slot
+
+    def access(self, key: KT) -> None:
+        self._referenced[self._slots[key]] = True
+
+    def remove(self, key: KT) -> None:
+        slot = self._slots.pop(key, None)
+        if slot is not None:
+            self._ring[slot] = _EMPTY
+            self._referenced[slot] = False
+            self._free.append(slot)
+
+    def evict(self, is_pinned: Callable[[KT], bool]) -> Optional[KT]:
+        n_slots = len(self._ring)
+        # Two rounds suffice: the first round clears all reference bits
+        for _ in range(2 * n_slots):
+            slot = self._hand
+            self._hand = (self._hand + 1) % n_slots
+            key = self._ring[slot]
+            if key is _EMPTY:
+                continue
+            if self._referenced[slot]:
+                self._referenced[slot] = False
+                continue
+            if is_pinned(key):
+                continue
+            self.remove(key)
+            return key
+        return None
+
+    def clear(self) -> None:
+        self.__init__()
+
+
+POLICIES: Dict[str, Callable[[], CachePolicy[Any]]] = {
+    "lru": LRUPolicy,
+    "clock": ClockPolicy,
+}
+
+
+class InstanceCache(MutableMapping[KT, IT], Generic[KT, IT]):
+    """A bounded mapping that keeps the instances that were built by
+    an external provider (e.g., an
+    :class:`~instancelib.instances.external.ExternalProvider`).
+
+    The cache is bounded by the number of entries, by the estimated
+    size of the entries in bytes, or by both. When a bound is exceeded,
+    the eviction policy chooses the entries that are removed. Evicted
+    instances are built again from the external source when they are
+    requested, so changes to an instance that are not written back with
+    `update_external` are lost on eviction. Pin the keys that must stay in
+    memory, such as the labeled pool, with the `pinned` argument or
+    :meth:`pin`.
+
+    Parameters
+    ----------
+    max_entries : Optional[int], optional
+        The maximum number of entries, by default 10000.
+        None means no bound on the number of entries.
+    max_bytes : Optional[int], optional
+        The maximum estimated size of all entries in bytes, by default None (no bound)
+    policy : Union[str, CachePolicy[KT]], optional
+        The eviction policy, either ``"lru"`` (default), ``"clock"``
+        or a :class:`CachePolicy` instance
+    pinned : Optional[Container[KT]], optional
+        A collection of keys that are never evicted, by default None.
+        This may be a live collection, such as the labeled
+        bucket of an environment; it is checked on every eviction.
+    sizeof : Callable[[IT], int], optional
+        The function that estimates the size of an entry,
+        by default :func:`instance_nbytes`
+
+    Attributes
+    ----------
+    hits : int
+        The number of lookups that were served from the cache
+    misses : int
+        The number of lookups for keys that were not cached
+    evictions : int
+        The number of entries that were evicted to stay within the bounds
+    """
+
+    def __init__(self,
+                 max_entries: Optional[int] = DEFAULT_MAX_ENTRIES,
+                 max_bytes: Optional[int] = None,
+                 policy: Union[str, CachePolicy[KT]] = "lru",
+                 pinned: Optional[Container[KT]] = None,
+                 sizeof: Callable[[IT], int] = instance_nbytes,
+                 ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.policy: CachePolicy[KT] = POLICIES[policy]() if isinstance(policy, str) else policy
+        self.pinned = pinned
+        self.sizeof = sizeof
+        self._pins: Set[KT] = set()
+        self._entries: Dict[KT, IT] = dict()
+        self._sizes: Dict[KT, int] = dict()
+        self._lock = threading.RLock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _is_pinned(self, key: KT) -> bool:
+        return key in self._pins or (self.pinned is not None and key in self.pinned)
+
+    def _over_bound(self) -> bool:
+        return ((self.max_entries is not None and len(self._entries) > self.max_entries)
+                or (self.max_bytes is not None and self.nbytes > self.max_bytes))
+
+    def _discard(self, key: KT) -> None:
+        del self._entries[key]
+        self.nbytes -= self._sizes.pop(key, 0)
+
+    def _enforce_bounds(self) -> None:
+        while self._over_bound():
+            key = self.policy.evict(self._is_pinned)
+            if key is None:
+                # Only pinned entries are left
+                break
+            self._discard(key)
+            self.evictions += 1
+
+    def get(self, key: KT, default: Any = None) -> Any:
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self.policy.access(key)
+                return self._entries[key]
+            self.misses += 1
+            return default
+
+    def __getitem__(self, key: KT) -> IT:
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self.policy.access(key)
+                return self._entries[key]
+            self.misses += 1
+        raise KeyError(key)
+
+    def __setitem__(self, key: KT, value: IT) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._discard(key)
+                self.policy.remove(key)
+            self._entries[key] = value
+            if self.max_bytes is not None:
+                size = self.sizeof(value)
+                self._sizes[key] = size
+                self.nbytes += size
+            self.policy.insert(key)
+            self._enforce_bounds()
+
+    def __delitem__(self, key: KT) -> None:
+        with self._lock:
+            self._discard(key)
+            self.policy.remove(key)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._entries
+
+    def __iter__(self) -> Iterator[KT]:
+        return iter(list(self._entries))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        """Remove all entries from the cache. The pins and counters are kept."""
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self.policy.clear()
+            self.nbytes = 0
+
+    def pin(self, keys: Iterable[KT]) -> None:
+        """Prevent the eviction of `keys`. The keys do not have to be cached yet.
+
+        Parameters
+        ----------
+        keys : Iterable[KT]
+            The keys
+        """
+        with self._lock:
+            self._pins.update(keys)
+
+    def unpin(self, keys: Iterable[KT]) -> None:
+        """Allow the eviction of `keys` again. Entries that exceed the
+        bounds are evicted immediately.
+
+        Parameters
+        ----------
+        keys : Iterable[KT]
+            The keys
+        """
+        with self._lock:
+            self._pins.difference_update(keys)
+            self._enforce_bounds()
+
+    @property
+    def hit_rate(self) -> float:
+        """The fraction of lookups that were served from the cache
+
+        Returns
+        -------
+        float
+            A number between 0 and 1
+        """
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the counters of the cache, which can be used to choose
+        suitable bounds
+
+        Returns
+        -------
+        Dict[str, Any]
+            A dictionary with the hits, misses, evictions, the number of
+            cached instances and their estimated size in bytes (only
+            tracked when `max_bytes` is set)
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hit_rate,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "nbytes": self.nbytes,
+            "max_bytes": self.max_bytes,
+        }
+
+    def reset_stats(self) -> None:
+        """Set the hit, miss and eviction counters to zero
+        """
+        self.hits, self.misses, self.evictions = 0, 0, 0
+
+
+class CachedInstanceMixin(Generic[KT, IT]):
+    """Adds an :class:`InstanceCache` to a provider that builds its
+    instances on demand. The cache is available as `instance_cache`.
+    """
+
+    instance_cache: MutableMapping[KT, IT]
+
+    def clear_cache(self) -> None:
+        """Remove all instances from the instance cache"""
+        self.instance_cache.clear()
+
+    def configure_cache(self,
+                        max_entries: Optional[int] = DEFAULT_MAX_ENTRIES,
+                        max_bytes: Optional[int] = None,
+                        policy: Union[str, CachePolicy[KT]] = "lru",
+                        pinned: Optional[Container[KT]] = None,
+                        ) -> None:
+        """Replace the instance cache by a new, empty cache.
+        See :class:`InstanceCache` for the arguments.
+
+        Examples
+        --------
+        Keep at most 100 MiB of instances in memory, but never evict
+        the labeled instances
+
+        >>> provider.configure_cache(max_entries=None, max_bytes=100 * 2 ** 20,
+        ...                          pinned=env.labeled)
+        """
+        self.instance_cache = InstanceCache(max_entries, max_bytes, policy, pinned)
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Return the hit, miss and eviction counters of the instance cache.
+        See :meth:`InstanceCache.stats`.
+        """
+        cache = self.instance_cache
+        if isinstance(cache, InstanceCache):
+            return cache.stats()
+        return {"entries": len(cache)}
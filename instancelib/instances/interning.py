@@ -0,0 +1,215 @@
+# Copyright (C) 2021 The InstanceLib Authors. All Rights Reserved.
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, Generic, Iterable, Iterator, List, Sequence, Tuple
+
+import numpy as np
+import numpy.typing as npt
+
+from ..typehints import KT
+from ..utils.chunks import divide_sequence
+from .columnar import ObjectColumn
+
+INT32_MAX = np.iinfo(np.int32).max
+
+
+class KeyInterner(Generic[KT]):
+    """Assigns a dense integer id to every key, in the order in which
+    the keys are first seen. The ids never change, so the interner can be
+    shared by all providers, label providers and storages of an environment.
+    Internally, these components can then store their keys as NumPy integer
+    arrays (e.g., masks over the ids) and only translate to the original keys
+    at their public API.
+
+    The keys can be any hashable value (integers, strings, UUIDs, or a mix).
+    Translating keys to ids costs one dictionary lookup per key; translating
+    ids to keys is a single fancy index.
+
+    Parameters
+    ----------
+    keys : Iterable[KT], optional
+        The keys that are interned first, by default empty
+    """
+
+    def __init__(self, keys: Iterable[KT] = ()) -> None:
+        self._ids: Dict[KT, int] = dict()
+        self._keys = ObjectColumn()
+        self._lock = threading.Lock()
+        self.intern(list(keys))
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._ids
+
+    def __iter__(self) -> Iterator[KT]:
+        for chunk in divide_sequence(range(len(self)), 10000):
+            yield from self._keys.take(slice(chunk.start, chunk.stop)) # type: ignore
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {"keys": self._keys.take(slice(None))}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__(state["keys"]) # type: ignore
+
+    @property
+    def dtype(self) -> np.dtype:
+        """The smallest integer type that can store all ids:
+        `int32`, or `int64` for more than 2**31 - 1 keys
+        """
+        return np.dtype(np.int32) if len(self) <= INT32_MAX else np.dtype(np.int64)
+
+    def intern(self, keys: Sequence[KT]) -> npt.NDArray[Any]:
+        """Return the ids of `keys`. Keys that were not seen before get new ids.
+
+        Parameters
+        ----------
+        keys : Sequence[KT]
+            The keys
+
+        Returns
+        -------
+        npt.NDArray[Any]
+            The ids, in the order of `keys`
+        """
+        with self._lock:
+            ids = self._ids
+            new_keys: List[KT] = list()
+            for key in keys:
+                if key not in ids:
+                    ids[key] = len(self._keys) + len(new_keys)
+                    new_keys.append(key)
+            if new_keys:
+                self._keys.append(new_keys)
+            return np.fromiter(map(ids.__getitem__, keys), dtype=self.dtype, count=len(keys))
+
+    def intern_key(self, key: KT) -> int:
+        """Return the id of a single key and assign a new id if necessary
+
+        Parameters
+        ----------
+        key : KT
+            The key
+
+        Returns
+        -------
+        int
+            The id of the key
+        """
+        found = self._ids.get(key)
+        if found is not None:
+            return found
+        return int(self.intern([key])[0])
+
+    def lookup(self, keys: Sequence[Any]) -> Tuple[npt.NDArray[np.bool_], npt.NDArray[Any]]:
+        """Find the ids of keys without interning the unknown keys
+
+        Parameters
+        ----------
+        keys : Sequence[Any]
+            The keys
+
+        Returns
+        -------
+        Tuple[npt.NDArray[np.bool_], npt.NDArray[Any]]
+            A tuple containing:
+
+                - A mask that indicates which keys are known
+                - The ids of the keys (-1 for unknown keys)
+        """
+        ids = np.fromiter((self._ids.get(key, -1) for key in keys),
+                          dtype=self.dtype, count=len(keys))
+        return ids >= 0, ids
+
+    def ids(self, keys: Sequence[Any]) -> npt.NDArray[Any]:
+        """Return the ids of keys that must be known
+
+        Parameters
+        ----------
+        keys : Sequence[Any]
+            The keys
+
+        Returns
+        -------
+        npt.NDArray[Any]
+            The ids, in the order of `keys`
+
+        Raises
+        ------
+        KeyError
+            If one of the keys is unknown
+        """
+        found, ids = self.lookup(keys)
+        if not found.all():
+            missing = [k for k, f in zip(keys, found) if not f]
+            raise KeyError(f"The keys {missing[:5]} are not interned")
+        return ids
+
+    def key(self, key_id: int) -> KT:
+        """Return the key of an id
+
+        Parameters
+        ----------
+        key_id : int
+            The id
+
+        Returns
+        -------
+        KT
+            The key
+        """
+        if not 0 <= key_id < len(self):
+            raise KeyError(key_id)
+        return self._keys[key_id]
+
+    def keys(self, ids: Any) -> List[KT]:
+        """Return the keys of an array (or a slice) of ids
+
+        Parameters
+        ----------
+        ids : Any
+            The ids
+
+        Returns
+        -------
+        List[KT]
+            The keys, in the order of `ids`
+        """
+        return self._keys.take(ids) # type: ignore
+
+    def mask(self, keys: Iterable[Any]) -> npt.NDArray[np.bool_]:
+        """Return a boolean mask over all ids that is True for `keys`.
+        Unknown keys are ignored.
+
+        Parameters
+        ----------
+        keys : Iterable[Any]
+            The keys
+
+        Returns
+        -------
+        npt.NDArray[np.bool_]
+            An array of length ``len(self)``
+        """
+        keylist = list(keys)
+        found, ids = self.lookup(keylist)
+        mask = np.zeros(len(self), dtype=np.bool_)
+        mask[ids[found]] = True
+        return mask
@@ -0,0 +1,352 @@
+# Copyright (C) 2021 The InstanceLib Authors. All Rights Reserved.
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+from __future__ import annotations
+
+from typing import Any, Generic, Iterable, Iterator, Optional, Sequence, Tuple
+from uuid import UUID
+
+import numpy as np
+import numpy.typing as npt
+
+from ..typehints import KT
+from ..utils.chunks import divide_sequence
+
+INT_KEYS = "int"
+STR_KEYS = "str"
+UUID_KEYS = "uuid"
+KEY_KINDS = (INT_KEYS, STR_KEYS, UUID_KEYS)
+
+
+def _is_int_key(key: Any) -> bool:
+    return isinstance(key, (int, np.integer)) and not isinstance(key, bool)
+
+
+def infer_key_kind(keys: Iterable[Any]) -> str:
+    """Determine how a collection of keys can be stored in a NumPy array.
+
+    All keys must have the same type: an index stores either integers,
+    strings or :class:`~uuid.UUID` objects. Mixed keys (e.g., ``1`` and
+    ``"1"``) are rejected, as they cannot be stored in one native array
+    without losing their type.
+
+    Parameters
+    ----------
+    keys : Iterable[Any]
+        The keys
+
+    Returns
+    -------
+    str
+        `"int"` if all keys are integers (or if there are no keys),
+        `"uuid"` if all keys are :class:`~uuid.UUID` objects and `"str"`
+        if all keys are strings.
+
+    Raises
+    ------
+    TypeError
+        If the keys have different types, or a type that is not supported
+    """
+    keylist = list(keys)
+    if all(map(_is_int_key, keylist)):
+        return INT_KEYS
+    if all(isinstance(k, UUID) for k in keylist):
+        return UUID_KEYS
+    if all(isinstance(k, str) for k in keylist):
+        return STR_KEYS
+    key_types = sorted({type(k).__name__ for k in keylist})
+    raise TypeError(
+        "The keys of an index should all be integers, all strings or all UUIDs, "
+        f"got keys of types {key_types}")
+
+
+def encode_keys(keys: Sequence[Any], kind: str) -> npt.NDArray[Any]:
+    """Convert keys to a native NumPy array
+
+    Parameters
+    ----------
+    keys : Sequence[Any]
+        The keys
+    kind : str
+        The key kind (see :func:`infer_key_kind`)
+
+    Returns
+    -------
+    npt.NDArray[Any]
+        An `int64` array for integer keys, a fixed width bytes array otherwise
+    """
+    if kind == INT_KEYS:
+        return np.asarray(keys, dtype=np.int64).reshape((len(keys),))
+    if kind == UUID_KEYS:
+        return np.array([k.bytes for k in keys], dtype="S16").reshape((len(keys),))
+    encoded = [str(k).encode("utf-8") for k in keys]
+    width = max(map(len, encoded), default=1)
+    return np.array(encoded, dtype=f"S{max(width, 1)}").reshape((len(keys),))
+
+
+def decode_keys(array: npt.NDArray[Any], kind: str) -> Sequence[Any]:
+    """Convert a native NumPy key array back to Python keys
+
+    Parameters
+    ----------
+    array : npt.NDArray[Any]
+        An array created by :func:`encode_keys`
+    kind : str
+        The key kind
+
+    Returns
+    -------
+    Sequence[Any]
+        A list of keys
+    """
+    values = array.tolist()
+    if kind == INT_KEYS:
+        return values
+    if kind == UUID_KEYS:
+        # NumPy strips trailing null bytes from fixed width bytes
+        return [UUID(bytes=value.ljust(16, b"\0")) for value in values]
+    return [value.decode("utf-8") for value in values]
+
+
+class SortedKeyIndex(Generic[KT]):
+    """An index that maps keys to row positions without Python dictionaries.
+
+    The index keeps two arrays: `row_keys`, the key of every row
+    (in storage order), and `order`, the permutation that sorts `row_keys`.
+    Lookups are done with :func:`numpy.searchsorted` over whole batches
+    of keys. All keys in an index have the same type (all integers, all
+    strings or all UUIDs, see :func:`infer_key_kind`); keys of another type
+    cannot be added and are never found.
+
+    Parameters
+    ----------
+    row_keys : npt.NDArray[Any]
+        The (encoded) key of every row
+    kind : str
+        The key kind (see :func:`infer_key_kind`)
+    order : Optional[npt.NDArray[Any]], optional
+        The sorting permutation of `row_keys`. If it only covers the first rows,
+        the remaining rows are merged into the permutation. By default None,
+        the permutation is computed from scratch.
+    """
+
+    def __init__(
+        self,
+        row_keys: npt.NDArray[Any],
+        kind: str,
+        order: Optional[npt.NDArray[Any]] = None,
+    ) -> None:
+        assert kind in KEY_KINDS
+        self.kind = kind
+        self.row_keys = row_keys
+        if order is None:
+            order = np.argsort(row_keys, kind="stable")
+        self.order = order.astype(np.int64)
+        self.sorted_keys = row_keys[self.order]
+        if len(self.order) < len(row_keys):
+            self._merge(np.arange(len(self.order), len(row_keys)))
+
+    @classmethod
+    def from_keys(
+        cls, keys: Sequence[KT], kind: Optional[str] = None
+    ) -> SortedKeyIndex[KT]:
+        """Build an index where the row of ``keys[i]`` is `i`
+
+        Parameters
+        ----------
+        keys : Sequence[KT]
+            The keys
+        kind : Optional[str], optional
+            The key kind, by default None (inferred from `keys`)
+
+        Returns
+        -------
+        SortedKeyIndex[KT]
+            A new index
+        """
+        chosen_kind = infer_key_kind(keys) if kind is None else kind
+        return cls(encode_keys(keys, chosen_kind), chosen_kind)
+
+    @classmethod
+    def empty(cls, kind: str = INT_KEYS) -> SortedKeyIndex[KT]:
+        return cls.from_keys([], kind)
+
+    def __len__(self) -> int:
+        return len(self.row_keys)
+
+    def __contains__(self, key: object) -> bool:
+        found, _ = self.lookup([key])
+        return bool(found[0])
+
+    def __iter__(self) -> Iterator[KT]:
+        for chunk in divide_sequence(self.row_keys, 10000):
+            yield from decode_keys(chunk, self.kind)
+
+    def _encode_query(
+        self, keys: Sequence[Any]
+    ) -> Tuple[npt.NDArray[Any], npt.NDArray[np.bool_]]:
+        if self.kind == INT_KEYS:
+            valid = np.fromiter(map(_is_int_key, keys), dtype=np.bool_, count=len(keys))
+            if valid.all():
+                return encode_keys(keys, self.kind), valid
+            query = encode_keys([k if v else 0 for k, v in zip(keys, valid)], self.kind)
+            return query, valid
+        if self.kind == UUID_KEYS:
+            valid = np.fromiter(
+                (isinstance(k, UUID) for k in keys), dtype=np.bool_, count=len(keys)
+            )
+            query = np.array(
+                [k.bytes if v else b"" for k, v in zip(keys, valid)], dtype="S16"
+            ).reshape((len(keys),))
+            return query, valid
+        # Keys of another type are never present, so 1 does not match "1"
+        valid = np.fromiter(
+            (isinstance(k, str) for k in keys), dtype=np.bool_, count=len(keys)
+        )
+        if valid.all():
+            return encode_keys(keys, self.kind), valid
+        query = encode_keys([k if v else "" for k, v in zip(keys, valid)], self.kind)
+        return query, valid
+
+    def lookup(
+        self, keys: Sequence[Any]
+    ) -> Tuple[npt.NDArray[np.bool_], npt.NDArray[np.int64]]:
+        """Find the rows of a batch of keys
+
+        Parameters
+        ----------
+        keys : Sequence[Any]
+            The keys that should be looked up
+
+        Returns
+        -------
+        Tuple[npt.NDArray[np.bool_], npt.NDArray[np.int64]]
+            A tuple containing:
+
+                - A mask that indicates which keys are present in the index
+                - The rows of the keys (only meaningful where the mask is True)
+        """
+        n_keys = len(keys)
+        if n_keys == 0 or len(self.sorted_keys) == 0:
+            return np.zeros(n_keys, dtype=np.bool_), np.zeros(n_keys, dtype=np.int64)
+        query, valid = self._encode_query(keys)
+        positions = np.searchsorted(self.sorted_keys, query)
+        np.minimum(positions, len(self.sorted_keys) - 1, out=positions)
+        found = valid & (self.sorted_keys[positions] == query)
+        rows = self.order[positions]
+        return found, rows
+
+    def rows(self, keys: Sequence[Any]) -> npt.NDArray[np.int64]:
+        """Return the rows of keys that must be present in the index
+
+        Parameters
+        ----------
+        keys : Sequence[Any]
+            The keys
+
+        Returns
+        -------
+        npt.NDArray[np.int64]
+            The rows, in the order of `keys`
+
+        Raises
+        ------
+        KeyError
+            If one of the keys is not present
+        """
+        found, rows = self.lookup(keys)
+        if not found.all():
+            missing = [k for k, f in zip(keys, found) if not f]
+            raise KeyError(f"The keys {missing[:5]} are not present in the index")
+        return rows
+
+    def keys_for_rows(self, rows: Any) -> Sequence[KT]:
+        """Return the keys that belong to the given `rows`
+
+        Parameters
+        ----------
+        rows : Any
+            A sequence of row positions or a slice
+
+        Returns
+        -------
+        Sequence[KT]
+            The keys
+        """
+        return decode_keys(self.row_keys[rows], self.kind)  # type: ignore
+
+    def _merge(self, new_rows: npt.NDArray[Any]) -> None:
+        new_keys = self.row_keys[new_rows]
+        new_order = np.argsort(new_keys, kind="stable")
+        new_sorted = new_keys[new_order]
+        if new_sorted.dtype != self.sorted_keys.dtype:
+            self.sorted_keys = self.sorted_keys.astype(self.row_keys.dtype)
+        insert_at = np.searchsorted(self.sorted_keys, new_sorted, side="right")
+        self.sorted_keys = np.insert(self.sorted_keys, insert_at, new_sorted)
+        self.order = np.insert(self.order, insert_at, new_rows[new_order])
+
+    def append(self, keys: Sequence[KT]) -> npt.NDArray[np.int64]:
+        """Append keys to the index. The keys get the rows after the
+        last row currently in the index
+
+        Parameters
+        ----------
+        keys : Sequence[KT]
+            The new keys. These should not be present in the index
+
+        Returns
+        -------
+        npt.NDArray[np.int64]
+            The rows that were assigned to the keys
+
+        Raises
+        ------
+        TypeError
+            If the keys have a different type than the keys in the index
+            (see :func:`infer_key_kind`)
+        """
+        if not len(keys):
+            return np.zeros(0, dtype=np.int64)
+        kind = infer_key_kind(keys)
+        if not len(self):
+            if kind != self.kind:
+                self.kind = kind
+                self.row_keys = encode_keys([], self.kind)
+                self.sorted_keys = self.row_keys
+        elif kind != self.kind:
+            raise TypeError(
+                f"This index stores {self.kind} keys, {kind} keys cannot be added")
+        return self.extend(encode_keys(keys, self.kind))
+
+    def extend(self, encoded: npt.NDArray[Any]) -> npt.NDArray[np.int64]:
+        """Append keys that are already encoded (e.g., read from a ``keys``
+        dataset) to the index. Only the new keys are sorted and merged.
+
+        Parameters
+        ----------
+        encoded : npt.NDArray[Any]
+            The encoded keys (see :func:`encode_keys`), of the kind of this index
+
+        Returns
+        -------
+        npt.NDArray[np.int64]
+            The rows that were assigned to the keys
+        """
+        start = len(self.row_keys)
+        self.row_keys = np.concatenate([self.row_keys, encoded])
+        new_rows = np.arange(start, len(self.row_keys), dtype=np.int64)
+        self._merge(new_rows)
+        return new_rows
@@ -0,0 +1,620 @@
+# Copyright (C) 2021 The InstanceLib Authors. All Rights Reserved.
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+from __future__ import annotations
+
+import itertools
+import json
+import os
+from os import PathLike
+from typing import Any, Dict, Generic, Iterator, Optional, Sequence, Tuple
+
+import numpy as np
+import numpy.typing as npt
+
+from ..exceptions import NoVectorsException
+from ..typehints import KT, DType
+from ..utils.func import filter_snd_none
+from ..utils.numpy import (matrix_to_vector_list, matrix_tuple_to_vectors,
+                           matrix_tuple_to_zipped, rows_to_selector)
+from .keyindex import SortedKeyIndex
+from .vectorstorage import VectorStorage, ensure_writeable
+
+
+class MemmapVectorStorage(VectorStorage[KT, npt.NDArray[DType], npt.NDArray[DType]], Generic[KT, DType]):
+    """Vector storage in a single, contiguous raw binary file that is opened
+    with :class:`numpy.memmap`.
+
+    All rows are stored in one growable matrix, so reading a chunk of
+    vectors is a slice (or a single fancy indexing operation) on the mapped
+    file. Processes that open the same file share the operating system's
+    page cache, so forked or spawned workers do not each load their own copy
+    of the matrix.
+
+    Next to the data file, these sidecar files are kept:
+
+        - ``<path>.meta.json``: The data type, dimension and number of rows
+        - ``<path>.keys.npy``: The key of every row
+        - ``<path>.order.npy``: The permutation that sorts the keys
+          (see :class:`~instancelib.instances.keyindex.SortedKeyIndex`)
+        - ``<path>.dead.npy``: A mask of the rows of deleted keys (only
+          if there are deleted keys)
+
+    The sidecar files are written when the storage is flushed or closed.
+
+    Deleted rows are marked in a tombstone mask and are skipped by all read
+    operations. Adding a deleted key again reuses its row. The space of
+    deleted rows is reclaimed by :meth:`compact`, which rewrites the data
+    file and rebuilds the key index.
+
+    Vectors and matrices that are views on the mapped file are returned
+    read-only; use :meth:`add_bulk_matrix` or ``storage[key] = vector`` to
+    change them.
+
+    Parameters
+    ----------
+        path : PathLike[str]
+            The path to the data file
+        mode : str, optional
+            The file mode, by default "r". Modes "r" and "r+" require an
+            existing storage, mode "a" creates a storage if necessary and
+            mode "w" always creates a new storage.
+        dtype : npt.DTypeLike, optional
+            The data type of the vectors for new storages, by default float32
+    """
+    __writemodes = ["a", "r+", "w"]
+
+    def __init__(self,
+                 path: "PathLike[str]",
+                 mode: str = "r",
+                 dtype: npt.DTypeLike = np.float32) -> None:
+        assert mode in ["r", *self.__writemodes]
+        self.__mode = mode
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.dim: Optional[int] = None
+        self.n_rows = 0
+        self.index: SortedKeyIndex[KT] = SortedKeyIndex.empty()
+        self._data: Optional[np.memmap] = None
+        self._dead: Optional[npt.NDArray[np.bool_]] = None
+        self._n_dead = 0
+        if mode == "w":
+            self.__remove_files()
+        if mode in ["r", "r+"] and not os.path.exists(self.meta_path):
+            raise FileNotFoundError(f"There is no vector storage at {path}")
+        self.reload()
+
+    @property
+    def meta_path(self) -> str:
+        return f"{os.fspath(self.path)}.meta.json"
+
+    @property
+    def keys_path(self) -> str:
+        return f"{os.fspath(self.path)}.keys.npy"
+
+    @property
+    def order_path(self) -> str:
+        return f"{os.fspath(self.path)}.order.npy"
+
+    @property
+    def dead_path(self) -> str:
+        return f"{os.fspath(self.path)}.dead.npy"
+
+    def __remove_files(self) -> None:
+        for file in (os.fspath(self.path), self.meta_path, self.keys_path,
+                     self.order_path, self.dead_path):
+            if os.path.exists(file):
+                os.remove(file)
+
+    @property
+    def writeable(self) -> bool:
+        """Check if the storage is writeable
+
+        Returns
+        -------
+        bool
+            True when writeable
+        """
+        return self.__mode in self.__writemodes
+
+    @property
+    def capacity(self) -> int:
+        """The number of rows that fit in the data file without growing it"""
+        if self._data is None:
+            return 0
+        return self._data.shape[0]
+
+    def __len__(self) -> int:
+        return len(self.index) - self._n_dead
+
+    @property
+    def fragmentation(self) -> float:
+        """The fraction of stored rows that belong to deleted keys.
+        A high fragmentation indicates that :meth:`compact` is worthwhile.
+
+        Returns
+        -------
+        float
+            A number between 0 and 1
+        """
+        if not self.n_rows:
+            return 0.0
+        return self._n_dead / self.n_rows
+
+    def __open_data(self, rows: int) -> None:
+        """Map the first `rows` rows of the data file
+
+        Parameters
+        ----------
+        rows : int
+            The number of rows that should be mapped
+        """
+        self._data = None
+        if rows > 0 and self.dim is not None:
+            mode = "r+" if self.writeable else "r"
+            self._data = np.memmap(self.path, dtype=self.dtype,
+                                   mode=mode, shape=(rows, self.dim))
+
+    def reload(self) -> None:
+        """Reload the metadata and the index from disk. Readers can use
+        this method to see the rows that a writer has flushed.
+        """
+        if not os.path.exists(self.meta_path):
+            return
+        with open(self.meta_path, "r", encoding="utf-8") as fh:
+            meta: Dict[str, Any] = json.load(fh)
+        self.dtype = np.dtype(meta["dtype"])
+        self.dim = meta["dim"]
+        self.n_rows = meta["rows"]
+        row_keys = np.load(self.keys_path)[:self.n_rows]
+        order = np.load(self.order_path) if os.path.exists(self.order_path) else None
+        if order is not None and len(order) != len(row_keys):
+            order = None
+        self.index = SortedKeyIndex(row_keys, meta["key_kind"], order)
+        self._dead, self._n_dead = None, 0
+        if os.path.exists(self.dead_path):
+            self._dead = np.load(self.dead_path)[:self.n_rows]
+            self._n_dead = int(np.count_nonzero(self._dead))
+        capacity = self.n_rows
+        if self.writeable:
+            file_size = os.path.getsize(self.path)
+            capacity = max(file_size // (self.dtype.itemsize * self.dim), self.n_rows)
+        self.__open_data(capacity)
+
+    @staticmethod
+    def __save_atomic(path: str, array: npt.NDArray[Any]) -> None:
+        tmp_path = f"{path}.tmp.npy"
+        np.save(tmp_path, array)
+        os.replace(tmp_path, path)
+
+    @ensure_writeable
+    def flush(self) -> None:
+        """Write all changes and the index to disk
+        """
+        if self.dim is None:
+            return
+        if self._data is not None:
+            self._data.flush()
+        self.__save_atomic(self.keys_path, self.index.row_keys)
+        self.__save_atomic(self.order_path, self.index.order)
+        if self._n_dead and self._dead is not None:
+            self.__save_atomic(self.dead_path, self._dead)
+        elif os.path.exists(self.dead_path):
+            os.remove(self.dead_path)
+        meta = {
+            "dtype": self.dtype.str,
+            "dim": self.dim,
+            "rows": self.n_rows,
+            "key_kind": self.index.kind,
+        }
+        tmp_path = f"{self.meta_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump(meta, fh)
+        os.replace(tmp_path, self.meta_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback): # type: ignore
+        if self.writeable:
+            self.flush()
+
+    def close(self) -> None:
+        """Close the file and store changes to the index to disk
+        """
+        self.__exit__(None, None, None) # type: ignore
+        self._data = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = dict(self.__dict__)
+        state["_data"] = None
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        capacity = self.n_rows
+        if self.writeable and self.dim is not None:
+            file_size = os.path.getsize(self.path)
+            capacity = max(file_size // (self.dtype.itemsize * self.dim), self.n_rows)
+        self.__open_data(capacity)
+
+    @ensure_writeable
+    def __reserve(self, rows: int) -> None:
+        """Make sure that the data file can hold `rows` rows.
+        The file grows by (at least) doubling its capacity.
+
+        Parameters
+        ----------
+        rows : int
+            The required number of rows
+        """
+        assert self.dim is not None
+        if rows <= self.capacity:
+            return
+        new_capacity = max(rows, 2 * self.capacity, 1024)
+        if self._data is not None:
+            self._data.flush()
+        self._data = None
+        with open(self.path, "ab") as fh:
+            fh.truncate(new_capacity * self.dim * self.dtype.itemsize)
+        self.__open_data(new_capacity)
+
+    @ensure_writeable
+    def _append_matrix(self, keys: Sequence[KT], matrix: npt.NDArray[DType]) -> None:
+        """Append vectors for keys that are not yet in storage
+
+        Parameters
+        ----------
+        keys : Sequence[KT]
+            The new keys
+        matrix : npt.NDArray[DType]
+            The vectors (rows correspond with `keys`)
+        """
+        if self.dim is None:
+            self.dim = int(matrix.shape[1])
+        assert matrix.shape[1] == self.dim
+        start = self.n_rows
+        stop = start + matrix.shape[0]
+        self.__reserve(stop)
+        assert self._data is not None
+        self._data[start:stop, :] = matrix
+        self.index.append(keys)
+        self.n_rows = stop
+
+    @ensure_writeable
+    def add_bulk_matrix(self, keys: Sequence[KT], matrix: npt.NDArray[DType]) -> None:
+        """Add matrices in bulk. Vectors of keys that are already
+        in storage are replaced.
+
+        Parameters
+        ----------
+        keys : Sequence[KT]
+            A list of identifiers. The following should hold: `len(keys) == matrix.shape[0]`
+        matrix : npt.NDArray[DType]
+            A matrix. The rows should correspond with the identifiers in keys
+        """
+        assert len(keys) == matrix.shape[0]
+        found, rows = self.index.lookup(keys)
+        if found.any():
+            assert self._data is not None
+            self._data[rows[found], :] = matrix[found, :]
+            self._revive(rows[found])
+            if found.all():
+                return
+            new_keys = [key for key, present in zip(keys, found) if not present]
+            self._append_matrix(new_keys, matrix[~found, :])
+            return
+        self._append_matrix(keys, matrix)
+
+    @ensure_writeable
+    def add_bulk(self, input_keys: Sequence[KT], input_values: Sequence[Optional[npt.NDArray[DType]]]) -> None:
+        """Add a bulk of keys and values (vectors) to the vector storage
+
+        Parameters
+        ----------
+        input_keys : Sequence[KT]
+            The keys of the Instances
+        input_values : Sequence[Optional[npt.NDArray[DType]]]
+            The vectors that correspond with the indices
+        """
+        assert len(input_keys) == len(input_values)
+        keys, values = filter_snd_none(input_keys, input_values) # type: ignore
+        if not values:
+            return
+        self.add_bulk_matrix(keys, np.vstack(values)) # type: ignore
+
+    def __getitem__(self, k: KT) -> npt.NDArray[DType]:
+        if self._data is None:
+            raise NoVectorsException("There are no vectors stored in this object")
+        found, rows = self._lookup_live([k])
+        if not found[0]:
+            raise KeyError(k)
+        return self._readonly(self._data[int(rows[0]), :])
+
+    @ensure_writeable
+    def __setitem__(self, k: KT, value: npt.NDArray[DType]) -> None:
+        self.add_bulk_matrix([k], value.reshape((1, -1)))
+
+    def __delitem__(self, v: KT) -> None:
+        self.delete_bulk([v])
+
+    def __contains__(self, item: object) -> bool:
+        found, _ = self._lookup_live([item])
+        return bool(found[0])
+
+    def __iter__(self) -> Iterator[KT]:
+        if not self._n_dead:
+            yield from self.index
+            return
+        live_rows = self._live_rows()
+        for start in range(0, len(live_rows), 10000):
+            yield from self.index.keys_for_rows(live_rows[start:(start + 10000)])
+
+    @staticmethod
+    def _readonly(array: npt.NDArray[DType]) -> npt.NDArray[DType]:
+        """Prevent writes through a view on the mapped file"""
+        array.setflags(write=False)
+        return array
+
+    def _dead_rows(self, rows: npt.NDArray[np.int64]) -> npt.NDArray[np.bool_]:
+        """Check which of the `rows` are marked as deleted
+
+        Parameters
+        ----------
+        rows : npt.NDArray[np.int64]
+            Row positions
+
+        Returns
+        -------
+        npt.NDArray[np.bool_]
+            A mask that is True for deleted rows
+        """
+        dead = np.zeros(len(rows), dtype=np.bool_)
+        if self._dead is not None:
+            inside = rows < len(self._dead)
+            dead[inside] = self._dead[rows[inside]]
+        return dead
+
+    def _live_rows(self) -> npt.NDArray[np.int64]:
+        """Return the positions of all rows that are not deleted
+
+        Returns
+        -------
+        npt.NDArray[np.int64]
+            The sorted positions
+        """
+        if not self._n_dead or self._dead is None:
+            return np.arange(self.n_rows)
+        dead = np.zeros(self.n_rows, dtype=np.bool_)
+        dead[:len(self._dead)] = self._dead[:self.n_rows]
+        return np.flatnonzero(~dead)
+
+    def _lookup_live(self, keys: Sequence[Any]) -> Tuple[npt.NDArray[np.bool_], npt.NDArray[np.int64]]:
+        """Look up keys in the index, treating deleted keys as not present
+
+        Parameters
+        ----------
+        keys : Sequence[Any]
+            The keys
+
+        Returns
+        -------
+        Tuple[npt.NDArray[np.bool_], npt.NDArray[np.int64]]
+            A mask of found keys and their rows
+        """
+        found, rows = self.index.lookup(keys)
+        if self._n_dead:
+            found &= ~self._dead_rows(rows)
+        return found, rows
+
+    def _revive(self, rows: npt.NDArray[np.int64]) -> None:
+        """Clear the tombstones of `rows`, when deleted keys are added again
+
+        Parameters
+        ----------
+        rows : npt.NDArray[np.int64]
+            Row positions
+        """
+        if not self._n_dead or self._dead is None:
+            return
+        revived = np.unique(rows[self._dead_rows(rows)])
+        if len(revived):
+            self._dead[revived] = False
+            self._n_dead -= len(revived)
+
+    @ensure_writeable
+    def delete_bulk(self, keys: Sequence[KT]) -> None:
+        """Delete the vectors of `keys`. The rows are marked with a tombstone;
+        the space is reclaimed by :meth:`compact`.
+
+        Parameters
+        ----------
+        keys : Sequence[KT]
+            The keys that should be deleted
+
+        Raises
+        ------
+        KeyError
+            If one of the keys is not present
+        """
+        found, rows = self._lookup_live(keys)
+        if not found.all():
+            missing = [k for k, f in zip(keys, found) if not f]
+            raise KeyError(f"The keys {missing[:5]} are not present in the storage")
+        if self._dead is None or len(self._dead) < self.n_rows:
+            dead = np.zeros(self.n_rows, dtype=np.bool_)
+            if self._dead is not None:
+                dead[:len(self._dead)] = self._dead
+            self._dead = dead
+        deleted = np.unique(rows)
+        self._dead[deleted] = True
+        self._n_dead += len(deleted)
+
+    @ensure_writeable
+    def compact(self, chunk_size: int = 10000) -> None:
+        """Remove the rows of deleted keys. The live rows are copied in
+        blocks of `chunk_size` rows to a new data file, that replaces the
+        current file with an atomic rename. The key index is rebuilt for
+        the new row positions.
+
+        Parameters
+        ----------
+        chunk_size : int, optional
+            The number of rows that are copied at once, by default 10000
+        """
+        if not self._n_dead or self._data is None or self.dim is None:
+            return
+        live_rows = self._live_rows()
+        path = os.fspath(self.path)
+        tmp_path = f"{path}.compact.tmp"
+        target = np.memmap(tmp_path, dtype=self.dtype, mode="w+",
+                           shape=(max(len(live_rows), 1), self.dim))
+        for start in range(0, len(live_rows), chunk_size):
+            rows = live_rows[start:(start + chunk_size)]
+            target[start:(start + len(rows)), :] = self._data[rows_to_selector(rows), :]
+        target.flush()
+        del target
+        self.index = SortedKeyIndex(self.index.row_keys[live_rows], self.index.kind)
+        self.n_rows = len(live_rows)
+        self._dead, self._n_dead = None, 0
+        self._data = None
+        os.replace(tmp_path, path)
+        self.__open_data(max(self.n_rows, 1))
+        self.flush()
+
+    def _get_rows(self, rows: npt.NDArray[Any]) -> Tuple[Sequence[KT], npt.NDArray[DType]]:
+        """Return the keys and vectors of `rows`. Consecutive rows are returned
+        as a view on the mapped file.
+
+        Parameters
+        ----------
+        rows : npt.NDArray[Any]
+            The row positions
+
+        Returns
+        -------
+        Tuple[Sequence[KT], npt.NDArray[DType]]
+            A tuple containing the keys and the matrix
+        """
+        if self._data is None:
+            raise NoVectorsException("There are no vectors stored in this object")
+        selector = rows_to_selector(rows)
+        matrix = self._data[selector, :]
+        if isinstance(selector, slice):
+            matrix = self._readonly(matrix)
+        return self.index.keys_for_rows(selector), matrix
+
+    def get_matrix(self, keys: Sequence[KT]) -> Tuple[Sequence[KT], npt.NDArray[DType]]:
+        """Return a matrix containing the vectors that correspond with the `keys`
+
+        Parameters
+        ----------
+        keys : Sequence[KT]
+            A list of identifier keys
+
+        Returns
+        -------
+        Tuple[Sequence[KT], npt.NDArray[DType]]
+            A tuple containing:
+
+                - A list with identifier keys (in the order of `keys`,
+                  keys that are not in storage are left out)
+                - A matrix containing the vectors
+                    (rows correspond with the returned list)
+
+        Raises
+        ------
+        NoVectorsException
+            If there are no vectors stored in this object
+        """
+        found, rows = self._lookup_live(keys)
+        return self._get_rows(rows[found])
+
+    def get_matrix_chunked(self,
+                           keys: Sequence[KT],
+                           chunk_size: int = 200) -> Iterator[Tuple[Sequence[KT], npt.NDArray[DType]]]:
+        """Return matrices in chunks of `chunk_size` containing the vectors requested in `keys`
+
+        Parameters
+        ----------
+        keys : Sequence[KT]
+            A list of identifier keys
+        chunk_size : int, optional
+            The size of the chunks, by default 200
+
+        Yields
+        -------
+        Tuple[Sequence[KT], npt.NDArray[DType]]
+            A tuple containing:
+
+                - A list with identifier keys
+                - A matrix containing the vectors
+                    (rows correspond with the returned list)
+        """
+        if self._data is None:
+            return
+        found, rows = self._lookup_live(keys)
+        present_rows = rows[found]
+        for start in range(0, len(present_rows), chunk_size):
+            yield self._get_rows(present_rows[start:(start + chunk_size)])
+
+    def matrices_chunker(self, chunk_size: int = 200) -> Iterator[Tuple[Sequence[KT], npt.NDArray[DType]]]:
+        """Yield matrices in chunks of `chunk_size` containing all the vectors in this object.
+        The matrices are read-only views on the mapped file.
+
+        Parameters
+        ----------
+        chunk_size : int, optional
+            The size of the chunks, by default 200
+
+        Yields
+        -------
+        Tuple[Sequence[KT], npt.NDArray[DType]]
+            A tuple containing:
+
+                - A list with identifier keys
+                - A matrix containing the vectors
+                    (row indices correspond with the list indices)
+        """
+        if self._data is None:
+            return
+        if self._n_dead:
+            live_rows = self._live_rows()
+            for start in range(0, len(live_rows), chunk_size):
+                yield self._get_rows(live_rows[start:(start + chunk_size)])
+            return
+        for start in range(0, self.n_rows, chunk_size):
+            selector = slice(start, min(start + chunk_size, self.n_rows))
+            yield self.index.keys_for_rows(selector), self._readonly(self._data[selector, :])
+
+    def get_vectors(self, keys: Sequence[KT]) -> Tuple[Sequence[KT], Sequence[npt.NDArray[DType]]]:
+        ret_keys, ret_matrix = self.get_matrix(keys)
+        return ret_keys, matrix_to_vector_list(ret_matrix)
+
+    def get_vectors_chunked(self,
+                            keys: Sequence[KT],
+                            chunk_size: int = 200
+                            ) -> Iterator[Tuple[Sequence[KT], Sequence[npt.NDArray[DType]]]]:
+        results = itertools.starmap(matrix_tuple_to_vectors, self.get_matrix_chunked(keys, chunk_size))
+        yield from results # type: ignore
+
+    def get_vectors_zipped(self, keys: Sequence[KT], chunk_size: int = 200) -> Iterator[Sequence[Tuple[KT, npt.NDArray[DType]]]]:
+        results = itertools.starmap(matrix_tuple_to_zipped, self.get_matrix_chunked(keys, chunk_size))
+        yield from results # type: ignore
+
+    def vectors_chunker(self, chunk_size: int = 200) -> Iterator[Sequence[Tuple[KT, npt.NDArray[DType]]]]:
+        results = itertools.starmap(matrix_tuple_to_zipped, self.matrices_chunker(chunk_size))
+        yield from results # type: ignore
@@ -19,6 +19,7 @@ from abc import ABC, abstractmethod
 
 from uuid import UUID, uuid4
 
+from ..utils.chunks import divide_iterable_in_lists
 from ..utils.func import filter_snd_none
 from ..utils.to_key import to_key
 
@@ -26,6 +27,7 @@ import itertools
 from typing import (
     Any,
     Dict,
+    FrozenSet,
     Generic,
     Iterable,
     Iterator,
@@ -97,6 +99,62 @@ class DataPoint(Instance[KT, DT, VT, RT], Generic[KT, DT, VT, RT]):
         )
 
 
+class SlottedDataPoint(Instance[KT, DT, VT, RT], Generic[KT, DT, VT, RT]):
+    """An in-memory instance that stores its attributes in ``__slots__``
+    instead of a per-instance ``__dict__``. Use this class (or
+    :class:`SlottedDataPointProvider`) for providers with many instances.
+    Unlike :class:`DataPoint`, no other attributes can be assigned to
+    its objects.
+    """
+
+    __slots__ = ("_identifier", "_data", "_vector", "_representation")
+
+    def __init__(
+        self,
+        identifier: KT,
+        data: DT,
+        vector: Optional[VT] = None,
+        representation: Optional[RT] = None,
+    ) -> None:
+        self._identifier = identifier
+        self._data = data
+        self._vector = vector
+        self._representation = data if representation is None else representation
+
+    @property
+    def data(self) -> DT:
+        return self._data
+
+    @property
+    def representation(self) -> RT:
+        return self._representation
+
+    @property
+    def identifier(self) -> KT:
+        return self._identifier
+
+    @identifier.setter
+    def identifier(self, value: KT) -> None:
+        self._identifier = value
+
+    @property
+    def vector(self) -> Optional[VT]:
+        return self._vector
+
+    @vector.setter
+    def vector(self, value: Optional[VT]) -> None:  # type: ignore
+        self._vector = value
+
+    @classmethod
+    def from_instance(cls, instance: Instance[KT, DT, VT, RT]):
+        return cls(
+            instance.identifier,
+            instance.data,
+            instance.vector,
+            instance.representation,
+        )
+
+
 class AbstractMemoryProvider(
     InstanceProvider[InstanceType, KT, DT, VT, RT],
     ABC,
@@ -106,6 +164,9 @@ class AbstractMemoryProvider(
     dictionary: Dict[KT, InstanceType]
     children: Dict[KT, Set[KT]]
     parents: Dict[KT, KT]
+    _unvectorized: Optional[Set[KT]] = None
+    """The keys of the instances that had no vector when they were last checked.
+    Computed on first use of :attr:`without_vector` and kept up to date afterwards."""
 
     def __init__(self, instances: Iterable[InstanceType]):
         self.dictionary = {
@@ -113,6 +174,7 @@ class AbstractMemoryProvider(
         }
         self.children = dict()
         self.parents = dict()
+        self._unvectorized = None
 
     def __iter__(self) -> Iterator[KT]:
         yield from self.dictionary.keys()
@@ -122,9 +184,16 @@ class AbstractMemoryProvider(
 
     def __setitem__(self, key: KT, value: InstanceType) -> None:
         self.dictionary[key] = value  # type: ignore
+        if self._unvectorized is not None:
+            if value.vector is None:
+                self._unvectorized.add(key)
+            else:
+                self._unvectorized.discard(key)
 
     def __delitem__(self, key: KT) -> None:
         del self.dictionary[key]
+        if self._unvectorized is not None:
+            self._unvectorized.discard(key)
 
     def __len__(self) -> int:
         return len(self.dictionary)
@@ -141,6 +210,74 @@ class AbstractMemoryProvider(
 
     def clear(self) -> None:
         self.dictionary = {}
+        self._unvectorized = None
+
+    def bulk_add_vectors(
+        self, keys: Sequence[KT], values: Sequence[VT]
+    ) -> None:
+        for key, vec in zip(keys, values):
+            self.dictionary[key].vector = vec
+        if self._unvectorized is not None:
+            self._unvectorized.difference_update(
+                key for key, vec in zip(keys, values) if vec is not None
+            )
+
+    @property
+    def without_vector(self) -> FrozenSet[KT]:
+        """The keys of the instances without a vector.
+
+        The set is computed with a full pass on first use. Afterwards, it is
+        maintained by :meth:`__setitem__`, :meth:`__delitem__` and
+        :meth:`bulk_add_vectors`; only the instances that had no vector are
+        checked again, so vectors that were assigned directly to
+        an instance are picked up as well. A vector that is removed by setting
+        ``instance.vector = None`` is only noticed after :meth:`reset_vector_index`.
+
+        Returns
+        -------
+        FrozenSet[KT]
+            The keys
+        """
+        if self._unvectorized is None:
+            self._unvectorized = {
+                key for key, ins in self.dictionary.items() if ins.vector is None
+            }
+        else:
+            self._unvectorized = {
+                key
+                for key in self._unvectorized
+                if key in self.dictionary and self.dictionary[key].vector is None
+            }
+        return frozenset(self._unvectorized)
+
+    @property
+    def with_vector(self) -> FrozenSet[KT]:
+        return frozenset(self.dictionary).difference(self.without_vector)
+
+    def reset_vector_index(self) -> None:
+        """Recompute :attr:`with_vector` and :attr:`without_vector` from
+        the instances on next use"""
+        self._unvectorized = None
+
+    def data_chunker_selector(
+        self, keys: Iterable[KT], batch_size: int = 200, keep_order: bool = True
+    ) -> Iterator[Sequence[Tuple[KT, DT]]]:
+        dictionary = self.dictionary
+        datapoints = (
+            (key, dictionary[key].data) for key in keys if key in dictionary
+        )
+        yield from divide_iterable_in_lists(datapoints, batch_size)
+
+    def vector_chunker_selector(
+        self, keys: Iterable[KT], batch_size: int = 200, keep_order: bool = True
+    ) -> Iterator[Sequence[Tuple[KT, VT]]]:
+        dictionary = self.dictionary
+        id_vecs = (
+            (key, dictionary[key].vector)
+            for key in keys
+            if key in dictionary and dictionary[key].vector is not None
+        )
+        yield from divide_iterable_in_lists(id_vecs, batch_size)  # type: ignore
 
     def bulk_get_vectors(
         self, keys: Sequence[KT]
@@ -207,6 +344,8 @@ class AbstractMemoryProvider(
             self.children[parent_key] = set()
             for child in children:
                 del self.dictionary[child]
+                if self._unvectorized is not None:
+                    self._unvectorized.discard(child)
 
     @staticmethod
     @abstractmethod
@@ -294,6 +433,49 @@ class DataPointProvider(
         return new_instance
 
 
+class SlottedDataPointProvider(
+    AbstractMemoryProvider[
+        SlottedDataPoint[Union[KT, UUID], DT, VT, RT], Union[KT, UUID], DT, VT, RT
+    ],
+    Generic[KT, DT, VT, RT],
+):
+    """A :class:`DataPointProvider` that stores its instances as
+    :class:`SlottedDataPoint` objects, which use less memory per instance.
+    The constructors :meth:`from_data`, :meth:`from_data_and_indices`
+    and :meth:`from_provider` build the compact instances directly.
+    """
+
+    @staticmethod
+    def construct(*args: Any, **kwargs: Any):
+        return SlottedDataPoint[Union[KT, UUID], DT, VT, RT](*args, **kwargs)
+
+    def create(self, *args: Any, **kwargs: Any):
+        new_key = uuid4()
+        new_instance = SlottedDataPoint[Union[KT, UUID], DT, VT, RT](
+            new_key, *args, **kwargs
+        )
+        self.add(new_instance)
+        return new_instance
+
+    @classmethod
+    def from_provider(
+        cls, provider: InstanceProvider[Any, KT, DT, VT, RT]
+    ) -> SlottedDataPointProvider[KT, DT, VT, RT]:
+        """Copy the instances of another provider to compact instances
+
+        Parameters
+        ----------
+        provider : InstanceProvider[Any, KT, DT, VT, RT]
+            The provider
+
+        Returns
+        -------
+        SlottedDataPointProvider[KT, DT, VT, RT]
+            A new provider with the same instances
+        """
+        return cls(map(SlottedDataPoint.from_instance, provider.values()))  # type: ignore
+
+
 class MemoryBucketProvider(
     AbstractBucketProvider[InstanceType, KT, DT, VT, RT],
     Generic[InstanceType, KT, DT, VT, RT],
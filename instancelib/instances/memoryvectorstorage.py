@@ -1,16 +1,22 @@
 from __future__ import annotations
 
 from ..utils.chunks import divide_iterable_in_lists
+from ..utils.func import filter_snd_none
+from ..utils.numpy import matrix_to_vector_list, rows_to_selector, stack_vectors
 from .vectorstorage import VectorStorage
 
 from ..typehints import KT, VT, MT
 
 import numpy as np
 import numpy.typing as npt
+import scipy.sparse as sp  # type: ignore
 
 from typing import (
     Any,
+    Dict,
     Generic,
+    List,
+    Optional,
     Sequence,
     MutableMapping,
     Callable,
@@ -34,6 +40,7 @@ class MemoryVectorStorage(VectorStorage[KT, VT, MT], Generic[KT, VT, MT]):
         self.to_matrix = to_matrix
         self.from_matrix = from_matrix
 
+    @property
     def writeable(self) -> bool:
         return True
 
@@ -184,3 +191,485 @@ class NumpyMemoryStorage(
     @classmethod
     def create(cls) -> NumpyMemoryStorage[KT]:
         return cls(dict())
+
+
+class DenseMemoryStorage(
+    VectorStorage[KT, npt.NDArray[Any], npt.NDArray[Any]], Generic[KT]
+):
+    """In-memory vector storage that keeps all vectors in one contiguous,
+    preallocated 2-D array. The array grows geometrically, so adding
+    vectors one batch at a time has an amortized constant cost per row.
+
+    Unlike :class:`NumpyMemoryStorage`, requesting a matrix does not stack
+    individual vectors: the rows are selected with a single fancy indexing
+    operation, or returned as a view if the rows are consecutive. Arrays
+    returned by this storage may therefore share memory with the storage;
+    copy them if they should survive later updates to the same keys.
+
+    Parameters
+    ----------
+    dim : Optional[int], optional
+        The dimension of the vectors, by default None (inferred from
+        the first vectors that are added)
+    dtype : Optional[npt.DTypeLike], optional
+        The data type of the vectors, by default None. If no data type is
+        given, it is inferred from the added vectors and promoted (with
+        :func:`numpy.result_type`) when later vectors need a wider type,
+        e.g. float vectors after integer vectors. A given data type is
+        fixed; added vectors are cast to it.
+    capacity : int, optional
+        The number of rows that are preallocated, by default 0
+    """
+
+    def __init__(
+        self,
+        dim: Optional[int] = None,
+        dtype: Optional[npt.DTypeLike] = None,
+        capacity: int = 0,
+    ) -> None:
+        self.dim = dim
+        self.dtype = None if dtype is None else np.dtype(dtype)
+        self.promote_dtype = dtype is None
+        self.rows: Dict[KT, int] = dict()
+        self.row_keys: List[KT] = list()
+        self._matrix: Optional[npt.NDArray[Any]] = None
+        if dim is not None and self.dtype is not None:
+            self._matrix = np.empty((capacity, dim), dtype=self.dtype)
+
+    @property
+    def writeable(self) -> bool:
+        return True
+
+    @property
+    def capacity(self) -> int:
+        """The number of rows that fit in the preallocated array"""
+        if self._matrix is None:
+            return 0
+        return self._matrix.shape[0]
+
+    @property
+    def matrix(self) -> npt.NDArray[Any]:
+        """A view on all stored vectors, in insertion order
+        (the keys are in :attr:`row_keys`)"""
+        if self._matrix is None:
+            return np.empty((0, self.dim or 0), dtype=self.dtype)
+        return self._matrix[: len(self.row_keys)]
+
+    def reserve(self, n_rows: int) -> None:
+        """Make sure that the array has room for at least `n_rows` rows.
+        If the array has to grow, its capacity is at least doubled.
+
+        Parameters
+        ----------
+        n_rows : int
+            The required number of rows
+        """
+        assert self.dim is not None and self.dtype is not None
+        if n_rows <= self.capacity:
+            return
+        new_capacity = max(n_rows, 2 * self.capacity, 1024)
+        new_matrix = np.empty((new_capacity, self.dim), dtype=self.dtype)
+        if self._matrix is not None:
+            n_filled = len(self.row_keys)
+            new_matrix[:n_filled] = self._matrix[:n_filled]
+        self._matrix = new_matrix
+
+    def _promote(self, dtype: np.dtype) -> None:
+        if dtype == self.dtype:
+            return
+        self.dtype = dtype
+        if self._matrix is not None:
+            self._matrix = self._matrix.astype(dtype)
+
+    def _rows(self, keys: Sequence[KT]) -> npt.NDArray[np.int64]:
+        return np.fromiter(
+            (self.rows[key] for key in keys), dtype=np.int64, count=len(keys)
+        )
+
+    def __getitem__(self, k: KT) -> npt.NDArray[Any]:
+        row = self.rows[k]
+        assert self._matrix is not None
+        return self._matrix[row]
+
+    def __setitem__(self, k: KT, value: npt.NDArray[Any]) -> None:
+        self.add_bulk_matrix([k], np.asarray(value).reshape((1, -1)))
+
+    def __delitem__(self, k: KT) -> None:
+        # Move the last row into the gap, so the filled rows stay contiguous
+        row = self.rows.pop(k)
+        last = len(self.row_keys) - 1
+        last_key = self.row_keys.pop()
+        if row != last:
+            assert self._matrix is not None
+            self._matrix[row] = self._matrix[last]
+            self.row_keys[row] = last_key
+            self.rows[last_key] = row
+
+    def __contains__(self, item: object) -> bool:
+        return item in self.rows
+
+    def __iter__(self) -> Iterator[KT]:
+        return iter(self.rows)
+
+    def __len__(self) -> int:
+        return len(self.row_keys)
+
+    def add_bulk_matrix(
+        self, input_keys: Sequence[KT], matrix: npt.NDArray[Any]
+    ) -> None:
+        """Store a matrix of vectors. Row `i` of `matrix` becomes the
+        vector of ``input_keys[i]``. Existing keys are overwritten in place,
+        new keys are appended with a single slice assignment.
+
+        Parameters
+        ----------
+        input_keys : Sequence[KT]
+            The keys of the rows
+        matrix : npt.NDArray[Any]
+            The vectors
+        """
+        matrix = np.asarray(matrix)
+        assert len(input_keys) == matrix.shape[0]
+        if not input_keys:
+            return
+        if self.dim is None:
+            self.dim = matrix.shape[1]
+        if self.dtype is None:
+            self.dtype = matrix.dtype
+        elif self.promote_dtype and matrix.dtype != self.dtype:
+            self._promote(np.result_type(self.dtype, matrix.dtype))
+        # If a key occurs multiple times, the last occurrence wins
+        positions = {key: pos for pos, key in enumerate(input_keys)}
+        new_keys = [key for key in positions if key not in self.rows]
+        if len(new_keys) < len(positions):
+            existing = [(self.rows[key], pos) for key, pos in positions.items()
+                        if key in self.rows]
+            rows, sources = map(list, zip(*existing))
+            assert self._matrix is not None
+            self._matrix[rows] = matrix[sources]
+        if not new_keys:
+            return
+        start = len(self.row_keys)
+        stop = start + len(new_keys)
+        self.reserve(stop)
+        assert self._matrix is not None
+        if len(new_keys) == len(input_keys):
+            self._matrix[start:stop] = matrix
+        else:
+            sources = [positions[key] for key in new_keys]
+            self._matrix[start:stop] = matrix[sources]
+        self.rows.update(zip(new_keys, range(start, stop)))
+        self.row_keys.extend(new_keys)
+
+    def add_bulk(
+        self, input_keys: Sequence[KT], input_values: Sequence[Optional[npt.NDArray[Any]]]
+    ) -> None:
+        keys, vectors = filter_snd_none(input_keys, input_values)  # type: ignore
+        if keys:
+            self.add_bulk_matrix(keys, np.vstack(vectors))
+
+    def get_matrix(
+        self, keys: Sequence[KT]
+    ) -> Tuple[Sequence[KT], npt.NDArray[Any]]:
+        """Return the matrix that contains the vectors of `keys`,
+        in the order of `keys`.
+
+        Parameters
+        ----------
+        keys : Sequence[KT]
+            A list of identifier keys
+
+        Returns
+        -------
+        Tuple[Sequence[KT], npt.NDArray[Any]]
+            The keys and the matrix. If the keys occupy consecutive rows,
+            the matrix is a view on the storage.
+
+        Raises
+        ------
+        KeyError
+            If one of the keys is not present
+        """
+        if not keys or self._matrix is None:
+            if keys:
+                raise KeyError(keys[0])
+            return keys, self.matrix[:0]
+        rows = self._rows(keys)
+        return keys, self._matrix[rows_to_selector(rows)]
+
+    def get_matrix_chunked(
+        self, keys: Sequence[KT], chunk_size: int
+    ) -> Iterator[Tuple[Sequence[KT], npt.NDArray[Any]]]:
+        for chunk in divide_iterable_in_lists(keys, chunk_size):
+            yield self.get_matrix(chunk)
+
+    def matrices_chunker(
+        self, chunk_size: int = 200
+    ) -> Iterator[Tuple[Sequence[KT], npt.NDArray[Any]]]:
+        matrix = self.matrix
+        row_keys = list(self.row_keys)
+        for start in range(0, len(row_keys), chunk_size):
+            stop = start + chunk_size
+            yield row_keys[start:stop], matrix[start:stop]
+
+    def get_vectors(
+        self, keys: Sequence[KT]
+    ) -> Tuple[Sequence[KT], Sequence[npt.NDArray[Any]]]:
+        ret_keys, matrix = self.get_matrix(keys)
+        return ret_keys, matrix_to_vector_list(matrix)
+
+    def get_vectors_chunked(
+        self, keys: Sequence[KT], chunk_size: int = 200
+    ) -> Iterator[Tuple[Sequence[KT], Sequence[npt.NDArray[Any]]]]:
+        for chunk in divide_iterable_in_lists(keys, chunk_size):
+            yield self.get_vectors(chunk)
+
+    def get_vectors_zipped(
+        self, keys: Sequence[KT], chunk_size: int = 200
+    ) -> Iterator[Sequence[Tuple[KT, npt.NDArray[Any]]]]:
+        for ret_keys, vectors in self.get_vectors_chunked(keys, chunk_size):
+            yield list(zip(ret_keys, vectors))
+
+    def __enter__(self) -> DenseMemoryStorage[KT]:
+        return self
+
+    def __exit__(self, type: Any, value: Any, traceback: Any) -> None:
+        pass
+
+    @classmethod
+    def create(
+        cls, dim: Optional[int] = None, dtype: Optional[npt.DTypeLike] = None
+    ) -> DenseMemoryStorage[KT]:
+        return cls(dim, dtype)
+
+    def reload(self) -> None:
+        """Memory storages do not have to be reloaded"""
+        pass
+
+
+class SparseMemoryStorage(VectorStorage[KT, Any, Any], Generic[KT]):
+    """In-memory vector storage for sparse vectors (for example, TF-IDF
+    vectors). All rows are kept in the three growable arrays of one CSR
+    matrix (`data`, `indices` and `indptr`), so no row is ever converted
+    to a dense vector.
+
+    Matrices are returned as :class:`scipy.sparse.csr_matrix` objects,
+    single vectors as 1 x `dim` CSR matrices. Because the number of nonzero
+    elements of a row may change, updating a key appends a new row; the
+    old row is skipped from then on and is reclaimed by :meth:`compact`.
+
+    Parameters
+    ----------
+    dim : Optional[int], optional
+        The number of columns, by default None (inferred from the first
+        vectors that are added)
+    dtype : npt.DTypeLike, optional
+        The data type of the nonzero elements, by default float64
+    """
+
+    def __init__(
+        self, dim: Optional[int] = None, dtype: npt.DTypeLike = np.float64
+    ) -> None:
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.rows: Dict[KT, int] = dict()
+        self.row_keys: List[KT] = list()
+        self._data: npt.NDArray[Any] = np.empty(0, dtype=self.dtype)
+        self._indices: npt.NDArray[np.int32] = np.empty(0, dtype=np.int32)
+        self._indptr: npt.NDArray[np.int64] = np.zeros(1, dtype=np.int64)
+        self._alive: npt.NDArray[np.bool_] = np.zeros(0, dtype=np.bool_)
+
+    @property
+    def writeable(self) -> bool:
+        return True
+
+    @property
+    def n_rows(self) -> int:
+        """The number of rows, including rows that have been replaced"""
+        return len(self.row_keys)
+
+    @property
+    def nnz(self) -> int:
+        """The number of stored elements, including those of replaced rows"""
+        return int(self._indptr[self.n_rows])
+
+    @property
+    def matrix(self) -> sp.csr_matrix:
+        """A CSR matrix that shares its arrays with this storage.
+        This matrix also contains rows that have been replaced.
+        """
+        n_rows, nnz = self.n_rows, self.nnz
+        return sp.csr_matrix(
+            (self._data[:nnz], self._indices[:nnz], self._indptr[: n_rows + 1]),
+            shape=(n_rows, self.dim or 0),
+            copy=False,
+        )
+
+    @staticmethod
+    def _grow(array: npt.NDArray[Any], size: int) -> npt.NDArray[Any]:
+        if size <= len(array):
+            return array
+        grown = np.empty(max(size, 2 * len(array), 1024), dtype=array.dtype)
+        grown[: len(array)] = array
+        return grown
+
+    def _append(self, keys: Sequence[KT], csr: sp.csr_matrix) -> None:
+        start_row, start_nnz = self.n_rows, self.nnz
+        stop_row, stop_nnz = start_row + csr.shape[0], start_nnz + csr.nnz
+        self._data = self._grow(self._data, stop_nnz)
+        self._indices = self._grow(self._indices, stop_nnz)
+        self._indptr = self._grow(self._indptr, stop_row + 1)
+        self._alive = self._grow(self._alive, stop_row)
+        self._data[start_nnz:stop_nnz] = csr.data
+        self._indices[start_nnz:stop_nnz] = csr.indices
+        self._indptr[start_row + 1 : stop_row + 1] = csr.indptr[1:] + start_nnz
+        self._alive[start_row:stop_row] = True
+        self.rows.update(zip(keys, range(start_row, stop_row)))
+        self.row_keys.extend(keys)
+
+    def _to_csr(self, matrix: Any) -> sp.csr_matrix:
+        csr = sp.csr_matrix(matrix if sp.issparse(matrix) else np.atleast_2d(matrix))
+        if self.dim is None:
+            self.dim = csr.shape[1]
+        elif csr.shape[1] != self.dim:
+            raise ValueError(
+                f"Expected vectors with {self.dim} columns, got {csr.shape[1]}")
+        return csr
+
+    def _rows(self, keys: Sequence[KT]) -> npt.NDArray[np.int64]:
+        return np.fromiter(
+            (self.rows[key] for key in keys), dtype=np.int64, count=len(keys)
+        )
+
+    def __getitem__(self, k: KT) -> sp.csr_matrix:
+        row = self.rows[k]
+        return self.matrix[row : row + 1]
+
+    def __setitem__(self, k: KT, value: Any) -> None:
+        self.add_bulk_matrix([k], value)
+
+    def __delitem__(self, k: KT) -> None:
+        row = self.rows.pop(k)
+        self._alive[row] = False
+
+    def __contains__(self, item: object) -> bool:
+        return item in self.rows
+
+    def __iter__(self) -> Iterator[KT]:
+        return iter(self.rows)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def add_bulk_matrix(self, input_keys: Sequence[KT], matrix: Any) -> None:
+        """Store a (sparse) matrix of vectors. Row `i` of `matrix` becomes
+        the vector of ``input_keys[i]``.
+
+        Parameters
+        ----------
+        input_keys : Sequence[KT]
+            The keys of the rows
+        matrix : Any
+            A sparse matrix or a dense array
+        """
+        if not input_keys:
+            return
+        csr = self._to_csr(matrix)
+        assert len(input_keys) == csr.shape[0]
+        # If a key occurs multiple times, the last occurrence wins
+        positions = {key: pos for pos, key in enumerate(input_keys)}
+        replaced = [self.rows[key] for key in positions if key in self.rows]
+        self._alive[replaced] = False
+        if len(positions) < len(input_keys):
+            keys = list(positions)
+            csr = csr[list(positions.values())]
+        else:
+            keys = list(input_keys)
+        self._append(keys, csr)
+
+    def add_bulk(self, input_keys: Sequence[KT], input_values: Sequence[Any]) -> None:
+        keys, vectors = filter_snd_none(input_keys, input_values)  # type: ignore
+        if keys:
+            self.add_bulk_matrix(keys, stack_vectors(vectors))
+
+    def compact(self) -> None:
+        """Remove the rows of keys that have been replaced or deleted"""
+        if self._alive[: self.n_rows].all():
+            return
+        live_rows = np.flatnonzero(self._alive[: self.n_rows])
+        keys = [self.row_keys[row] for row in live_rows]
+        compacted = self.matrix[live_rows]
+        self.rows = dict()
+        self.row_keys = list()
+        self._indptr[0] = 0
+        self._append(keys, compacted)
+
+    def get_matrix(self, keys: Sequence[KT]) -> Tuple[Sequence[KT], sp.csr_matrix]:
+        """Return the CSR matrix that contains the vectors of `keys`,
+        in the order of `keys`.
+
+        Parameters
+        ----------
+        keys : Sequence[KT]
+            A list of identifier keys
+
+        Returns
+        -------
+        Tuple[Sequence[KT], sp.csr_matrix]
+            The keys and the matrix
+
+        Raises
+        ------
+        KeyError
+            If one of the keys is not present
+        """
+        rows = self._rows(keys)
+        return keys, self.matrix[rows_to_selector(rows)]
+
+    def get_matrix_chunked(
+        self, keys: Sequence[KT], chunk_size: int
+    ) -> Iterator[Tuple[Sequence[KT], sp.csr_matrix]]:
+        for chunk in divide_iterable_in_lists(keys, chunk_size):
+            yield self.get_matrix(chunk)
+
+    def matrices_chunker(
+        self, chunk_size: int = 200
+    ) -> Iterator[Tuple[Sequence[KT], sp.csr_matrix]]:
+        matrix = self.matrix
+        live_rows = np.flatnonzero(self._alive[: self.n_rows])
+        for start in range(0, len(live_rows), chunk_size):
+            rows = live_rows[start : start + chunk_size]
+            keys = [self.row_keys[row] for row in rows]
+            yield keys, matrix[rows_to_selector(rows)]
+
+    def get_vectors(self, keys: Sequence[KT]) -> Tuple[Sequence[KT], Sequence[Any]]:
+        ret_keys, matrix = self.get_matrix(keys)
+        return ret_keys, matrix_to_vector_list(matrix)
+
+    def get_vectors_chunked(
+        self, keys: Sequence[KT], chunk_size: int = 200
+    ) -> Iterator[Tuple[Sequence[KT], Sequence[Any]]]:
+        for chunk in divide_iterable_in_lists(keys, chunk_size):
+            yield self.get_vectors(chunk)
+
+    def get_vectors_zipped(
+        self, keys: Sequence[KT], chunk_size: int = 200
+    ) -> Iterator[Sequence[Tuple[KT, Any]]]:
+        for ret_keys, vectors in self.get_vectors_chunked(keys, chunk_size):
+            yield list(zip(ret_keys, vectors))
+
+    def __enter__(self) -> SparseMemoryStorage[KT]:
+        return self
+
+    def __exit__(self, type: Any, value: Any, traceback: Any) -> None:
+        pass
+
+    @classmethod
+    def create(
+        cls, dim: Optional[int] = None, dtype: npt.DTypeLike = np.float64
+    ) -> SparseMemoryStorage[KT]:
+        return cls(dim, dtype)
+
+    def reload(self) -> None:
+        """Memory storages do not have to be reloaded"""
+        pass
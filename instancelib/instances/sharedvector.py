@@ -0,0 +1,422 @@
+# Copyright (C) 2021 The InstanceLib Authors. All Rights Reserved.
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+from __future__ import annotations
+
+import mmap
+import os
+import threading
+from io import UnsupportedOperation
+from multiprocessing import shared_memory
+from typing import (Any, Dict, Generic, Iterator, List, NamedTuple, Optional,
+                    Sequence, Tuple)
+
+import numpy as np
+import numpy.typing as npt
+
+from ..typehints import KT, DType
+from ..utils.chunks import divide_sequence
+from ..utils.func import filter_snd_none
+from ..utils.numpy import matrix_to_vector_list, rows_to_selector
+from .base import InstanceProvider
+from .keyindex import SortedKeyIndex
+from .vectorstorage import VectorStorage, ensure_writeable
+
+try:
+    import _posixshmem  # type: ignore
+except ImportError:  # Windows
+    _posixshmem = None
+
+
+class SharedMatrixHandle(NamedTuple):
+    """A picklable reference to a matrix in shared memory"""
+    name: str
+    shape: Tuple[int, ...]
+    dtype: str
+
+
+class _UntrackedSegment:
+    """A POSIX shared memory segment that is attached without registering
+    it with the resource tracker (like ``SharedMemory(name, track=False)``
+    on Python 3.13+). The tracker would unlink the segment when this process
+    exits, although the segment is owned by another process.
+
+    Parameters
+    ----------
+    name : str
+        The name of the segment (as in :attr:`SharedMemory.name`)
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        fd = _posixshmem.shm_open(f"/{name}", os.O_RDWR, mode=0o600)
+        try:
+            self.size = os.fstat(fd).st_size
+            self._mmap = mmap.mmap(fd, self.size)
+        finally:
+            os.close(fd)
+        self.buf = memoryview(self._mmap)
+
+    def close(self) -> None:
+        self.buf.release()
+        self._mmap.close()
+
+
+# The shared memory segments that this process has attached to, by name
+_ATTACHED: Dict[str, Tuple[Any, npt.NDArray[Any]]] = dict()
+_ATTACH_LOCK = threading.Lock()
+
+
+def _open_segment(name: str) -> Any:
+    try:
+        return shared_memory.SharedMemory(name=name, track=False) # type: ignore
+    except TypeError:
+        # Python < 3.13 has no track argument
+        pass
+    if _posixshmem is None:
+        # Windows segments are not registered with the resource tracker
+        return shared_memory.SharedMemory(name=name)
+    return _UntrackedSegment(name)
+
+
+def attach_matrix(handle: SharedMatrixHandle) -> npt.NDArray[Any]:
+    """Map a matrix in shared memory into this process without copying.
+    Every segment is attached only once per process.
+
+    Parameters
+    ----------
+    handle : SharedMatrixHandle
+        The reference to the matrix
+
+    Returns
+    -------
+    npt.NDArray[Any]
+        The matrix
+    """
+    with _ATTACH_LOCK:
+        if handle.name not in _ATTACHED:
+            segment = _open_segment(handle.name)
+            _ATTACHED[handle.name] = (segment, np.ndarray(
+                (segment.size // np.dtype(handle.dtype).itemsize,),
+                dtype=handle.dtype, buffer=segment.buf))
+        _, flat = _ATTACHED[handle.name]
+    n_values = int(np.prod(handle.shape))
+    return flat[:n_values].reshape(handle.shape)
+
+
+class SharedVector(np.ndarray):
+    """A row of a matrix in shared memory. When it is pickled, only a
+    reference to the row is stored; unpickling attaches to the shared memory.
+    Arrays derived from a :class:`SharedVector` are pickled normally.
+    """
+    _shared: Optional[Tuple[SharedMatrixHandle, int]] = None
+
+    def __array_finalize__(self, obj: Any) -> None:
+        self._shared = None
+
+    def __reduce__(self) -> Any:
+        if self._shared is None:
+            return np.asarray(self).__reduce__()
+        return (_attach_row, self._shared)
+
+
+def _shared_row(matrix: npt.NDArray[Any], handle: SharedMatrixHandle, row: int) -> SharedVector:
+    vector = matrix[row].view(SharedVector)
+    vector._shared = (handle, row)
+    return vector
+
+
+def _attach_row(handle: SharedMatrixHandle, row: int) -> SharedVector:
+    return _shared_row(attach_matrix(handle), handle, row)
+
+
+class SharedMemoryVectorStorage(VectorStorage[KT, npt.NDArray[DType], npt.NDArray[DType]], Generic[KT, DType]):
+    """A vector storage that keeps all vectors in one matrix in
+    :mod:`multiprocessing.shared_memory`.
+
+    Pickling the storage (for example, when it is sent to the workers of
+    a :class:`multiprocessing.Pool`) only stores a :class:`SharedMatrixHandle`
+    and the key index; the workers attach to the same memory without copying.
+    Single vectors are returned as :class:`SharedVector` objects, which are
+    pickled as references as well.
+
+    Only the process that created the storage can write to it. The storage
+    is append-only: vectors can be added and overwritten, but not deleted,
+    because workers and :class:`SharedVector` references address the
+    vectors by their row. If new keys do not fit in the allocated memory,
+    the matrix is moved to a new segment that is twice as large; workers
+    that attached earlier keep seeing the old data.
+    The old segments stay allocated until :meth:`close`, so vectors that were
+    handed out before the move (and pickled references to them) remain valid.
+    The creating process should call :meth:`close` when the workers are done,
+    which frees the shared memory.
+
+    Parameters
+    ----------
+    keys : Sequence[KT]
+        The keys of the rows of `matrix`
+    matrix : npt.NDArray[DType]
+        The vectors, which are copied to shared memory
+    capacity : int, optional
+        The number of rows to reserve, by default 0 (the number of rows in `matrix`)
+    """
+
+    def __init__(self, keys: Sequence[KT], matrix: npt.NDArray[DType], capacity: int = 0) -> None:
+        assert len(keys) == matrix.shape[0] and matrix.ndim == 2
+        self._owner = True
+        self._segment: Optional[shared_memory.SharedMemory] = None
+        # Segments that were replaced by a larger one, but may still be in use
+        self._retired: List[shared_memory.SharedMemory] = list()
+        self.index: SortedKeyIndex[KT] = SortedKeyIndex.from_keys(keys)
+        self._allocate(max(capacity, matrix.shape[0], 1), matrix.shape[1], matrix.dtype)
+        self._buffer[:matrix.shape[0]] = matrix
+
+    def _allocate(self, capacity: int, dim: int, dtype: Any) -> None:
+        dtype = np.dtype(dtype)
+        segment = shared_memory.SharedMemory(
+            create=True, size=max(capacity * dim * dtype.itemsize, 1))
+        buffer: npt.NDArray[Any] = np.ndarray((capacity, dim), dtype=dtype, buffer=segment.buf)
+        if self._segment is not None:
+            buffer[:len(self.index)] = self._buffer[:len(self.index)]
+            self._retired.append(self._segment)
+        self._segment = segment
+        self._buffer = buffer
+
+    @classmethod
+    def from_storage(cls, storage: VectorStorage[KT, Any, Any], chunk_size: int = 10000) -> SharedMemoryVectorStorage[KT, Any]:
+        """Copy the vectors of another storage (e.g., a
+        :class:`~instancelib.instances.memoryvectorstorage.MemoryVectorStorage`)
+        to shared memory
+
+        Parameters
+        ----------
+        storage : VectorStorage[KT, Any, Any]
+            The storage
+        chunk_size : int, optional
+            The number of vectors that are copied at once, by default 10000
+
+        Returns
+        -------
+        SharedMemoryVectorStorage[KT, Any]
+            A new storage in shared memory
+        """
+        shared: Optional[SharedMemoryVectorStorage[KT, Any]] = None
+        for keys, matrix in storage.matrices_chunker(chunk_size):
+            matrix = np.asarray(matrix)
+            if shared is None:
+                shared = cls(keys, matrix, capacity=len(storage))
+            else:
+                shared.add_bulk_matrix(keys, matrix)
+        if shared is None:
+            raise ValueError("The storage does not contain any vectors")
+        return shared
+
+    @property
+    def handle(self) -> SharedMatrixHandle:
+        """A picklable reference to the stored matrix
+
+        Returns
+        -------
+        SharedMatrixHandle
+            The reference
+        """
+        assert self._segment is not None
+        return SharedMatrixHandle(
+            self._segment.name, (len(self.index), self._buffer.shape[1]), self._buffer.dtype.str)
+
+    @property
+    def matrix(self) -> npt.NDArray[DType]:
+        """A view on the stored vectors (one row per key)"""
+        return self._buffer[:len(self.index)]
+
+    @property
+    def writeable(self) -> bool:
+        return self._owner
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {"handle": self.handle, "index": self.index}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        handle: SharedMatrixHandle = state["handle"]
+        self._owner = False
+        self._buffer = attach_matrix(handle)
+        self._segment = _ATTACHED[handle.name][0]
+        self._retired = list()
+        self.index = state["index"]
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, item: object) -> bool:
+        return item in self.index
+
+    def __iter__(self) -> Iterator[KT]:
+        yield from self.index
+
+    def __getitem__(self, k: KT) -> npt.NDArray[DType]:
+        row = int(self.index.rows([k])[0])
+        return _shared_row(self._buffer, self.handle, row)
+
+    @ensure_writeable
+    def __setitem__(self, k: KT, value: npt.NDArray[DType]) -> None:
+        self.add_bulk_matrix([k], np.asarray(value)[np.newaxis])
+
+    def __delitem__(self, v: KT) -> None:
+        raise UnsupportedOperation(
+            "SharedMemoryVectorStorage is append-only; vectors cannot be deleted, "
+            "because shared references address them by their row")
+
+    @ensure_writeable
+    def add_bulk_matrix(self, keys: Sequence[KT], matrix: npt.NDArray[DType]) -> None:
+        """Add or update vectors in bulk. The vectors of existing keys are
+        overwritten in place.
+
+        Parameters
+        ----------
+        keys : Sequence[KT]
+            The keys
+        matrix : npt.NDArray[DType]
+            The vectors, one row per key
+        """
+        assert len(keys) == matrix.shape[0]
+        found, rows = self.index.lookup(keys)
+        if found.any():
+            self._buffer[rows[found]] = matrix[found]
+        if found.all():
+            return
+        new_idxs = np.flatnonzero(~found)
+        new_keys = [keys[i] for i in new_idxs]
+        n_rows = len(self.index) + len(new_keys)
+        if n_rows > self._buffer.shape[0]:
+            self._allocate(max(n_rows, 2 * self._buffer.shape[0]),
+                           self._buffer.shape[1], self._buffer.dtype)
+        new_rows = self.index.append(new_keys)
+        self._buffer[new_rows[0]:new_rows[-1] + 1] = matrix[new_idxs]
+
+    @ensure_writeable
+    def add_bulk(self, input_keys: Sequence[KT], input_values: Sequence[Optional[npt.NDArray[DType]]]) -> None:
+        keys, values = filter_snd_none(input_keys, input_values) # type: ignore
+        if values:
+            self.add_bulk_matrix(keys, np.vstack(values)) # type: ignore
+
+    def _get_rows(self, rows: npt.NDArray[np.int64]) -> npt.NDArray[DType]:
+        return self._buffer[rows_to_selector(rows)]
+
+    def get_matrix(self, keys: Sequence[KT]) -> Tuple[Sequence[KT], npt.NDArray[DType]]:
+        found, rows = self.index.lookup(keys)
+        ret_keys = [key for key, present in zip(keys, found) if present]
+        return ret_keys, self._get_rows(rows[found])
+
+    def get_matrix_chunked(self, keys: Sequence[KT], chunk_size: int = 200) -> Iterator[Tuple[Sequence[KT], npt.NDArray[DType]]]:
+        for key_chunk in divide_sequence(keys, chunk_size):
+            ret_keys, matrix = self.get_matrix(key_chunk)
+            if ret_keys:
+                yield ret_keys, matrix
+
+    def get_vectors(self, keys: Sequence[KT]) -> Tuple[Sequence[KT], Sequence[npt.NDArray[DType]]]:
+        ret_keys, matrix = self.get_matrix(keys)
+        return ret_keys, matrix_to_vector_list(matrix)
+
+    def get_vectors_chunked(self, keys: Sequence[KT], chunk_size: int = 200) -> Iterator[Tuple[Sequence[KT], Sequence[npt.NDArray[DType]]]]:
+        for ret_keys, matrix in self.get_matrix_chunked(keys, chunk_size):
+            yield ret_keys, matrix_to_vector_list(matrix)
+
+    def get_vectors_zipped(self, keys: Sequence[KT], chunk_size: int = 200) -> Iterator[Sequence[Tuple[KT, npt.NDArray[DType]]]]:
+        for ret_keys, vectors in self.get_vectors_chunked(keys, chunk_size):
+            yield list(zip(ret_keys, vectors))
+
+    def matrices_chunker(self, chunk_size: int = 200) -> Iterator[Tuple[Sequence[KT], npt.NDArray[DType]]]:
+        for start in range(0, len(self.index), chunk_size):
+            rows = slice(start, min(start + chunk_size, len(self.index)))
+            yield self.index.keys_for_rows(rows), self._buffer[rows]
+
+    def vectors_chunker(self, chunk_size: int = 200) -> Iterator[Sequence[Tuple[KT, npt.NDArray[DType]]]]:
+        for keys, matrix in self.matrices_chunker(chunk_size):
+            yield list(zip(keys, matrix_to_vector_list(matrix)))
+
+    def __enter__(self) -> SharedMemoryVectorStorage[KT, DType]:
+        return self
+
+    def __exit__(self, type: Any, value: Any, traceback: Any) -> None:
+        self.close()
+
+    def reload(self) -> None:
+        pass
+
+    @staticmethod
+    def _free(segment: shared_memory.SharedMemory) -> None:
+        _ATTACHED.pop(segment.name, None)
+        try:
+            segment.close()
+        except BufferError:
+            # Views on the memory are still in use; the mapping is
+            # removed when these are garbage collected
+            pass
+        segment.unlink()
+
+    def _release(self) -> None:
+        if self._segment is None:
+            return
+        if self._owner:
+            for segment in [*self._retired, self._segment]:
+                self._free(segment)
+            self._retired = list()
+        self._segment = None
+
+    def close(self) -> None:
+        """Free the shared memory (in the creating process), including the
+        segments that were replaced when the storage grew. The memory
+        stays available to processes that are still attached to it
+        until they exit. In other processes, this method has no effect.
+        """
+        self._release()
+
+
+def share_vectors(provider: InstanceProvider[Any, KT, Any, Any, Any],
+                  chunk_size: int = 10000) -> SharedMemoryVectorStorage[KT, Any]:
+    """Move the vectors of the instances in `provider` to shared memory.
+    Every instance gets a :class:`SharedVector` that refers to its row in
+    the shared matrix, so pickling the instances (or the environment that
+    contains them) no longer copies the vectors.
+
+    Parameters
+    ----------
+    provider : InstanceProvider[Any, KT, Any, Any, Any]
+        A provider whose instances keep their vectors in memory
+    chunk_size : int, optional
+        The number of vectors that are copied at once, by default 10000
+
+    Returns
+    -------
+    SharedMemoryVectorStorage[KT, Any]
+        The storage that owns the shared memory. Keep a reference to it
+        while the instances are in use, and :meth:`~SharedMemoryVectorStorage.close`
+        it afterwards.
+    """
+    shared: Optional[SharedMemoryVectorStorage[KT, Any]] = None
+    for chunk in provider.vector_chunker(chunk_size):
+        keys: List[KT] = [key for key, _ in chunk]
+        matrix = np.vstack([vector for _, vector in chunk])
+        if shared is None:
+            shared = SharedMemoryVectorStorage(keys, matrix, capacity=len(provider))
+        else:
+            shared.add_bulk_matrix(keys, matrix)
+    if shared is None:
+        raise ValueError("The instances in the provider do not have vectors")
+    for keys, _ in shared.matrices_chunker(chunk_size):
+        for key in keys:
+            provider[key].vector = shared[key]
+    return shared
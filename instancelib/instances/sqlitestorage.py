@@ -0,0 +1,313 @@
+# Copyright (C) 2021 The InstanceLib Authors. All Rights Reserved.
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+from __future__ import annotations
+
+import itertools
+import json
+import sqlite3
+import threading
+from os import PathLike
+from typing import (Any, Dict, Generic, Iterable, Iterator, List, Mapping,
+                    MutableMapping, Optional, Sequence, Tuple, Union)
+
+from ..typehints import KT
+from ..utils.chunks import divide_iterable_in_lists, divide_sequence
+
+JSON_COLUMN = "_json"
+"""The column that stores the values that do not have a typed column"""
+
+COLUMN_TYPES = ("INTEGER", "REAL", "TEXT", "BLOB", "NUMERIC")
+KEY_TYPES = ("INTEGER", "TEXT")
+
+MAX_PARAMETERS = 500
+"""The maximum number of keys in one ``IN (...)`` clause"""
+
+_memory_ids = itertools.count()
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+class SQLiteTableStorage(MutableMapping[KT, MutableMapping[str, Any]], Generic[KT]):
+    """A `storage` for a :class:`~instancelib.instances.tablebacked.TableProvider`
+    that keeps the rows in an SQLite database, using only the standard
+    library :mod:`sqlite3` module.
+
+    Every row is stored as a record in one table. Columns that are listed in
+    `columns` get their own typed SQL column; all other values of a row are
+    stored together as JSON in the column ``_json``. Without `columns`,
+    the whole row is stored as JSON.
+
+    Rows are returned as new dictionaries, so changes to a returned row are
+    not stored until the row is written back. Writes with :meth:`schedule_update`
+    are buffered and written in one transaction when `batch_size` rows are
+    pending, on :meth:`flush`, or before the next read. Every thread uses
+    its own connection, which is reused for all operations of that thread.
+
+    Parameters
+    ----------
+    path : Union[str, PathLike[str]]
+        The database file. ``":memory:"`` creates a database in memory that
+        is shared by the connections of all threads.
+    table : str, optional
+        The name of the table, by default ``"instances"``
+    columns : Optional[Mapping[str, str]], optional
+        The typed columns and their SQLite types (``"INTEGER"``, ``"REAL"``,
+        ``"TEXT"``, ``"BLOB"`` or ``"NUMERIC"``), by default None
+        (store the rows as JSON)
+    key_type : str, optional
+        The SQLite type of the keys, ``"INTEGER"`` (default) or ``"TEXT"``
+    batch_size : int, optional
+        The number of pending updates that triggers a write, by default 500
+    """
+
+    def __init__(self,
+                 path: Union[str, "PathLike[str]"],
+                 table: str = "instances",
+                 columns: Optional[Mapping[str, str]] = None,
+                 key_type: str = "INTEGER",
+                 batch_size: int = 500,
+                 ) -> None:
+        assert key_type in KEY_TYPES
+        columns = dict() if columns is None else dict(columns)
+        assert all(ctype.upper() in COLUMN_TYPES for ctype in columns.values())
+        assert "id" not in columns and JSON_COLUMN not in columns
+        self.table = table
+        self.key_type = key_type
+        self.batch_size = batch_size
+        self._memory = str(path) == ":memory:"
+        self.path = (f"file:instancelib_{next(_memory_ids)}?mode=memory&cache=shared"
+                     if self._memory else str(path))
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = list()
+        self._lock = threading.RLock()
+        self._pending: Dict[KT, Mapping[str, Any]] = dict()
+        # Keeps a shared in-memory database alive while the storage exists
+        self._keepalive = self._connection
+        self._create_table(columns)
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, uri=self._memory,
+                                     check_same_thread=False)
+        if not self._memory:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    @property
+    def _connection(self) -> sqlite3.Connection:
+        connection: Optional[sqlite3.Connection] = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._connect()
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def _create_table(self, columns: Mapping[str, str]) -> None:
+        con = self._connection
+        typed = "".join(f", {_quote(name)} {ctype.upper()}" for name, ctype in columns.items())
+        with con:
+            con.execute(
+                f"CREATE TABLE IF NOT EXISTS {_quote(self.table)} "
+                f"(id {self.key_type} PRIMARY KEY{typed}, {JSON_COLUMN} TEXT)")
+        # Use the columns of an existing table
+        info = con.execute(f"PRAGMA table_info({_quote(self.table)})").fetchall()
+        self.columns: List[str] = [row[1] for row in info
+                                   if row[1] not in ("id", JSON_COLUMN)]
+        self._select = ", ".join(["id", *map(_quote, self.columns), JSON_COLUMN])
+        placeholders = ", ".join("?" * (len(self.columns) + 2))
+        self._upsert = (f"INSERT OR REPLACE INTO {_quote(self.table)} "
+                        f"({self._select}) VALUES ({placeholders})")
+
+    def _encode(self, key: KT, row: Mapping[str, Any]) -> Tuple[Any, ...]:
+        extra = {name: value for name, value in row.items() if name not in self.columns}
+        return (key, *(row.get(name) for name in self.columns),
+                json.dumps(extra) if extra else None)
+
+    def _decode(self, record: Sequence[Any]) -> Tuple[KT, Dict[str, Any]]:
+        row: Dict[str, Any] = dict(zip(self.columns, record[1:-1]))
+        if record[-1] is not None:
+            row.update(json.loads(record[-1]))
+        return record[0], row
+
+    def _query(self, sql: str, parameters: Sequence[Any] = ()) -> sqlite3.Cursor:
+        if self._pending:
+            self.flush()
+        return self._connection.execute(sql, parameters)
+
+    def __getitem__(self, key: KT) -> MutableMapping[str, Any]:
+        record = self._query(
+            f"SELECT {self._select} FROM {_quote(self.table)} WHERE id = ?", (key,)).fetchone()
+        if record is None:
+            raise KeyError(key)
+        return self._decode(record)[1]
+
+    def __setitem__(self, key: KT, row: Mapping[str, Any]) -> None:
+        self.set_bulk([(key, row)])
+
+    def __delitem__(self, key: KT) -> None:
+        if key not in self:
+            raise KeyError(key)
+        self.delete_bulk([key])
+
+    def __contains__(self, key: object) -> bool:
+        if key in self._pending:
+            return True
+        record = self._query(
+            f"SELECT 1 FROM {_quote(self.table)} WHERE id = ?", (key,)).fetchone()
+        return record is not None
+
+    def __len__(self) -> int:
+        return self._query(f"SELECT COUNT(*) FROM {_quote(self.table)}").fetchone()[0]
+
+    def __iter__(self) -> Iterator[KT]:
+        cursor = self._query(f"SELECT id FROM {_quote(self.table)} ORDER BY rowid")
+        while True:
+            records = cursor.fetchmany(self.batch_size)
+            if not records:
+                return
+            for (key,) in records:
+                yield key
+
+    def get_bulk(self, keys: Sequence[KT]) -> Dict[KT, MutableMapping[str, Any]]:
+        """Fetch the rows of `keys` with ``SELECT ... WHERE id IN (...)``
+        queries. Keys that are not present are left out.
+
+        Parameters
+        ----------
+        keys : Sequence[KT]
+            The keys
+
+        Returns
+        -------
+        Dict[KT, MutableMapping[str, Any]]
+            A dictionary from keys to rows
+        """
+        result: Dict[KT, MutableMapping[str, Any]] = dict()
+        for key_chunk in divide_sequence(list(keys), MAX_PARAMETERS):
+            placeholders = ", ".join("?" * len(key_chunk))
+            cursor = self._query(
+                f"SELECT {self._select} FROM {_quote(self.table)} WHERE id IN ({placeholders})",
+                key_chunk)
+            result.update(map(self._decode, cursor))
+        return result
+
+    def rows_chunker(self, batch_size: int = 200) -> Iterator[List[Tuple[KT, MutableMapping[str, Any]]]]:
+        """Iterate over all rows in storage order
+
+        Parameters
+        ----------
+        batch_size : int, optional
+            The number of rows per batch, by default 200
+
+        Yields
+        ------
+        List[Tuple[KT, MutableMapping[str, Any]]]
+            Batches of key and row pairs
+        """
+        cursor = self._query(
+            f"SELECT {self._select} FROM {_quote(self.table)} ORDER BY rowid")
+        while True:
+            records = cursor.fetchmany(batch_size)
+            if not records:
+                return
+            yield [self._decode(record) for record in records]
+
+    def set_bulk(self, items: Iterable[Tuple[KT, Mapping[str, Any]]]) -> None:
+        """Insert or replace many rows in one transaction
+
+        Parameters
+        ----------
+        items : Iterable[Tuple[KT, Mapping[str, Any]]]
+            Pairs of keys and rows
+        """
+        if self._pending:
+            self.flush()
+        con = self._connection
+        with con:
+            for chunk in divide_iterable_in_lists(items, self.batch_size):
+                con.executemany(self._upsert, [self._encode(key, row) for key, row in chunk])
+
+    def delete_bulk(self, keys: Iterable[KT]) -> None:
+        """Delete many rows in one transaction. Missing keys are ignored.
+
+        Parameters
+        ----------
+        keys : Iterable[KT]
+            The keys
+        """
+        if self._pending:
+            self.flush()
+        con = self._connection
+        with con:
+            con.executemany(f"DELETE FROM {_quote(self.table)} WHERE id = ?",
+                            [(key,) for key in keys])
+
+    def schedule_update(self, key: KT, row: Mapping[str, Any]) -> None:
+        """Buffer a write of `row`. Repeated updates of the same key are
+        coalesced into one write. The buffer is written in one transaction
+        when it contains `batch_size` rows, on :meth:`flush` and before
+        any read.
+
+        Parameters
+        ----------
+        key : KT
+            The key
+        row : Mapping[str, Any]
+            The row
+        """
+        with self._lock:
+            self._pending[key] = row
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write all buffered updates in one transaction
+        """
+        with self._lock:
+            pending, self._pending = self._pending, dict()
+        if pending:
+            con = self._connection
+            with con:
+                con.executemany(self._upsert,
+                                [self._encode(key, row) for key, row in pending.items()])
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pending.clear()
+        con = self._connection
+        with con:
+            con.execute(f"DELETE FROM {_quote(self.table)}")
+
+    def close(self) -> None:
+        """Write the buffered updates and close the connections of all threads
+        """
+        self.flush()
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    def __enter__(self) -> SQLiteTableStorage[KT]:
+        return self
+
+    def __exit__(self, type: Any, value: Any, traceback: Any) -> None:
+        self.close()
@@ -17,23 +17,47 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
-from typing import (Any, Callable, Generic, Iterable, Iterator, List, Mapping,
+from os import PathLike
+from typing import (Any, Callable, FrozenSet, Generic, Iterable, Iterator, List, Mapping,
                     MutableMapping, Optional, Sequence, Set, Tuple, TypeVar,
                     Union)
 
+from typing_extensions import Protocol, runtime_checkable
+
 from .combination import UpdateHookInstance
 
 from .extractors import ColumnExtractor, DataExtractor
-from .memoryvectorstorage import MemoryVectorStorage
+from .memoryvectorstorage import DenseMemoryStorage, MemoryVectorStorage
 
 from ..typehints import DT, KT, MT, RT, VT
 from .base import Instance, InstanceProvider, ROInstanceProvider
 from .vectorstorage import VectorStorage
 from .children import MemoryChildrenMixin
+from ..utils.chunks import divide_iterable_in_lists
 
 IT = TypeVar("IT", bound="UpdateHookInstance[Any, Any, Any, Any]")
 
 
+@runtime_checkable
+class BatchedTableStorage(Protocol[KT]):
+    """Optional interface for row storages that read and write in batches,
+    such as :class:`~instancelib.instances.sqlitestorage.SQLiteTableStorage`.
+    Table providers use these methods when the storage offers them and fall
+    back to plain mapping access otherwise.
+    """
+    def get_bulk(self, keys: Sequence[KT]) -> Mapping[KT, Mapping[str, Any]]:
+        ...
+
+    def rows_chunker(self, batch_size: int = 200) -> Iterator[Sequence[Tuple[KT, Mapping[str, Any]]]]:
+        ...
+
+    def schedule_update(self, key: KT, row: Mapping[str, Any]) -> None:
+        ...
+
+    def flush(self) -> None:
+        ...
+
+
 class RowInstance(Mapping[str, Any], Instance[KT, Mapping[str,Any], VT, Mapping[str, Any]], Generic[IT, KT, DT, VT, RT, MT]):
     
     def __init__(self,
@@ -149,6 +173,119 @@ class TableInstance(MutableMapping[str, Any],
             self._vector = value
             self.update_hook()
 
+class SlottedTableInstance(MutableMapping[str, Any], 
+                           UpdateHookInstance[KT, DT, VT, RT], 
+                           Generic[IT, KT, DT, VT, RT, MT]):
+    """A row of a :class:`TableProvider` that stores its attributes in
+    ``__slots__`` instead of a per-instance ``__dict__``.
+    Use ``table_instance_builder(slotted=True)`` to build these instances.
+    """
+    __slots__ = ("_identifier", "_data", "_vector", 
+                 "_data_extractor", "_repr_extractor", "_update_hook")
+
+    _data_extractor: DataExtractor[DT]
+    _repr_extractor: DataExtractor[RT]
+    
+    def __init__(self,
+                 identifier: KT,
+                 data: MutableMapping[str, Any],
+                 vector: Optional[VT] = None,
+                 data_extractor: DataExtractor[DT] = ColumnExtractor("data"),
+                 repr_extractor: DataExtractor[RT] = ColumnExtractor("data")
+                 ) -> None:
+
+        self._identifier = identifier
+        self._data = data
+        self._vector = vector
+        self._data_extractor = data_extractor
+        self._repr_extractor = repr_extractor
+        self._update_hook = None
+
+    def __getitem__(self, __k: str) -> Any:
+        return self._data[__k]
+
+    def __contains__(self, __o: object) -> bool:
+        return __o in self._data
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __setitem__(self, __k: str, __v: Any) -> None:
+        self._data[__k] = __v
+        self.update_hook()
+
+    def __delitem__(self, __v: str) -> None:
+        del self._data[__v]
+        self.update_hook()
+
+    def _safe_get(self, key: str) -> Optional[Any]:
+        if key in self:
+            return self[key]
+        return None
+    
+    @property
+    def identifier(self) -> KT:
+        return self._identifier
+
+    @property
+    def columns(self) -> Sequence[str]:
+        return list(self._data.keys())    
+
+    @property
+    def data(self) -> DT:
+        return self._data_extractor(self._data)
+    
+    @property
+    def representation(self) -> RT:
+        return self._repr_extractor(self._data)
+        
+    @property
+    def vector(self) -> Optional[VT]:
+        return self._vector # type: ignore
+    
+    @vector.setter
+    def vector(self, value: Optional[VT]) -> None:
+        if value is not None:
+            self._vector = value
+            self.update_hook()
+
+
+def table_instance_builder(data_column: str = "data",
+                           repr_column: Optional[str] = None,
+                           slotted: bool = False,
+                           ) -> Callable[[KT, Mapping[str, Any], Optional[VT]], UpdateHookInstance[KT, DT, VT, RT]]:
+    """Create a `builder` function for a :class:`TableProvider` or 
+    :class:`TableProviderRO`. The extractors are created once and shared
+    by all instances.
+
+    Parameters
+    ----------
+    data_column : str, optional
+        The column that contains the data, by default ``"data"``
+    repr_column : Optional[str], optional
+        The column that contains the representation, by default None
+        (the data column)
+    slotted : bool, optional
+        Build :class:`SlottedTableInstance` objects instead of 
+        :class:`TableInstance` objects, by default False
+
+    Returns
+    -------
+    Callable[[KT, Mapping[str, Any], Optional[VT]], UpdateHookInstance[KT, DT, VT, RT]]
+        A function that creates an instance from a key, a row and a vector
+    """
+    data_extractor = ColumnExtractor(data_column)
+    repr_extractor = data_extractor if repr_column is None else ColumnExtractor(repr_column)
+    instance_class = SlottedTableInstance if slotted else TableInstance
+    def builder(key: KT, data: Mapping[str, Any], vector: Optional[VT]) -> UpdateHookInstance[KT, DT, VT, RT]:
+        row = data if isinstance(data, MutableMapping) else dict(data)
+        return instance_class(key, row, vector, data_extractor, repr_extractor) # type: ignore
+    return builder
+
+
 class TableProviderRO(ROInstanceProvider[IT, KT, DT, VT, RT], Generic[IT,KT, DT, VT, RT, MT]):
     columns: Sequence[str]
     storage: Mapping[KT, Mapping[str, Any]]
@@ -178,18 +315,35 @@ class TableProviderRO(ROInstanceProvider[IT, KT, DT, VT, RT], Generic[IT,KT, DT,
             return self.vectors[key]
         return None
 
+    def _build(self, key: KT, data: Mapping[str, Any], vector: Optional[VT]) -> IT:
+        return self.builder(key, data, vector)
+
     def __getitem__(self, key: KT) -> IT:
         data = self.storage[key]
         vector = self._get_vector(key)
-        ins = self.builder(key, data, vector)
+        ins = self._build(key, data, vector)
         return ins
 
+    def _get_rows(self, keys: Sequence[KT]) -> Mapping[KT, Mapping[str, Any]]:
+        """Fetch the rows of `keys` that are present, in one batch if the storage supports it"""
+        if isinstance(self.storage, BatchedTableStorage):
+            return self.storage.get_bulk(keys)
+        return {key: self.storage[key] for key in keys if key in self.storage}
+
     def __len__(self) -> int:
         return len(self.storage)
 
     def __contains__(self, key: object) -> bool:
         return key in self.storage
 
+    @property
+    def with_vector(self) -> FrozenSet[KT]:
+        return frozenset(self.storage).intersection(self.vectors)
+
+    @property
+    def without_vector(self) -> FrozenSet[KT]:
+        return frozenset(self.storage).difference(self.vectors)
+
     @property
     def empty(self) -> bool:
         return not self.storage
@@ -203,8 +357,60 @@ class TableProviderRO(ROInstanceProvider[IT, KT, DT, VT, RT], Generic[IT,KT, DT,
     def bulk_get_vectors(self, keys: Sequence[KT]) -> Tuple[Sequence[KT], Sequence[VT]]:
         return self.vectors.get_vectors(keys)
 
-    def vector_chunker_selector(self, keys: Iterable[KT], batch_size: int = 200) -> Iterator[Sequence[Tuple[KT, VT]]]:
-        return self.vectors.get_vectors_zipped(list(keys), batch_size)
+    def data_chunker_selector(self, keys: Iterable[KT], batch_size: int = 200, keep_order: bool = True) -> Iterator[Sequence[Tuple[KT, DT]]]:
+        # Build the instances without their vectors; only the data is needed
+        if isinstance(self.storage, BatchedTableStorage):
+            for key_chunk in divide_iterable_in_lists(keys, batch_size):
+                rows = self.storage.get_bulk(key_chunk)
+                chunk = [(key, self.builder(key, rows[key], None).data) 
+                         for key in key_chunk if key in rows]
+                if chunk:
+                    yield chunk
+            return
+        datapoints = ((key, self.builder(key, self.storage[key], None).data) 
+                      for key in keys if key in self.storage)
+        yield from divide_iterable_in_lists(datapoints, batch_size)
+
+    def data_chunker(self, batch_size: int = 200) -> Iterator[Sequence[Tuple[KT, DT]]]:
+        if isinstance(self.storage, BatchedTableStorage):
+            for rows in self.storage.rows_chunker(batch_size):
+                yield [(key, self.builder(key, row, None).data) for key, row in rows]
+            return
+        yield from super().data_chunker(batch_size)
+
+    def instance_chunker_selector(self, keys: Iterable[KT], batch_size: int = 200) -> Iterator[Sequence[IT]]:
+        for key_chunk in divide_iterable_in_lists(keys, batch_size):
+            rows = self._get_rows(key_chunk)
+            vec_keys, vectors = self.vectors.get_vectors(
+                [key for key in key_chunk if key in rows and key in self.vectors])
+            vector_dict = dict(zip(vec_keys, vectors))
+            chunk = [self._build(key, rows[key], vector_dict.get(key)) 
+                     for key in key_chunk if key in rows]
+            if chunk:
+                yield chunk
+
+    def instance_chunker(self, batch_size: int = 200) -> Iterator[Sequence[IT]]:
+        if isinstance(self.storage, BatchedTableStorage):
+            for rows in self.storage.rows_chunker(batch_size):
+                vec_keys, vectors = self.vectors.get_vectors(
+                    [key for key, _ in rows if key in self.vectors])
+                vector_dict = dict(zip(vec_keys, vectors))
+                yield [self._build(key, row, vector_dict.get(key)) for key, row in rows]
+            return
+        yield from super().instance_chunker(batch_size)
+
+    def vector_chunker_selector(self, keys: Iterable[KT], batch_size: int = 200, keep_order: bool = True) -> Iterator[Sequence[Tuple[KT, VT]]]:
+        # Instances without a vector are skipped
+        present = [key for key in keys if key in self.vectors]
+        return self.vectors.select_vectors(present, batch_size, keep_order)
+
+    def matrix_chunker_selector(self, keys: Iterable[KT], batch_size: int = 200) -> Iterator[Tuple[Sequence[KT], MT]]:
+        # Read the matrices from the vector storage, so sparse storages stay sparse
+        present = [key for key in keys if key in self.vectors]
+        return self.vectors.get_matrix_chunked(present, batch_size)
+
+    def matrix_chunker(self, batch_size: int = 200) -> Iterator[Tuple[Sequence[KT], MT]]:
+        return self.matrix_chunker_selector(self.key_list, batch_size)
 
     def bulk_get_all(self) -> List[IT]:
         return list(self.get_all())
@@ -233,8 +439,47 @@ class TableProvider(MemoryChildrenMixin[IT, KT, DT, VT, RT],
         self.parents = parents
         self.builder = builder
 
-    def __getitem__(self, __k: KT) -> IT:
-        ins = super().__getitem__(__k)
+    @classmethod
+    def from_sqlite(cls,
+                    path: Union[str, "PathLike[str]"],
+                    vectors: Optional[VectorStorage[KT, VT, MT]] = None,
+                    builder: Optional[Callable[[KT, Mapping[str, Any], Optional[VT]], IT]] = None,
+                    table: str = "instances",
+                    columns: Optional[Mapping[str, str]] = None,
+                    key_type: str = "INTEGER",
+                    ) -> TableProvider[IT, KT, DT, VT, RT, MT]:
+        """Create a provider that stores its rows in an SQLite database.
+        See :class:`~instancelib.instances.sqlitestorage.SQLiteTableStorage`
+        for the storage options.
+
+        Parameters
+        ----------
+        path : Union[str, PathLike[str]]
+            The database file (created if it does not exist)
+        vectors : Optional[VectorStorage[KT, VT, MT]], optional
+            The vector storage, by default None (a new :class:`DenseMemoryStorage`)
+        builder : Optional[Callable[[KT, Mapping[str, Any], Optional[VT]], IT]], optional
+            The instance builder, by default None (:func:`table_instance_builder`)
+        table : str, optional
+            The table name, by default ``"instances"``
+        columns : Optional[Mapping[str, str]], optional
+            The typed columns and their SQLite types, by default None (JSON rows)
+        key_type : str, optional
+            The SQLite type of the keys, by default ``"INTEGER"``
+
+        Returns
+        -------
+        TableProvider[IT, KT, DT, VT, RT, MT]
+            The new provider
+        """
+        from .sqlitestorage import SQLiteTableStorage
+        storage = SQLiteTableStorage[KT](path, table, columns, key_type)
+        vectors = DenseMemoryStorage.create() if vectors is None else vectors
+        builder = table_instance_builder() if builder is None else builder
+        return cls(storage, storage.columns, vectors, builder, dict(), dict()) # type: ignore
+
+    def _build(self, key: KT, data: Mapping[str, Any], vector: Optional[VT]) -> IT:
+        ins = self.builder(key, data, vector) # type: ignore
         ins.register_hook(self._update)
         return ins
 
@@ -242,10 +487,24 @@ class TableProvider(MemoryChildrenMixin[IT, KT, DT, VT, RT],
         return ins.identifier, ins._data, ins.vector
 
     def _update(self, ins: IT) -> None:
-        raise NotImplementedError
+        assert isinstance(ins, (TableInstance, SlottedTableInstance))
+        key, data, vector = self._decompose(ins)
+        if isinstance(self.storage, BatchedTableStorage):
+            # Coalesce the updates of many instances into one transaction
+            self.storage.schedule_update(key, data)
+        else:
+            self.storage[key] = data # type: ignore
+        if vector is not None:
+            self.vectors[key] = vector
+
+    def flush(self) -> None:
+        """Write pending updates to the storage, if it buffers writes
+        """
+        if isinstance(self.storage, BatchedTableStorage):
+            self.storage.flush()
 
     def __setitem__(self, key: KT, value: IT) -> None:
-        assert isinstance(value, TableInstance)
+        assert isinstance(value, (TableInstance, SlottedTableInstance))
         idx, data, vector = self._decompose(value)
         assert idx == key, f"Identifier -- Key mismatch: {idx} != {key}"
         assert isinstance(data, MutableMapping)
@@ -255,6 +514,12 @@ class TableProvider(MemoryChildrenMixin[IT, KT, DT, VT, RT],
 
     def __delitem__(self, key: KT) -> None:
         del self.storage[key]
+
+    def bulk_add_vectors(self, keys: Sequence[KT], values: Sequence[VT]) -> None:
+        self.vectors.add_bulk(keys, values)
+
+    def bulk_add_matrix(self, keys: Sequence[KT], matrix: MT) -> None:
+        self.vectors.add_bulk_matrix(keys, matrix)
    
     def construct(*args: Any, **kwargs: Any) -> IT:
         raise NotImplementedError
@@ -22,11 +22,13 @@ from typing import Any, Generic, Optional, Sequence, Union
 from uuid import UUID, uuid4
 
 from ..typehints import KT, VT
-from .memory import AbstractMemoryProvider, DataPoint
+from .memory import AbstractMemoryProvider, DataPoint, SlottedDataPoint
 from .base import Instance
 
 
 class TextInstance(Instance[KT, str, VT, str], ABC, Generic[KT, VT]):
+    __slots__ = ()
+
     @property
     @abstractmethod
     def map_to_original(self) -> Optional[npt.NDArray[Any]]:
@@ -104,6 +106,86 @@ class MemoryTextInstance(
         self._tokenized = value
 
 
+class TextMetadata:
+    """The optional attributes of a :class:`SlottedTextInstance`
+    that are only set for some instances (e.g., after splitting a text)
+    """
+
+    __slots__ = ("tokenized", "map_to_original", "split_marker")
+
+    def __init__(
+        self,
+        tokenized: Optional[Sequence[str]] = None,
+        map_to_original: Optional[npt.NDArray[Any]] = None,
+        split_marker: Optional[Any] = None,
+    ) -> None:
+        self.tokenized = tokenized
+        self.map_to_original = map_to_original
+        self.split_marker = split_marker
+
+
+class SlottedTextInstance(
+    SlottedDataPoint[Union[KT, UUID], str, VT, str],
+    TextInstance[Union[KT, UUID], VT],
+    Generic[KT, VT],
+):
+    """A compact variant of :class:`MemoryTextInstance` that stores its
+    attributes in ``__slots__``. The attributes `tokenized`, `map_to_original`
+    and `split_marker` are kept in a separate :class:`TextMetadata` object
+    that is only allocated when one of them is set.
+    """
+
+    __slots__ = ("_metadata",)
+
+    def __init__(
+        self,
+        identifier: Union[KT, UUID],
+        data: str,
+        vector: Optional[VT],
+        representation: Optional[str] = None,
+        tokenized: Optional[Sequence[str]] = None,
+        map_to_original: Optional[npt.NDArray[Any]] = None,
+        split_marker: Optional[Any] = None,
+    ) -> None:
+        super().__init__(identifier, data, vector, representation)
+        self._metadata: Optional[TextMetadata] = None
+        if not (tokenized is None and map_to_original is None and split_marker is None):
+            self._metadata = TextMetadata(tokenized, map_to_original, split_marker)
+
+    @property
+    def metadata(self) -> TextMetadata:
+        if self._metadata is None:
+            self._metadata = TextMetadata()
+        return self._metadata
+
+    @property
+    def map_to_original(self) -> Optional[npt.NDArray[Any]]:
+        return None if self._metadata is None else self._metadata.map_to_original
+
+    @map_to_original.setter
+    def map_to_original(self, value: Optional[npt.NDArray[Any]]) -> None:
+        if value is not None or self._metadata is not None:
+            self.metadata.map_to_original = value
+
+    @property
+    def split_marker(self) -> Optional[Any]:
+        return None if self._metadata is None else self._metadata.split_marker
+
+    @split_marker.setter
+    def split_marker(self, value: Any):
+        if value is not None or self._metadata is not None:
+            self.metadata.split_marker = value
+
+    @property
+    def tokenized(self) -> Optional[Sequence[str]]:
+        return None if self._metadata is None else self._metadata.tokenized
+
+    @tokenized.setter
+    def tokenized(self, value: Sequence[str]) -> None:
+        if value is not None or self._metadata is not None:
+            self.metadata.tokenized = value
+
+
 class TextInstanceProvider(
     AbstractMemoryProvider[
         MemoryTextInstance[KT, VT], Union[KT, UUID], str, VT, str
@@ -119,3 +201,24 @@ class TextInstanceProvider(
     @staticmethod
     def construct(*args: Any, **kwargs: Any) -> MemoryTextInstance[KT, VT]:
         return MemoryTextInstance[KT, VT](*args, **kwargs)
+
+
+class SlottedTextInstanceProvider(
+    AbstractMemoryProvider[
+        SlottedTextInstance[KT, VT], Union[KT, UUID], str, VT, str
+    ],
+    Generic[KT, VT],
+):
+    """A :class:`TextInstanceProvider` that stores its instances as
+    :class:`SlottedTextInstance` objects, which use less memory per instance
+    """
+
+    def create(self, *args: Any, **kwargs: Any):
+        new_key = uuid4()
+        new_instance = SlottedTextInstance[KT, VT](new_key, *args, **kwargs)
+        self.add(new_instance)
+        return new_instance
+
+    @staticmethod
+    def construct(*args: Any, **kwargs: Any) -> SlottedTextInstance[KT, VT]:
+        return SlottedTextInstance[KT, VT](*args, **kwargs)
@@ -18,11 +18,12 @@ from __future__ import annotations
 import functools
 from io import UnsupportedOperation
 from abc import abstractmethod
-from typing import (Any, Callable, Generic, Iterator, MutableMapping, Sequence,
-                    Tuple, TypeVar)
+from typing import (Any, Callable, Generic, Iterable, Iterator, MutableMapping,
+                    Sequence, Tuple, TypeVar)
 
 
 from ..typehints import KT, VT, MT
+from ..utils.chunks import divide_iterable_in_lists
 
 F = TypeVar("F", bound=Callable[..., Any])
 
@@ -113,6 +114,36 @@ class VectorStorage(MutableMapping[KT, VT], Generic[KT, VT, MT]):
     def get_vectors_zipped(self, keys: Sequence[KT], chunk_size: int = 200) -> Iterator[Sequence[Tuple[KT, VT]]]:
         raise NotImplementedError
 
+    def select_vectors(self, keys: Iterable[KT], chunk_size: int = 200, keep_order: bool = False) -> Iterator[Sequence[Tuple[KT, VT]]]:
+        """Return the vectors of `keys` in chunks of at most `chunk_size` key vector pairs.
+        Keys that are not in the storage are skipped.
+
+        Parameters
+        ----------
+        keys : Iterable[KT]
+            The requested keys
+        chunk_size : int, optional
+            The size of the chunks, by default 200
+        keep_order : bool, optional
+            Return the vectors in the order of `keys`. If False, the storage may
+            reorder the keys so that they can be read in storage order. By default False
+
+        Yields
+        -------
+        Sequence[Tuple[KT, VT]]
+            A list of key vector pairs
+        """
+        present = [key for key in keys if key in self]
+        if not keep_order:
+            yield from self.get_vectors_zipped(present, chunk_size)
+            return
+        for key_chunk in divide_iterable_in_lists(present, chunk_size):
+            ret_keys, vectors = self.get_vectors(key_chunk)
+            found = dict(zip(ret_keys, vectors))
+            pairs = [(key, found[key]) for key in key_chunk if key in found]
+            if pairs:
+                yield pairs
+
     @abstractmethod
     def __enter__(self) -> VectorStorage[KT, VT, MT]:
         raise NotImplementedError
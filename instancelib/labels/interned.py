@@ -0,0 +1,222 @@
+# Copyright (C) 2021 The InstanceLib Authors. All Rights Reserved.
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+from __future__ import annotations
+
+from typing import (Any, Dict, FrozenSet, Generic, Iterable, Iterator, List,
+                    Optional, Sequence, Union)
+
+import numpy as np
+import numpy.typing as npt
+
+from ..instances import Instance
+from ..instances.interning import KeyInterner
+from ..typehints import KT, LT
+from ..utils.to_key import to_key
+from .base import LabelProvider
+
+
+class InternedLabelProvider(LabelProvider[KT, LT], Generic[KT, LT]):
+    """A label provider that stores the labels as a boolean matrix
+    with a row for every key id of a :class:`~instancelib.instances.interning.KeyInterner`
+    and a column for every label. Queries like :meth:`get_instances_by_label`
+    and :meth:`document_count` are NumPy operations on a column, and the
+    ``*_ids`` methods return the ids without translating them to keys.
+
+    Parameters
+    ----------
+    labelset : Iterable[LT]
+        The labels
+    interner : Optional[KeyInterner[KT]], optional
+        The interner that assigns the ids, by default None (a new interner).
+        Pass the interner of the environment to share it.
+    """
+
+    def __init__(self, labelset: Iterable[LT], interner: Optional[KeyInterner[KT]] = None) -> None:
+        self.interner: KeyInterner[KT] = KeyInterner() if interner is None else interner
+        self._labels: List[LT] = list()
+        self._label_index: Dict[LT, int] = dict()
+        self._matrix: npt.NDArray[np.bool_] = np.zeros((0, 0), dtype=np.bool_)
+        self._present: npt.NDArray[np.bool_] = np.zeros(0, dtype=np.bool_)
+        self._n_present = 0
+        for label in labelset:
+            self._label_column(label)
+
+    @classmethod
+    def from_data(cls,
+                  labelset: Iterable[LT],
+                  indices: Sequence[KT],
+                  labels: Sequence[Iterable[LT]],
+                  interner: Optional[KeyInterner[KT]] = None,
+                  ) -> InternedLabelProvider[KT, LT]:
+        provider = cls(labelset, interner)
+        ids = provider.interner.intern(indices)
+        provider._reserve(len(provider.interner))
+        for key_id, labellist in zip(ids.tolist(), labels):
+            for label in labellist:
+                provider._matrix[key_id, provider._label_column(label)] = True
+        provider._present[ids] = True
+        provider._n_present = int(np.count_nonzero(provider._present))
+        return provider
+
+    @classmethod
+    def from_provider(cls,
+                      provider: LabelProvider[KT, LT],
+                      interner: Optional[KeyInterner[KT]] = None,
+                      ) -> InternedLabelProvider[KT, LT]:
+        keys = list(provider.keys())
+        return cls.from_data(provider.labelset, keys, [provider[key] for key in keys], interner)
+
+    def _reserve(self, n_ids: int) -> None:
+        if n_ids > self._matrix.shape[0]:
+            capacity = max(n_ids, 2 * self._matrix.shape[0], 1024)
+            matrix = np.zeros((capacity, self._matrix.shape[1]), dtype=np.bool_)
+            matrix[:self._matrix.shape[0]] = self._matrix
+            self._matrix = matrix
+            present = np.zeros(capacity, dtype=np.bool_)
+            present[:len(self._present)] = self._present
+            self._present = present
+
+    def _label_column(self, label: LT) -> int:
+        column = self._label_index.get(label)
+        if column is None:
+            column = len(self._labels)
+            self._labels.append(label)
+            self._label_index[label] = column
+            self._matrix = np.hstack(
+                [self._matrix, np.zeros((self._matrix.shape[0], 1), dtype=np.bool_)])
+        return column
+
+    def _id(self, instance: Union[KT, Instance[KT, Any, Any, Any]]) -> int:
+        found, ids = self.interner.lookup([to_key(instance)])
+        if not found[0] or ids[0] >= len(self._present) or not self._present[ids[0]]:
+            return -1
+        return int(ids[0])
+
+    def __iter__(self) -> Iterator[KT]:
+        yield from self.interner.keys(self.present_ids())
+
+    def __contains__(self, __o: object) -> bool:
+        return self._id(__o) >= 0 # type: ignore
+
+    def __len__(self) -> int:
+        return self._n_present
+
+    @property
+    def labelset(self) -> FrozenSet[LT]:
+        return frozenset(self._labels)
+
+    def present_ids(self) -> npt.NDArray[np.int64]:
+        """Return the ids of all keys that are stored in this provider
+
+        Returns
+        -------
+        npt.NDArray[np.int64]
+            The ids, in ascending order
+        """
+        return np.flatnonzero(self._present)
+
+    def remove_labels(self, instance: Union[KT, Instance[KT, Any, Any, Any]], *labels: LT):
+        key_id = self._id(instance)
+        if key_id < 0:
+            raise KeyError("Key {} is not found".format(to_key(instance)))
+        for label in labels:
+            if label in self._label_index:
+                self._matrix[key_id, self._label_index[label]] = False
+
+    def set_labels(self, instance: Union[KT, Instance[KT, Any, Any, Any]], *labels: LT):
+        key_id = self.interner.intern_key(to_key(instance))
+        self._reserve(key_id + 1)
+        if not self._present[key_id]:
+            self._present[key_id] = True
+            self._n_present += 1
+        for label in labels:
+            self._matrix[key_id, self._label_column(label)] = True
+
+    def set_labels_bulk(self, keys: Sequence[KT], *labels: LT) -> None:
+        """Add `labels` to all `keys` at once
+
+        Parameters
+        ----------
+        keys : Sequence[KT]
+            The keys
+        labels : LT
+            The labels
+        """
+        ids = self.interner.intern(keys)
+        self._reserve(len(self.interner))
+        columns = [self._label_column(label) for label in labels]
+        self._present[ids] = True
+        self._n_present = int(np.count_nonzero(self._present))
+        for column in columns:
+            self._matrix[ids, column] = True
+
+    def get_labels(self, instance: Union[KT, Instance[KT, Any, Any, Any]]) -> FrozenSet[LT]:
+        key_id = self._id(instance)
+        if key_id < 0:
+            return frozenset()
+        return frozenset(self._labels[column] for column in np.flatnonzero(self._matrix[key_id]))
+
+    def ids_by_label(self, label: LT) -> npt.NDArray[np.int64]:
+        """Return the ids of the keys that have `label`
+
+        Parameters
+        ----------
+        label : LT
+            The label
+
+        Returns
+        -------
+        npt.NDArray[np.int64]
+            The ids, in ascending order
+        """
+        if label not in self._label_index:
+            return np.zeros(0, dtype=np.int64)
+        return np.flatnonzero(self._matrix[:, self._label_index[label]])
+
+    def get_instances_by_label(self, label: LT) -> FrozenSet[KT]:
+        return frozenset(self.interner.keys(self.ids_by_label(label)))
+
+    def document_count(self, label: LT) -> int:
+        if label not in self._label_index:
+            return 0
+        return int(np.count_nonzero(self._matrix[:, self._label_index[label]]))
+
+    def label_matrix(self, keys: Sequence[KT]) -> npt.NDArray[np.bool_]:
+        """Return the labels of `keys` as a boolean matrix with the columns
+        in the order of :attr:`labels`
+
+        Parameters
+        ----------
+        keys : Sequence[KT]
+            The keys
+
+        Returns
+        -------
+        npt.NDArray[np.bool_]
+            A matrix of shape ``(len(keys), len(labels))``. Keys that are not
+            stored in this provider have no labels.
+        """
+        found, ids = self.interner.lookup(keys)
+        found &= ids < len(self._present)
+        result = np.zeros((len(keys), len(self._labels)), dtype=np.bool_)
+        result[found] = self._matrix[ids[found]]
+        return result
+
+    @property
+    def labels(self) -> Sequence[LT]:
+        """The labels in the order of the columns of :meth:`label_matrix`"""
+        return list(self._labels)
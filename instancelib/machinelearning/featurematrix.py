@@ -19,24 +19,48 @@ from __future__ import annotations
 
 from typing import Any, Generic, Iterator, Optional, Sequence
 
-import numpy as np
 import numpy.typing as npt
 
 from ..instances.base import InstanceProvider
 from ..typehints import KT
-from ..utils.chunks import divide_sequence
-from ..utils.func import filter_snd_none, list_unzip
+from ..utils.chunks import divide_sequence, prefetch
+from ..utils.func import filter_snd_none
+from ..utils.numpy import stack_vectors
 
 
 class FeatureMatrix(Generic[KT]):
+    """A feature matrix together with the keys of its rows. If the vectors
+    are sparse, :attr:`matrix` is a :class:`scipy.sparse.csr_matrix`.
+    """
     def __init__(
         self, keys: Sequence[KT], vectors: Sequence[Optional[npt.NDArray[Any]]]
     ):
         # Filter all rows with None as Vector
         filtered_keys, filtered_vecs = filter_snd_none(keys, vectors)  # type: ignore
-        self.matrix = np.vstack(filtered_vecs)
+        self.matrix = stack_vectors(filtered_vecs)
         self.indices: Sequence[KT] = filtered_keys
 
+    @classmethod
+    def from_matrix(cls, keys: Sequence[KT], matrix: Any) -> FeatureMatrix[KT]:
+        """Wrap a matrix that has already been stacked, without copying it
+
+        Parameters
+        ----------
+        keys : Sequence[KT]
+            The keys of the rows
+        matrix : Any
+            A dense array or a sparse matrix
+
+        Returns
+        -------
+        FeatureMatrix[KT]
+            The feature matrix
+        """
+        feature_matrix = cls.__new__(cls)
+        feature_matrix.matrix = matrix
+        feature_matrix.indices = keys
+        return feature_matrix
+
     def get_instance_id(self, row_idx: int) -> KT:
         return self.indices[row_idx]
 
@@ -56,8 +80,26 @@ class FeatureMatrix(Generic[KT]):
         cls,
         provider: InstanceProvider[Any, KT, Any, npt.NDArray[Any], Any],
         batch_size: int = 100,
+        prefetch_chunks: int = 0,
     ) -> Iterator[FeatureMatrix[KT]]:
-        for tuple_batch in provider.vector_chunker(batch_size):
-            keys, vectors = list_unzip(tuple_batch)
-            matrix = cls(keys, vectors)
-            yield matrix
+        """Yield the vectors of all instances in `provider` as feature matrices
+
+        Parameters
+        ----------
+        provider : InstanceProvider[Any, KT, Any, npt.NDArray[Any], Any]
+            The provider
+        batch_size : int, optional
+            The number of rows per matrix, by default 100
+        prefetch_chunks : int, optional
+            The number of matrices that are read and stacked ahead
+            on a background thread, by default 0 (no prefetching)
+
+        Yields
+        ------
+        FeatureMatrix[KT]
+            A feature matrix for each batch
+        """
+        def matrices() -> Iterator[FeatureMatrix[KT]]:
+            for keys, matrix in provider.matrix_chunker(batch_size):
+                yield cls.from_matrix(keys, matrix)
+        yield from prefetch(matrices(), prefetch_chunks)
@@ -40,6 +40,7 @@ from ..instances import Instance, InstanceProvider
 from ..labels.base import LabelProvider
 from ..typehints.typevars import KT, LT
 from ..utils.func import list_unzip, zip_chain
+from ..utils.numpy import stack_vectors
 from .featurematrix import FeatureMatrix
 from .sklearn import SkLearnClassifier
 
@@ -54,6 +55,10 @@ class SkLearnVectorClassifier(
     SkLearnClassifier[IT, KT, Any, npt.NDArray[Any], LT], Generic[IT, KT, LT]
 ):
     _name = "SklearnVector"
+    # The number of feature matrices that are read ahead on a background
+    # thread during prediction, so reading vectors overlaps with inference.
+    # Prefetching is opt-in (0 disables it)
+    prefetch_chunks: int = 0
 
     def encode_xy(
         self,
@@ -68,7 +73,7 @@ class SkLearnVectorClassifier(
                         yield ins.vector, encoded_label
 
         x_data, y_data = list_unzip(yield_xy())
-        x_fm = np.vstack(x_data)
+        x_fm = stack_vectors(x_data)
         y_lm = np.vstack(y_data)
         if y_lm.shape[1] == 1:
             y_lm = np.reshape(y_lm, (y_lm.shape[0],))
@@ -78,7 +83,7 @@ class SkLearnVectorClassifier(
         self, instances: Iterable[Instance[KT, Any, npt.NDArray[Any], Any]]
     ) -> npt.NDArray[Any]:
         x_data = [ins.vector for ins in instances if ins.vector is not None]
-        x_vec = np.vstack(x_data)
+        x_vec = stack_vectors(x_data)
         return x_vec
 
     def _get_preds(
@@ -133,7 +138,7 @@ class SkLearnVectorClassifier(
         batch_size: int = 200,
     ) -> Iterator[Tuple[Sequence[KT], npt.NDArray[Any]]]:
         matrices = FeatureMatrix[KT].generator_from_provider(
-            provider, batch_size
+            provider, batch_size, self.prefetch_chunks
         )
         total_it = ceil(len(provider) / batch_size)
         preds = map(
@@ -147,7 +152,7 @@ class SkLearnVectorClassifier(
         batch_size: int = 200,
     ) -> Sequence[Tuple[KT, FrozenSet[LT]]]:
         matrices = FeatureMatrix[KT].generator_from_provider(
-            provider, batch_size
+            provider, batch_size, self.prefetch_chunks
         )
         total_it = ceil(len(provider) / batch_size)
         preds = map(
@@ -164,14 +169,13 @@ class SkLearnVectorClassifier(
     ) -> None:
         LOGGER.info("[%s] Start with the fit procedure", self.name)
         # Collect the feature matrix for the labeled subset
-        key_vector_pairs = itertools.chain.from_iterable(
-            provider.vector_chunker(batch_size)
-        )
-        keys, vectors = list_unzip(key_vector_pairs)
-        if not vectors:
+        chunks = list(provider.matrix_chunker(batch_size))
+        if not chunks:
             raise NoVectorsException(
                 "There are no vectors available for training the classifier"
             )
+        keys = list(itertools.chain.from_iterable(keys for keys, _ in chunks))
+        x_mat = stack_vectors([matrix for _, matrix in chunks])
         LOGGER.info(
             "[%s] Gathered the feature matrix for all labeled documents",
             self.name,
@@ -181,14 +185,25 @@ class SkLearnVectorClassifier(
         labelings = list(map(labels.get_labels, keys))
         LOGGER.info("[%s] Gathered all labels", self.name)
         LOGGER.info("[%s] Start fitting the classifier", self.name)
-        self._fit_vectors(vectors, labelings)
+        self._fit_matrix(x_mat, labelings)
         LOGGER.info("[%s] Fitted the classifier", self.name)
 
+    def _fit_matrix(
+        self,
+        x_mat: Any,
+        labels: Sequence[FrozenSet[LT]],
+    ):
+        # Select the rows of the documents whose labels can be encoded
+        rows, y_mat = self._filter_x_only_encoded_y(range(x_mat.shape[0]), labels)
+        if len(rows) < x_mat.shape[0]:
+            x_mat = x_mat[list(rows)]
+        self._fit(x_mat, y_mat)
+
     def _fit_vectors(
         self,
         x_data: Sequence[npt.NDArray[Any]],
         labels: Sequence[FrozenSet[LT]],
     ):
         x_filtered, y_mat = self._filter_x_only_encoded_y(x_data, labels)
-        x_mat = np.vstack(x_filtered)  # type: ignore
+        x_mat = stack_vectors(x_filtered)
         self._fit(x_mat, y_mat)
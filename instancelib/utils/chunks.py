@@ -15,8 +15,10 @@
 # Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
 import itertools
+import queue
+import threading
 
-from typing import Optional, Tuple, TypeVar, Sequence, Iterator, Iterable
+from typing import Any, Optional, Tuple, TypeVar, Sequence, Iterator, Iterable
 from operator import itemgetter 
 
 _T = TypeVar("_T")
@@ -49,4 +51,74 @@ def get_range(iterable: Sequence[int]) -> Iterable[Tuple[int, Optional[int]]]:
             return min_int, None
         return min_int, max_int + 1
     map_result = map(minmax, get_consecutive(iterable))
-    yield from map_result
\ No newline at end of file
+    yield from map_result
+
+_END = object()
+
+
+def prefetch(iterable: Iterable[_T], buffer_size: int = 2) -> Iterator[_T]:
+    """Iterate over `iterable` while a background thread already produces
+    the next `buffer_size` elements. This lets reading the next chunk
+    from disk overlap with processing the current chunk.
+
+    The buffer is bounded: the background thread waits when the consumer
+    falls behind. Exceptions raised by `iterable` are raised again in the
+    consumer, and the background thread stops when the consumer stops
+    iterating early.
+
+    Parameters
+    ----------
+    iterable : Iterable[_T]
+        The source, for example a chunk generator
+    buffer_size : int, optional
+        The number of elements that are produced ahead, by default 2.
+        If 0, the elements are produced in the calling thread.
+
+    Yields
+    ------
+    _T
+        The elements of `iterable`, in the same order
+    """
+    if buffer_size <= 0:
+        yield from iterable
+        return
+    buffer: "queue.Queue[Tuple[bool, Any]]" = queue.Queue(maxsize=buffer_size)
+    stopped = threading.Event()
+
+    def put(is_error: bool, item: Any) -> bool:
+        while not stopped.is_set():
+            try:
+                buffer.put((is_error, item), timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce() -> None:
+        iterator = iter(iterable)
+        try:
+            for item in iterator:
+                if not put(False, item):
+                    break
+            else:
+                put(False, _END)
+        except BaseException as exc:  # pylint: disable=broad-except
+            put(True, exc)
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    thread = threading.Thread(target=produce, name="instancelib-prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            is_error, item = buffer.get()
+            if is_error:
+                raise item
+            if item is _END:
+                return
+            yield item
+    finally:
+        stopped.set()
+        thread.join()
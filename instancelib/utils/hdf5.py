@@ -0,0 +1,445 @@
+# Copyright (C) 2021 The InstanceLib Authors. All Rights Reserved.
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+from __future__ import annotations
+
+import os
+import threading
+from contextlib import contextmanager
+from os import PathLike
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+import h5py  # type: ignore
+import numpy as np
+import numpy.typing as npt
+from h5py._hl.dataset import Dataset  # type: ignore
+
+WRITE_MODES = ("a", "r+", "w", "w-", "x")
+TRUNCATING_MODES = ("w", "w-", "x")
+AUTO_CHUNKS = "auto"
+
+# Chunk size bounds (in bytes) for the automatic chunk layout
+MIN_CHUNK_BYTES = 2 ** 16
+MAX_CHUNK_BYTES = 2 ** 20
+
+# Handles that were inherited from a parent process. These are kept alive
+# so that the garbage collector does not close (and flush) them in the child.
+_INHERITED_HANDLES: List[HDF5Handle] = list()
+
+
+class HDF5Handle:
+    """An open HDF5 file together with the datasets that were
+    requested through it.
+
+    Parameters
+    ----------
+    file : h5py.File
+        The open file
+    swmr : bool, optional
+        The file is read in Single Writer Multiple Reader mode, by default False.
+        Datasets are then refreshed when they are first requested.
+    """
+
+    def __init__(self, file: h5py.File, swmr: bool = False) -> None:
+        self.file = file
+        self.swmr = swmr
+        self.generation = 0
+        self._datasets: Dict[str, Dataset] = dict()
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._datasets or name in self.file
+
+    def dataset(self, name: str) -> Dataset:
+        """Return the dataset `name`. The dataset object is cached,
+        so subsequent calls do not perform a lookup in the file.
+
+        Parameters
+        ----------
+        name : str
+            The name of the dataset
+
+        Returns
+        -------
+        Dataset
+            The dataset
+        """
+        if name not in self._datasets:
+            dataset = self.file[name]
+            assert isinstance(dataset, Dataset)
+            if self.swmr:
+                dataset.refresh()
+            self._datasets[name] = dataset
+        return self._datasets[name]
+
+    def refresh(self) -> None:
+        """Update the metadata (e.g., the shape) of the cached datasets 
+        with the changes that an SWMR writer has flushed
+        """
+        for dataset in self._datasets.values():
+            dataset.refresh()
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        """Forget cached dataset objects (for example, after a dataset
+        has been replaced)
+
+        Parameters
+        ----------
+        name : Optional[str], optional
+            The dataset that should be forgotten, by default None (all)
+        """
+        if name is None:
+            self._datasets.clear()
+        else:
+            self._datasets.pop(name, None)
+
+    def flush(self) -> None:
+        self.file.flush()
+
+    def close(self) -> None:
+        self._datasets.clear()
+        if self.file.id.valid:
+            self.file.close()
+
+
+class HDF5HandlePool:
+    """Hands out open HDF5 files for a single path.
+
+    If the pool is not `persistent`, every :meth:`acquire` opens the file and
+    closes it afterwards. In `persistent` (session) mode, the files stay open:
+    a writeable pool keeps one handle that is shared by all threads, a read-only
+    pool keeps up to `max_readers` handles that are lent to one thread at
+    the same time. After a fork, the handles of the parent process are left
+    untouched and the child opens its own.
+
+    With `swmr`, a writeable pool opens the file with the latest file format
+    (required for Single Writer Multiple Reader access) and a read-only pool
+    opens the file as an SWMR reader. Readers see the changes of the writer
+    after :meth:`refresh`.
+
+    Parameters
+    ----------
+    path : PathLike[str]
+        The path to the HDF5 file
+    mode : str
+        The file mode (see `h5py` documentation)
+    persistent : bool, optional
+        Keep the files open between calls, by default False
+    max_readers : int, optional
+        The maximum number of read handles in persistent mode, by default 4
+    swmr : bool, optional
+        Open the file for Single Writer Multiple Reader access, by default False
+    """
+
+    def __init__(
+        self,
+        path: "PathLike[str]",
+        mode: str,
+        persistent: bool = False,
+        max_readers: int = 4,
+        swmr: bool = False,
+        **file_kwargs: Any,
+    ) -> None:
+        assert max_readers > 0
+        self.path = path
+        self.mode = mode
+        self.persistent = persistent
+        self.max_readers = max_readers
+        self.swmr = swmr
+        self.file_kwargs = file_kwargs
+        self._truncated = False
+        self._generation = 0
+        self._reset()
+
+    def _reset(self) -> None:
+        self._pid = os.getpid()
+        self._condition = threading.Condition()
+        self._writer: Optional[HDF5Handle] = None
+        self._idle: List[HDF5Handle] = list()
+        # Lent read handles, and lent handles that should be closed on return
+        self._borrowed: Set[HDF5Handle] = set()
+        self._retired: Set[HDF5Handle] = set()
+        self._n_readers = 0
+
+    @property
+    def writeable(self) -> bool:
+        return self.mode in WRITE_MODES
+
+    @property
+    def _open_mode(self) -> str:
+        # A truncating mode should only truncate the first time the file is opened
+        if self.mode in TRUNCATING_MODES and self._truncated:
+            return "r+"
+        return self.mode
+
+    def _open(self) -> HDF5Handle:
+        file_kwargs = dict(self.file_kwargs)
+        if self.swmr and self.writeable:
+            file_kwargs["libver"] = "latest"
+        elif self.swmr:
+            file_kwargs["swmr"] = True
+        hfile = h5py.File(self.path, self._open_mode, **file_kwargs)
+        self._truncated = True
+        handle = HDF5Handle(hfile, self.swmr and not self.writeable)
+        handle.generation = self._generation
+        return handle
+
+    def _check_fork(self) -> None:
+        if self._pid != os.getpid():
+            _INHERITED_HANDLES.extend(self._idle)
+            if self._writer is not None:
+                _INHERITED_HANDLES.append(self._writer)
+            self._reset()
+
+    @contextmanager
+    def acquire(self) -> Iterator[HDF5Handle]:
+        """Lend an open handle. The handle should not be used
+        after leaving the context.
+
+        Yields
+        ------
+        HDF5Handle
+            An open handle
+        """
+        if not self.persistent:
+            handle = self._open()
+            try:
+                yield handle
+            finally:
+                handle.close()
+            return
+        self._check_fork()
+        if self.writeable:
+            with self._condition:
+                if self._writer is None:
+                    self._writer = self._open()
+                handle = self._writer
+            yield handle
+            return
+        handle = self._borrow()
+        try:
+            if handle.generation != self._generation:
+                handle.refresh()
+                handle.generation = self._generation
+            yield handle
+        finally:
+            self._return(handle)
+
+    def _borrow(self) -> HDF5Handle:
+        with self._condition:
+            while not self._idle and self._n_readers >= self.max_readers:
+                self._condition.wait()
+            if self._idle:
+                handle = self._idle.pop()
+                self._borrowed.add(handle)
+                return handle
+            self._n_readers += 1
+        try:
+            handle = self._open()
+        except BaseException:
+            with self._condition:
+                self._n_readers -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self._borrowed.add(handle)
+        return handle
+
+    def _return(self, handle: HDF5Handle) -> None:
+        with self._condition:
+            if handle in self._borrowed:
+                self._borrowed.remove(handle)
+                self._idle.append(handle)
+                self._condition.notify()
+                return
+            retired = handle in self._retired
+            if retired:
+                # The pool was closed while the handle was lent
+                self._retired.remove(handle)
+                self._n_readers -= 1
+                self._condition.notify()
+        if retired:
+            handle.close()
+        else:
+            # Lent before a fork; the handle belongs to the parent process
+            _INHERITED_HANDLES.append(handle)
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        """Forget cached dataset objects in all idle handles
+
+        Parameters
+        ----------
+        name : Optional[str], optional
+            The dataset that should be forgotten, by default None (all)
+        """
+        with self._condition:
+            handles = list(self._idle)
+            if self._writer is not None:
+                handles.append(self._writer)
+        for handle in handles:
+            handle.invalidate(name)
+
+    def refresh(self) -> None:
+        """Let all read handles pick up the changes that an SWMR writer
+        has flushed. Handles that are in use are refreshed when they 
+        are lent again.
+        """
+        with self._condition:
+            self._generation += 1
+
+    def flush(self) -> None:
+        """Flush the writer handle to disk (if there is one)"""
+        if self._writer is not None and self._pid == os.getpid():
+            self._writer.flush()
+
+    def close(self) -> None:
+        """Close all open handles. Read handles that are lent are
+        closed when they are returned. The pool can still be used afterwards;
+        new handles will be opened on demand.
+        """
+        self._check_fork()
+        with self._condition:
+            handles = list(self._idle)
+            if self._writer is not None:
+                handles.append(self._writer)
+            self._writer = None
+            self._idle = list()
+            # Lent handles still count towards max_readers until they are closed
+            self._retired.update(self._borrowed)
+            self._borrowed = set()
+            self._n_readers = len(self._retired)
+        for handle in handles:
+            handle.close()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = {
+            key: value
+            for key, value in self.__dict__.items()
+            if key not in ("_condition", "_writer", "_idle", "_borrowed",
+                           "_retired", "_n_readers", "_pid")
+        }
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._reset()
+
+
+def plan_reads(
+    rows: npt.NDArray[Any], max_gap: int = 0
+) -> Tuple[npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+    """Group sorted, unique row numbers into runs that can each be read
+    with a single slice. Two runs are merged if there are at most `max_gap`
+    unrequested rows between them; these rows are read and discarded, which
+    is usually cheaper than a separate read call.
+
+    Parameters
+    ----------
+    rows : npt.NDArray[Any]
+        Sorted and unique row numbers
+    max_gap : int, optional
+        The maximum number of unrequested rows between
+        two merged runs, by default 0
+
+    Returns
+    -------
+    Tuple[npt.NDArray[np.int64], npt.NDArray[np.int64]]
+        The start (inclusive) and stop (exclusive) row of every run
+    """
+    if len(rows) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    rows = np.asarray(rows, dtype=np.int64)
+    breaks = np.flatnonzero(np.diff(rows) > max_gap + 1) + 1
+    starts = rows[np.concatenate(([0], breaks))]
+    stops = rows[np.concatenate((breaks - 1, [len(rows) - 1]))] + 1
+    return starts, stops
+
+
+def read_rows(
+    dataset: Dataset, rows: npt.NDArray[Any], max_gap: int = 0
+) -> npt.NDArray[Any]:
+    """Read the given rows of a dataset. The rows are read in runs
+    (see :func:`plan_reads`) into one preallocated buffer with
+    :meth:`~h5py.Dataset.read_direct`.
+
+    Parameters
+    ----------
+    dataset : Dataset
+        The dataset
+    rows : npt.NDArray[Any]
+        The requested row numbers, in any order. Rows may occur more than once.
+    max_gap : int, optional
+        The maximum number of unrequested rows that may be read
+        to merge two runs, by default 0
+
+    Returns
+    -------
+    npt.NDArray[Any]
+        An array where row `i` contains row ``rows[i]`` of the dataset
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    unique_rows, inverse = np.unique(rows, return_inverse=True)
+    starts, stops = plan_reads(unique_rows, max_gap)
+    lengths = stops - starts
+    offsets = np.cumsum(lengths) - lengths
+    buffer = np.empty((int(lengths.sum()), *dataset.shape[1:]), dtype=dataset.dtype)
+    for start, stop, offset in zip(starts.tolist(), stops.tolist(), offsets.tolist()):
+        dataset.read_direct(
+            buffer, np.s_[start:stop], np.s_[offset:offset + stop - start])
+    if len(buffer) == len(unique_rows):
+        selected = buffer
+    else:
+        # Discard the rows that were only read to merge runs
+        run = np.searchsorted(starts, unique_rows, side="right") - 1
+        selected = buffer[offsets[run] + unique_rows - starts[run]]
+    if len(rows) == len(unique_rows) and np.array_equal(rows, unique_rows):
+        return selected
+    return selected[inverse.reshape(-1)]
+
+
+def auto_chunk_shape(
+    row_shape: Tuple[int, ...], itemsize: int, access_rows: int = 200
+) -> Tuple[int, ...]:
+    """Determine a row aligned chunk shape: every chunk contains complete rows,
+    and the number of rows per chunk is a multiple of `access_rows`
+    (or a divisor, for very wide rows), so that reading a batch of
+    `access_rows` consecutive rows touches as few chunks as possible.
+    Chunks are kept between 64 KiB and 1 MiB where possible.
+
+    Parameters
+    ----------
+    row_shape : Tuple[int, ...]
+        The shape of a single row (e.g., ``(dim,)``)
+    itemsize : int
+        The size of a single element in bytes
+    access_rows : int, optional
+        The typical number of rows that is read at once, by default 200
+
+    Returns
+    -------
+    Tuple[int, ...]
+        The chunk shape
+    """
+    row_bytes = max(int(np.prod(row_shape, dtype=np.int64)) * itemsize, 1)
+    access_bytes = access_rows * row_bytes
+    if access_bytes > MAX_CHUNK_BYTES:
+        # Split a batch in a whole number of chunks
+        n_parts = -(-access_bytes // MAX_CHUNK_BYTES)
+        rows = max(-(-access_rows // n_parts), 1)
+    elif access_bytes < MIN_CHUNK_BYTES:
+        rows = access_rows * (MIN_CHUNK_BYTES // access_bytes)
+    else:
+        rows = access_rows
+    return (rows, *row_shape)
@@ -16,12 +16,13 @@
 
 import functools
 import itertools
-from typing import Iterable, Optional, Sequence, Tuple, Union
+from typing import Any, Iterable, Optional, Sequence, Tuple, Union
 
 from h5py._hl.dataset import Dataset  # type: ignore
 
 import numpy as np
 import numpy.typing as npt
+import scipy.sparse as sp  # type: ignore
 
 from ..typehints import KT, DType
 
@@ -89,6 +90,27 @@ def slicer(
     return np.vstack(list(get_slices_2d()))  # type: ignore
 
 
+def rows_to_selector(rows: npt.NDArray[Any]) -> Union[slice, npt.NDArray[Any]]:
+    """Convert a row array to a slice if the rows are consecutive and
+    ascending. Indexing with a slice returns a view instead of a copy.
+
+    Parameters
+    ----------
+    rows : npt.NDArray[Any]
+        An array of row positions
+
+    Returns
+    -------
+    Union[slice, npt.NDArray[Any]]
+        A slice, or the original array if the rows are not consecutive
+    """
+    if len(rows) > 0:
+        start, stop = int(rows[0]), int(rows[-1]) + 1
+        if stop - start == len(rows) and (len(rows) == 1 or bool(np.all(np.diff(rows) == 1))):
+            return slice(start, stop)
+    return rows
+
+
 def memslicer(
     matrix: Union[Dataset, npt.NDArray[DType]],
     slices: Iterable[Tuple[int, Optional[int]]],
@@ -120,6 +142,11 @@ def memslicer(
 def matrix_to_vector_list(
     matrix: npt.NDArray[DType],
 ) -> Sequence[npt.NDArray[DType]]:
+    if sp.issparse(matrix):
+        # Every row of a sparse matrix becomes a 1 x n CSR matrix
+        csr = sp.csr_matrix(matrix)
+        return [csr[index:index + 1] for index in range(csr.shape[0])]
+
     def get_vector(index: int) -> npt.NDArray[DType]:
         return matrix[index, :]
 
@@ -141,6 +168,31 @@ def matrix_tuple_to_zipped(
     return result
 
 
+def stack_vectors(vectors: Sequence[Any]) -> Any:
+    """Stack a sequence of vectors into a matrix. If one of the vectors is a
+    :mod:`scipy.sparse` matrix, the result is a sparse CSR matrix, so sparse
+    vectors are never densified. Otherwise, the vectors are stacked with
+    :func:`numpy.vstack`.
+
+    Parameters
+    ----------
+    vectors : Sequence[Any]
+        The vectors (dense arrays or sparse row matrices)
+
+    Returns
+    -------
+    Any
+        A dense array or a :class:`scipy.sparse.csr_matrix`
+    """
+    if any(sp.issparse(vec) for vec in vectors):
+        blocks = [
+            vec if sp.issparse(vec) else sp.csr_matrix(np.atleast_2d(vec))
+            for vec in vectors
+        ]
+        return sp.csr_matrix(sp.vstack(blocks, format="csr"))
+    return np.vstack(vectors)
+
+
 def combiner(
     chunk_a: Tuple[Sequence[KT], npt.NDArray[DType]],
     chunk_b: Tuple[Sequence[KT], npt.NDArray[DType]],
@@ -148,7 +200,7 @@ def combiner(
     keys_a, mat_a = chunk_a
     keys_b, mat_b = chunk_b
     keys: Sequence[KT] = [*keys_a, *keys_b]
-    mat: npt.NDArray[DType] = np.vstack((mat_a, mat_b))  # type: ignore
+    mat: npt.NDArray[DType] = stack_vectors((mat_a, mat_b))
     return keys, mat
 
 
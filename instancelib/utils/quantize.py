@@ -0,0 +1,149 @@
+# Copyright (C) 2021 The InstanceLib Authors. All Rights Reserved.
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+from __future__ import annotations
+
+from typing import Any, NamedTuple, Optional, Tuple
+
+import numpy as np
+import numpy.typing as npt
+
+NO_QUANTIZATION = "none"
+FLOAT16 = "float16"
+INT8_ROW = "int8-row"
+INT8_DIM = "int8-dim"
+QUANTIZATIONS = (NO_QUANTIZATION, FLOAT16, INT8_ROW, INT8_DIM)
+
+_INT8_LEVELS = 255
+_INT8_SHIFT = 128
+
+
+class QuantizedMatrix(NamedTuple):
+    """A block of quantized vectors together with the parameters
+    needed to restore them.
+
+    For int8 quantization, a value is restored as
+    ``(codes + 128) * scale + offset``. The `scale` and `offset`
+    arrays have one element per row (per-row quantization) or
+    one element per dimension (per-dimension quantization).
+    """
+    codes: npt.NDArray[Any]
+    scale: Optional[npt.NDArray[np.float32]] = None
+    offset: Optional[npt.NDArray[np.float32]] = None
+    per_row: bool = False
+
+    def dequantize(self) -> npt.NDArray[np.float32]:
+        """Convert the codes back to a float32 matrix
+
+        Returns
+        -------
+        npt.NDArray[np.float32]
+            The (approximate) original matrix
+        """
+        if self.scale is None or self.offset is None:
+            return self.codes.astype(np.float32, copy=False)
+        return dequantize_int8(self.codes, self.scale, self.offset, self.per_row)
+
+
+def int8_params(
+    matrix: npt.NDArray[Any], axis: int
+) -> Tuple[npt.NDArray[np.float32], npt.NDArray[np.float32]]:
+    """Determine the int8 scale and offset of a matrix, either
+    per row (`axis` = 1) or per dimension (`axis` = 0)
+
+    Parameters
+    ----------
+    matrix : npt.NDArray[Any]
+        A matrix
+    axis : int
+        The axis along which the minimum and maximum are determined
+
+    Returns
+    -------
+    Tuple[npt.NDArray[np.float32], npt.NDArray[np.float32]]
+        The scale and the offset
+    """
+    low = matrix.min(axis=axis).astype(np.float32)
+    high = matrix.max(axis=axis).astype(np.float32)
+    scale = (high - low) / _INT8_LEVELS
+    # Constant rows (or dimensions) are restored exactly from the offset
+    scale[scale == 0] = 1.0
+    return scale, low
+
+
+def quantize_int8(
+    matrix: npt.NDArray[Any],
+    scale: npt.NDArray[np.float32],
+    offset: npt.NDArray[np.float32],
+    per_row: bool,
+) -> npt.NDArray[np.int8]:
+    """Quantize a matrix to int8 codes. Values outside the range that is
+    covered by `scale` and `offset` are clipped.
+
+    Parameters
+    ----------
+    matrix : npt.NDArray[Any]
+        The matrix
+    scale : npt.NDArray[np.float32]
+        The scale per row or per dimension
+    offset : npt.NDArray[np.float32]
+        The offset per row or per dimension
+    per_row : bool
+        True if `scale` and `offset` contain a value per row
+
+    Returns
+    -------
+    npt.NDArray[np.int8]
+        The codes
+    """
+    if per_row:
+        scale, offset = scale[:, np.newaxis], offset[:, np.newaxis]
+    levels = np.rint((matrix - offset) / scale)
+    np.clip(levels, 0, _INT8_LEVELS, out=levels)
+    return (levels - _INT8_SHIFT).astype(np.int8)
+
+
+def dequantize_int8(
+    codes: npt.NDArray[np.int8],
+    scale: npt.NDArray[np.float32],
+    offset: npt.NDArray[np.float32],
+    per_row: bool,
+) -> npt.NDArray[np.float32]:
+    """Convert int8 codes back to a float32 matrix
+
+    Parameters
+    ----------
+    codes : npt.NDArray[np.int8]
+        The codes
+    scale : npt.NDArray[np.float32]
+        The scale per row or per dimension
+    offset : npt.NDArray[np.float32]
+        The offset per row or per dimension
+    per_row : bool
+        True if `scale` and `offset` contain a value per row
+
+    Returns
+    -------
+    npt.NDArray[np.float32]
+        The restored matrix
+    """
+    if per_row:
+        scale, offset = scale[:, np.newaxis], offset[:, np.newaxis]
+    result = codes.astype(np.float32)
+    result += _INT8_SHIFT
+    result *= scale
+    result += offset
+    return result
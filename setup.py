@@ -55,5 +55,6 @@ setuptools.setup(  # type: ignore
     extras_require={
         "doc2vec": ["gensim"],
         "hdf5": ["tables"],
+        "arrow": ["pyarrow"],
     },
 )
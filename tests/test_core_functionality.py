@@ -41,6 +41,70 @@ def test_classification():
     assert performance["Bedrijfsnieuws"].f1 >= 0.75
 
 
+def test_sparse_classification():
+    import scipy.sparse as sp  # type: ignore
+
+    env = il.read_excel_dataset(DATASET_FILE, ["fulltext"], ["label"])
+    vect = il.TextInstanceVectorizer(
+        il.SklearnVectorizer(TfidfVectorizer(max_features=1000), sparse=True)
+    )
+    il.vectorize(vect, env)
+    assert sp.issparse(env.dataset[20].vector)
+    train, test = env.train_test_split(env.dataset, 0.70)
+    model = il.SkLearnVectorClassifier.build(MultinomialNB(), env)
+    model.fit_provider(train, env.labels)
+    performance = il.classifier_performance(model, test, env.labels)
+    assert performance["Games"].f1 >= 0.75
+
+
+def test_sparse_vector_storage_classification():
+    import scipy.sparse as sp  # type: ignore
+    from instancelib.instances.memoryvectorstorage import SparseMemoryStorage
+    from instancelib.instances.tablebacked import TableProvider, table_instance_builder
+    from instancelib.machinelearning.featurematrix import FeatureMatrix
+
+    source = il.read_excel_dataset(DATASET_FILE, ["fulltext"], ["label"])
+    rows = {ins.identifier: {"data": ins.data} for ins in source.dataset.values()}
+    vectors = SparseMemoryStorage[int]()
+    provider = TableProvider(rows, ["data"], vectors, table_instance_builder(), dict(), dict())
+    env = il.MemoryEnvironment(provider, source.labels)
+    vect = il.TextInstanceVectorizer(
+        il.SklearnVectorizer(TfidfVectorizer(max_features=1000), sparse=True)
+    )
+    il.vectorize(vect, env, chunk_size=50)
+    # The matrices are stored as a whole, not as one row per instance
+    assert len(vectors) == len(provider) and vectors.n_rows == len(provider)
+    matrices = list(FeatureMatrix.generator_from_provider(env.dataset, 50))
+    assert all(sp.isspmatrix_csr(fm.matrix) for fm in matrices)
+    train, test = env.train_test_split(env.dataset, 0.70)
+    model = il.SkLearnVectorClassifier.build(MultinomialNB(), env)
+    model.fit_provider(train, env.labels)
+    performance = il.classifier_performance(model, test, env.labels)
+    assert performance["Games"].f1 >= 0.75
+
+
+def test_dense_vector_storage_prediction():
+    from instancelib.instances.memoryvectorstorage import DenseMemoryStorage
+    from instancelib.instances.tablebacked import TableProvider, table_instance_builder
+
+    source = il.read_excel_dataset(DATASET_FILE, ["fulltext"], ["label"])
+    rows = {ins.identifier: {"data": ins.data} for ins in source.dataset.values()}
+    vectors = DenseMemoryStorage[int]()
+    provider = TableProvider(rows, ["data"], vectors, table_instance_builder(), dict(), dict())
+    env = il.MemoryEnvironment(provider, source.labels)
+    vect = il.TextInstanceVectorizer(
+        il.SklearnVectorizer(TfidfVectorizer(max_features=1000))
+    )
+    il.vectorize(vect, env, chunk_size=50)
+    assert vectors.matrix.shape == (len(provider), 1000)
+    train, test = env.train_test_split(env.dataset, 0.70)
+    model = il.SkLearnVectorClassifier.build(MultinomialNB(), env)
+    model.fit_provider(train, env.labels)
+    probas = list(model.predict_proba_provider_raw(test, 50))
+    assert sum(len(keys) for keys, _ in probas) == len(test)
+    assert all(matrix.shape == (len(keys), len(model.encoder.labelset)) for keys, matrix in probas)
+
+
 def test_build_from_model():
     env = il.read_excel_dataset(DATASET_FILE, ["fulltext"], ["label"])
     vect = il.TextInstanceVectorizer(
@@ -337,3 +401,290 @@ def test_vector_storage():
         assert len(frozenset(ret_keys).intersection(keys)) == 200
         assert ret_mat.shape == mat.shape
     os.unlink(file.name)
+
+
+def test_shared_vectors():
+    import pickle
+    env = il.read_excel_dataset(DATASET_FILE, ["fulltext"], ["label"])
+    vect = il.TextInstanceVectorizer(
+        il.SklearnVectorizer(TfidfVectorizer(max_features=1000))
+    )
+    il.vectorize(vect, env)
+    vector = env.dataset[20].vector.copy()
+    size_before = len(pickle.dumps(env))
+    shared = env.share_vectors()
+    assert len(shared) == len(env.dataset)
+    payload = pickle.dumps(env)
+    assert len(payload) < size_before - shared.matrix.nbytes / 2
+    copy = pickle.loads(payload)
+    assert (copy.dataset[20].vector == vector).all()
+    shared.close()
+
+
+def test_shared_vectors_grow():
+    import pickle
+    from io import UnsupportedOperation
+    from unittest import mock
+    import numpy as np
+    from multiprocessing import resource_tracker
+    from instancelib.instances import sharedvector
+
+    mat = np.arange(40, dtype=np.float64).reshape((10, 4))
+    shared = sharedvector.SharedMemoryVectorStorage(list(range(5)), mat[:5])
+    old_vector = shared[3]
+    old_handle = shared.handle
+    shared.add_bulk_matrix(list(range(5, 10)), mat[5:])
+    assert shared.handle.name != old_handle.name
+    # Vectors from before the move still refer to a live segment
+    with mock.patch.object(resource_tracker, "register") as register:
+        restored = pickle.loads(pickle.dumps(old_vector))
+        attached = sharedvector.attach_matrix(shared.handle)
+    register.assert_not_called()
+    assert np.array_equal(restored, mat[3]) and np.array_equal(attached, mat)
+    try:
+        del shared[3]
+        assert False
+    except UnsupportedOperation:
+        assert 3 in shared and len(shared) == 10
+    shared.close()
+
+
+def test_columnar_provider():
+    import numpy as np
+    from instancelib.instances.columnar import ColumnarProvider
+    env = il.read_excel_dataset(DATASET_FILE, ["fulltext"], ["label"])
+    vect = il.TextInstanceVectorizer(
+        il.SklearnVectorizer(TfidfVectorizer(max_features=1000))
+    )
+    il.vectorize(vect, env)
+    columnar = ColumnarProvider.from_provider(env.dataset, text_buffer=True)
+    assert len(columnar) == len(env.dataset)
+    assert columnar[20].data == env.dataset[20].data
+    assert np.allclose(columnar[20].vector, env.dataset[20].vector)
+    keys = list(columnar.key_list[:30])
+    ret_keys, vectors = columnar.bulk_get_vectors(keys)
+    assert list(ret_keys) == keys and vectors[0].shape == (1000,)
+    chunked = [key for chunk in columnar.data_chunker(100) for key, _ in chunk]
+    assert sorted(chunked) == sorted(env.dataset.key_list)
+    del columnar[20]
+    assert 20 not in columnar and len(columnar) == len(env.dataset) - 1
+    columnar[20] = env.dataset[20]
+    new = columnar.create(data="new text", vector=None)
+    assert columnar[new.identifier].data == "new text"
+    assert new.identifier in columnar.without_vector
+    assert len(columnar.with_vector) == len(env.dataset)
+    from instancelib.instances.memory import MemoryBucketProvider
+    bucket = MemoryBucketProvider(columnar, keys)
+    assert len(bucket) == 30 and bucket[keys[0]].data == columnar[keys[0]].data
+
+
+def test_slotted_instances():
+    import pickle
+    from instancelib.instances.text import SlottedTextInstanceProvider
+    from instancelib.instances.tablebacked import table_instance_builder
+    env = il.read_excel_dataset(DATASET_FILE, ["fulltext"], ["label"])
+    compact = SlottedTextInstanceProvider.from_data_and_indices(
+        env.dataset.key_list, [ins.data for ins in env.dataset.values()])
+    ins = compact[20]
+    assert not hasattr(ins, "__dict__")
+    assert ins.data == env.dataset[20].data and ins.tokenized is None
+    ins.tokenized = ins.data.split()
+    assert ins.tokenized == env.dataset[20].data.split()
+    copy = pickle.loads(pickle.dumps(compact))
+    assert copy[20].tokenized == ins.tokenized and copy[21]._metadata is None
+    row = table_instance_builder("text", slotted=True)(1, {"text": "hello"}, None)
+    assert row.data == "hello" and not hasattr(row, "__dict__")
+    assert hasattr(table_instance_builder("text")(1, {"text": "hello"}, None), "__dict__")
+
+
+# A DataPoint, a MemoryTextInstance and a TableInstance pickled by instancelib 0.5.2
+BASELINE_PICKLE = (
+    "gASV9AEAAAAAAABdlCiMHGluc3RhbmNlbGliLmluc3RhbmNlcy5tZW1vcnmUjAlEYXRhUG9pbnSUk5Qp"
+    "gZR9lCiMC19pZGVudGlmaWVylEsBjAVfZGF0YZSMAWGUjAdfdmVjdG9ylE6MD19yZXByZXNlbnRhdGlv"
+    "bpSMAnJhlHVijBppbnN0YW5jZWxpYi5pbnN0YW5jZXMudGV4dJSMEk1lbW9yeVRleHRJbnN0YW5jZZST"
+    "lCmBlH2UKGgGSwJoB4wDYiBjlGgJTmgKaBGMCl90b2tlbml6ZWSUXZQojAFilIwBY5RljBBfbWFwX3Rv"
+    "X29yaWdpbmFslE6MDV9zcGxpdF9tYXJrZXKUTnVijCFpbnN0YW5jZWxpYi5pbnN0YW5jZXMudGFibGVi"
+    "YWNrZWSUjA1UYWJsZUluc3RhbmNllJOUKYGUfZQoaAZLA2gHfZSMBGRhdGGUjAFklHNoCU6MD19kYXRh"
+    "X2V4dHJhY3RvcpSMIGluc3RhbmNlbGliLmluc3RhbmNlcy5leHRyYWN0b3JzlIwPQ29sdW1uRXh0cmFj"
+    "dG9ylJOUKYGUfZSMBmNvbHVtbpRoHnNijA9fcmVwcl9leHRyYWN0b3KUaCMpgZR9lGgmaB5zYowMX2Rl"
+    "bGV0ZV9ob29rlE6MDF91cGRhdGVfaG9va5ROdWJlLg=="
+)
+
+
+def test_baseline_pickles():
+    import base64
+    import pickle
+    point, text, row = pickle.loads(base64.b64decode(BASELINE_PICKLE))
+    assert (point.identifier, point.data, point.representation) == (1, "a", "ra")
+    assert text.data == "b c" and text.tokenized == ["b", "c"]
+    assert row.identifier == 3 and row.data == "d"
+
+
+def test_interned_labels():
+    import pickle
+    env = il.read_excel_dataset(DATASET_FILE, ["fulltext"], ["label"])
+    original = env.labels
+    interned = env.intern_labels()
+    assert env.labels is interned and interned.interner is env.interner
+    assert interned.labelset == original.labelset
+    for label in original.labelset:
+        assert interned.get_instances_by_label(label) == original.get_instances_by_label(label)
+    assert interned.get_labels(20) == original.get_labels(20)
+    new = env.dataset.create(data="new", vector=None)
+    interned.set_labels(new, "Games")
+    assert new.identifier in interned.get_instances_by_label("Games")
+    interned.remove_labels(new, "Games")
+    assert interned.get_labels(new) == frozenset() and new in interned
+    ids = env.interner.ids([20, 21])
+    assert env.interner.keys(ids) == [20, 21]
+    assert pickle.loads(pickle.dumps(env.interner)).keys(ids) == [20, 21]
+    assert interned.label_matrix([20]).sum() == len(original.get_labels(20))
+
+
+def test_bitmap_buckets():
+    from instancelib.environment.memory import MemoryEnvironment
+    from instancelib.instances.bitmap import BitmapBucketProvider
+    base = il.read_excel_dataset(DATASET_FILE, ["fulltext"], ["label"])
+    env = MemoryEnvironment(base.all_instances, base.labels, bitmap_buckets=True)
+    env.intern_labels()
+    train, test = env.train_test_split(env.dataset, 0.70)
+    assert isinstance(train, BitmapBucketProvider)
+    assert len(train) + len(test) == len(env.dataset)
+    assert not frozenset(train).intersection(test)
+    assert frozenset(env.combine(train, test)) == frozenset(env.dataset)
+    games = env.get_subset_by_labels(train, "Games")
+    assert frozenset(games) == frozenset(base.labels.get_instances_by_label("Games")).intersection(train)
+    key = next(iter(test))
+    train.add(env.dataset[key])
+    assert key in train and len(train & test) == 1
+    del train[key]
+    assert len(train - test) == len(train) and list(train) == sorted(train, key=list(env.interner).index)
+
+
+def test_vector_index():
+    import numpy as np
+    env = il.read_excel_dataset(DATASET_FILE, ["fulltext"], ["label"])
+    assert len(env.dataset.without_vector) == len(env.dataset)
+    vect = il.TextInstanceVectorizer(
+        il.SklearnVectorizer(TfidfVectorizer(max_features=1000))
+    )
+    il.vectorize(vect, env)
+    assert not env.dataset.without_vector
+    assert env.all_instances.with_vector == frozenset(env.all_instances)
+    new = env.create(data="new text", vector=None)
+    assert env.all_instances.without_vector == frozenset([new.identifier])
+    new.vector = np.zeros(1000)
+    assert not env.all_instances.without_vector
+    train, _ = env.train_test_split(env.dataset, 0.70)
+    other = env.create(data="other text", vector=None)
+    train.add(other)
+    assert train.without_vector == frozenset([other.identifier])
+    env.all_instances.bulk_add_vectors([other.identifier], [np.zeros(1000)])
+    assert not train.without_vector and other.identifier in train.with_vector
+
+
+def test_chunker_selectors():
+    from instancelib.instances.columnar import ColumnarProvider
+    env = il.read_excel_dataset(DATASET_FILE, ["fulltext"], ["label"])
+    vect = il.TextInstanceVectorizer(
+        il.SklearnVectorizer(TfidfVectorizer(max_features=1000))
+    )
+    il.vectorize(vect, env)
+    keys = [50, 3, 27, -1, 12, 40]
+    present = [k for k in keys if k != -1]
+    columnar = ColumnarProvider.from_provider(env.dataset)
+    for provider in (env.all_instances, env.dataset, columnar):
+        data = [k for chunk in provider.data_chunker_selector(keys, 2) for k, _ in chunk]
+        assert data == present
+        vectors = [k for chunk in provider.vector_chunker_selector(keys, 2) for k, _ in chunk]
+        assert vectors == present
+    unordered = [k for chunk in columnar.data_chunker_selector(keys, 2, keep_order=False)
+                 for k, _ in chunk]
+    assert unordered == sorted(present)
+
+
+def test_instance_cache():
+    from instancelib.instances.instancecache import InstanceCache
+    from instancelib.instances.memory import DataPoint
+    for policy in ("lru", "clock"):
+        cache = InstanceCache(max_entries=3, policy=policy, pinned={0})
+        for i in range(10):
+            cache[i] = DataPoint(i, str(i), None)
+            assert cache.get(0) is not None
+        assert len(cache) == 3 and 0 in cache and 9 in cache
+        assert cache.get(1) is None
+        stats = cache.stats()
+        assert stats["evictions"] == 7 and stats["hits"] == 10 and stats["misses"] == 1
+    cache = InstanceCache(max_entries=None, max_bytes=2000)
+    for i in range(20):
+        cache[i] = DataPoint(i, "x" * 100, None)
+    assert 0 < cache.nbytes <= 2000 and 19 in cache and 0 not in cache
+    cache.clear()
+    assert not cache and cache.nbytes == 0
+
+
+def test_readonly_provider():
+    import numpy as np
+    from instancelib.instances.dataset import PandasDataset, ReadOnlyProvider
+    df = pd.DataFrame({"text": [f"doc {i}" for i in range(1000)]})
+    provider = ReadOnlyProvider(PandasDataset(df, "text"),
+                                lambda key, data: il.DataPoint(key, data, None, data))
+    assert len(provider) == 1000 and provider.key_list[:3] == [0, 1, 2]
+    assert provider[7].data == "doc 7" and provider[7] is provider[7]
+    chunks = list(provider.data_chunker(300))
+    assert [len(chunk) for chunk in chunks] == [300, 300, 300, 100]
+    local = il.DataPoint(5000, "local", None)
+    provider[5000] = local
+    assert len(provider) == 1001 and provider[5000] is local
+    selected = [pair for chunk in provider.data_chunker_selector([5000, 3, -1], 2) for pair in chunk]
+    assert selected == [(5000, "local"), (3, "doc 3")]
+    del provider[5000]
+    assert 5000 not in provider and len(provider) == 1000
+    provider.configure_cache(max_entries=10)
+    provider.bulk_add_vectors(provider.key_list, np.arange(2000.0).reshape(-1, 2))
+    assert len(provider.with_vector) == 1000 and not provider.without_vector
+    assert np.allclose(provider[0].vector, [0, 1]) and np.allclose(provider[999].vector, [1998, 1999])
+    keys, vectors = provider.bulk_get_vectors([4, -1, 2])
+    assert list(keys) == [4, 2] and np.allclose(vectors[1], [4, 5])
+
+
+def test_sqlite_table_provider(tmp_path):
+    import threading
+    import numpy as np
+    from instancelib.instances.memoryvectorstorage import DenseMemoryStorage
+    from instancelib.instances.sqlitestorage import SQLiteTableStorage
+    from instancelib.instances.tablebacked import BatchedTableStorage, TableProvider
+    path = tmp_path / "instances.db"
+    provider = TableProvider.from_sqlite(path, columns={"data": "TEXT"})
+    storage = provider.storage
+    assert isinstance(storage, BatchedTableStorage)
+    assert not isinstance(dict(), BatchedTableStorage)
+    storage.set_bulk((i, {"data": f"doc {i}", "tags": ["a"]}) for i in range(1000))
+    assert len(provider) == 1000 and storage[3] == {"data": "doc 3", "tags": ["a"]}
+    ins = provider[5]
+    ins["label"] = "pos"
+    ins.vector = np.ones(3)
+    provider.flush()
+    with SQLiteTableStorage[int](path, columns={"data": "TEXT"}) as other:
+        assert len(other) == 1000 and other[5]["label"] == "pos"
+    assert isinstance(provider.vectors, DenseMemoryStorage)
+    assert storage[5]["label"] == "pos" and np.allclose(provider.vectors[5], 1)
+    ins["label"] = "neg"
+    assert provider[5]["label"] == "neg" and len(provider) == 1000
+    pairs = [pair for chunk in provider.data_chunker_selector([7, -1, 3], 2) for pair in chunk]
+    assert pairs == [(7, "doc 7"), (3, "doc 3")]
+    assert [len(chunk) for chunk in provider.data_chunker(300)] == [300, 300, 300, 100]
+    instances = [ins for chunk in provider.instance_chunker_selector([5, 9, 5000], 2) for ins in chunk]
+    assert [ins.identifier for ins in instances] == [5, 9] and instances[0].vector is not None
+    pairs = [pair for chunk in provider.vector_chunker_selector([4, 5, 6]) for pair in chunk]
+    assert [key for key, _ in pairs] == [5]
+    lengths = list()
+    threads = [threading.Thread(target=lambda: lengths.append(len(storage))) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert lengths == [1000] * 3
+    del provider[5]
+    assert 5 not in provider and len(provider) == 999
+    storage.close()
@@ -0,0 +1,26 @@
+import pytest
+
+from instancelib.utils.chunks import prefetch
+
+
+def test_prefetch():
+    assert list(prefetch(iter(range(100)), 3)) == list(range(100))
+
+    def failing():
+        yield 1
+        raise ValueError("read error")
+
+    with pytest.raises(ValueError):
+        list(prefetch(failing(), 2))
+    closed = []
+
+    def source():
+        try:
+            yield from range(1000)
+        finally:
+            closed.append(True)
+
+    gen = prefetch(source(), 2)
+    assert next(gen) == 0
+    gen.close()
+    assert closed == [True]
@@ -0,0 +1,472 @@
+import os
+import tempfile
+import uuid
+
+import numpy as np
+
+from instancelib.instances.hdf5vector import HDF5VectorStorage
+
+
+def test_hdf5_session():
+    file = tempfile.NamedTemporaryFile(delete=False)
+    file.close()
+    keys = [uuid.uuid4() for _ in range(300)]
+    gen = np.random.default_rng()
+    mat = gen.random((300, 20))
+    with HDF5VectorStorage[uuid.UUID, np.float64](file.name, "a", session=True) as h5a:  # type: ignore
+        h5a.add_bulk_matrix(keys[:100], mat[:100, :])
+        h5a.add_bulk_matrix(keys[100:], mat[100:, :])
+        assert np.allclose(h5a[keys[150]], mat[150, :])  # type: ignore
+    h5r = HDF5VectorStorage[uuid.UUID, np.float64](file.name, session=True)  # type: ignore
+    ret_keys, ret_mat = h5r.get_matrix(keys)
+    assert len(frozenset(ret_keys).intersection(keys)) == 300
+    assert ret_mat.shape == mat.shape
+    h5r.reopen("a")
+    h5r.add_bulk([uuid.uuid4()], [mat[0, :]])
+    h5r.close()
+    assert len(HDF5VectorStorage[uuid.UUID, np.float64](file.name)) == 301  # type: ignore
+    os.unlink(file.name)
+
+
+def test_hdf5_native_index():
+    file = tempfile.NamedTemporaryFile(delete=False)
+    file.close()
+    keys = [f"doc_{i}" for i in range(100)]
+    mat = np.arange(100 * 4, dtype=np.float64).reshape((100, 4))
+    with HDF5VectorStorage[str, np.float64](file.name, "a") as h5a:  # type: ignore
+        h5a.add_bulk_matrix(keys[:50], mat[:50, :])
+        h5a.add_bulk_matrix(keys[50:], mat[50:, :])
+    h5r = HDF5VectorStorage[str, np.float64](file.name)  # type: ignore
+    assert list(h5r) == keys
+    assert "doc_20" in h5r and "doc_100" not in h5r
+    ret_keys, ret_mat = h5r.get_matrix(["doc_90", "doc_100", "doc_3"])
+    assert sorted(ret_keys) == ["doc_3", "doc_90"]
+    for key, row in zip(ret_keys, ret_mat):
+        assert np.allclose(row, mat[keys.index(key), :])
+    os.unlink(file.name)
+    uuids = [uuid.uuid4() for _ in range(10)]
+    with HDF5VectorStorage[uuid.UUID, np.float64](file.name, "a") as h5a:  # type: ignore
+        h5a.add_bulk_matrix(uuids, mat[:10, :])
+        h5a.rebuild_index(uuid.UUID)
+        assert list(h5a) == uuids
+        h5a.rebuild_index()
+        assert list(h5a) == uuids and np.allclose(h5a[uuids[3]], mat[3, :])
+    os.unlink(file.name)
+
+
+def test_memmap_storage():
+    from instancelib.instances.memmapvector import MemmapVectorStorage
+
+    folder = tempfile.mkdtemp()
+    path = os.path.join(folder, "vectors.dat")
+    keys = [uuid.uuid4() for _ in range(500)]
+    mat = np.random.default_rng().random((500, 16)).astype(np.float32)
+    with MemmapVectorStorage[uuid.UUID, np.float32](path, "a") as mma:  # type: ignore
+        mma.add_bulk_matrix(keys[:200], mat[:200, :])
+        mma.add_bulk_matrix(keys[200:], mat[200:, :])
+    mmr = MemmapVectorStorage[uuid.UUID, np.float32](path)  # type: ignore
+    assert len(mmr) == 500
+    ret_keys, ret_mat = mmr.get_matrix(keys[100:300])
+    assert list(ret_keys) == keys[100:300]
+    assert isinstance(ret_mat, np.memmap)
+    assert np.allclose(ret_mat, mat[100:300, :])
+    ret_keys, ret_mat = mmr.get_matrix(keys[::-3])
+    assert list(ret_keys) == keys[::-3]
+    assert np.allclose(ret_mat, mat[::-3, :])
+    assert sum(len(chunk_keys) for chunk_keys, _ in mmr.matrices_chunker(64)) == 500
+    with MemmapVectorStorage[uuid.UUID, np.float32](path, "r+") as mmw:  # type: ignore
+        assert not mmw[keys[0]].flags.writeable
+        assert not mmw.get_matrix(keys[:10])[1].flags.writeable
+        del mmw[keys[0]]
+        mmw.delete_bulk(keys[10:20])
+        assert keys[0] not in mmw and len(mmw) == 489 and mmw.fragmentation == 11 / 500
+        assert list(mmw.get_matrix(keys[:12])[0]) == keys[1:10]
+        mmw[keys[15]] = mat[15, :]
+    mmr = MemmapVectorStorage[uuid.UUID, np.float32](path)  # type: ignore
+    assert len(mmr) == 490 and keys[15] in mmr and keys[0] not in mmr
+    assert sum(len(chunk_keys) for chunk_keys, _ in mmr.matrices_chunker(64)) == 490
+    with MemmapVectorStorage[uuid.UUID, np.float32](path, "r+") as mmw:  # type: ignore
+        mmw.compact()
+        assert mmw.n_rows == 490 and mmw.fragmentation == 0
+        assert np.allclose(mmw[keys[499]], mat[499, :])
+    mmr = MemmapVectorStorage[uuid.UUID, np.float32](path)  # type: ignore
+    assert list(mmr) == keys[1:10] + [keys[15]] + keys[20:]
+
+
+def test_key_index_mixed_keys():
+    import pytest
+    from instancelib.instances.keyindex import SortedKeyIndex
+
+    with pytest.raises(TypeError):
+        SortedKeyIndex.from_keys([1, "1"])
+    str_index = SortedKeyIndex[str].from_keys(["1", "2"])
+    assert "1" in str_index and 1 not in str_index
+    int_index = SortedKeyIndex[int].from_keys([1, 2])
+    assert 1 in int_index and "1" not in int_index
+    with pytest.raises(TypeError):
+        int_index.append(["3"])
+    with pytest.raises(TypeError):
+        str_index.append([3])
+    assert list(int_index.append([3])) == [2] and list(int_index) == [1, 2, 3]
+
+
+def test_dense_memory_storage():
+    from instancelib.instances.memoryvectorstorage import DenseMemoryStorage
+
+    keys = list(range(3000))
+    mat = np.random.default_rng().random((3000, 8))
+    storage = DenseMemoryStorage[int]()
+    storage.add_bulk_matrix(keys[:1000], mat[:1000, :])
+    storage.add_bulk(keys[1000:], list(mat[1000:, :]))
+    assert len(storage) == 3000 and storage.capacity >= 3000
+    ret_keys, ret_mat = storage.get_matrix(keys[500:1500])
+    assert np.shares_memory(ret_mat, storage.matrix)
+    assert np.allclose(ret_mat, mat[500:1500, :])
+    ret_keys, ret_mat = storage.get_matrix(keys[::-7])
+    assert np.allclose(ret_mat, mat[::-7, :])
+    storage[5] = mat[0, :]
+    del storage[0]
+    assert 0 not in storage and len(storage) == 2999
+    assert np.allclose(storage[5], mat[0, :])
+    assert np.allclose(storage[2999], mat[2999, :])
+    assert sum(len(chunk_keys) for chunk_keys, _ in storage.matrices_chunker(256)) == 2999
+    for keep_order in (True, False):
+        pairs = [pair for chunk in storage.select_vectors([7, 0, 5000, 3], 2, keep_order)
+                 for pair in chunk]
+        assert sorted(key for key, _ in pairs) == [3, 7]
+    # The inferred dtype is promoted, so float vectors after integer vectors are not truncated
+    promoted = DenseMemoryStorage[int]()
+    promoted.add_bulk_matrix([1, 2], np.ones((2, 3), dtype=np.int64))
+    promoted[3] = np.full(3, 0.5)
+    assert promoted.dtype == np.float64 and np.allclose(promoted[3], 0.5)
+    assert np.allclose(promoted.get_matrix([1, 2])[1], 1)
+    fixed = DenseMemoryStorage[int](dtype=np.float32)
+    fixed[1] = np.ones(3, dtype=np.float64)
+    assert fixed.matrix.dtype == np.float32
+
+
+def test_sparse_memory_storage():
+    import scipy.sparse as sp  # type: ignore
+    from instancelib.instances.memoryvectorstorage import SparseMemoryStorage
+
+    keys = [f"doc_{i}" for i in range(1000)]
+    mat = sp.random(1000, 500, density=0.02, format="csr", random_state=1)
+    storage = SparseMemoryStorage[str]()
+    storage.add_bulk_matrix(keys[:400], mat[:400])
+    storage.add_bulk(keys[400:], [mat[i:i + 1] for i in range(400, 1000)])
+    ret_keys, ret_mat = storage.get_matrix(keys[::-5])
+    assert sp.issparse(ret_mat)
+    assert (ret_mat != mat[::-5]).nnz == 0
+    storage["doc_3"] = mat[7]
+    del storage["doc_4"]
+    storage.compact()
+    assert len(storage) == 999 and storage.n_rows == 999
+    assert (storage["doc_3"] != mat[7]).nnz == 0
+    chunks = list(storage.matrices_chunker(128))
+    assert sum(chunk.shape[0] for _, chunk in chunks) == 999
+
+
+def test_hdf5_read_planner():
+    from instancelib.utils.hdf5 import plan_reads
+
+    starts, stops = plan_reads(np.array([1, 2, 3, 7, 8, 30]), max_gap=3)
+    assert starts.tolist() == [1, 30] and stops.tolist() == [9, 31]
+    file = tempfile.NamedTemporaryFile(delete=False)
+    file.close()
+    keys = list(range(1000))
+    mat = np.random.default_rng().random((1000, 6)).astype(np.float32)
+    with HDF5VectorStorage[int, np.float32](file.name, "a", max_read_gap=4) as h5a:  # type: ignore
+        h5a.add_bulk_matrix(keys, mat)
+    h5r = HDF5VectorStorage[int, np.float32](file.name)  # type: ignore
+    requested = [900, 3, 5, 4, 600, 3, 999]
+    ret_keys, ret_mat = h5r.get_matrix(requested, keep_order=True)
+    assert list(ret_keys) == requested
+    assert np.allclose(ret_mat, mat[requested, :])
+    ret_keys, ret_mat = h5r.get_matrix(requested)
+    assert list(ret_keys) == sorted(set(requested))
+    assert np.allclose(ret_mat, mat[sorted(set(requested)), :])
+    pairs = [pair for chunk in h5r.select_vectors(requested, 2, keep_order=True) for pair in chunk]
+    assert [key for key, _ in pairs] == requested and np.allclose(pairs[0][1], mat[900])
+    pairs = [pair for chunk in h5r.select_vectors(requested, 2) for pair in chunk]
+    assert [key for key, _ in pairs] == sorted(set(requested))
+    chunks = list(h5r.matrices_chunker(300))
+    assert np.allclose(np.vstack([chunk for _, chunk in chunks]), mat)
+    os.unlink(file.name)
+
+
+def test_hdf5_bulk_update():
+    file = tempfile.NamedTemporaryFile(delete=False)
+    file.close()
+    keys = list(range(500))
+    gen = np.random.default_rng()
+    mat = gen.random((500, 4)).astype(np.float32)
+    with HDF5VectorStorage[int, np.float32](file.name, "a") as h5a:  # type: ignore
+        h5a.add_bulk_matrix(keys, mat)
+        # Scattered update of existing keys together with new keys
+        updated = [7, 8, 9, 300, 3, 600]
+        new_vecs = gen.random((6, 4)).astype(np.float32)
+        h5a.add_bulk(updated, list(new_vecs))
+        mat[[7, 8, 9, 300, 3], :] = new_vecs[:5]
+        # Most rows change: the dataset is rewritten block by block
+        rewrite = keys[::-1][:400]
+        rewrite_vecs = gen.random((400, 4)).astype(np.float32)
+        h5a.add_bulk_matrix(rewrite, rewrite_vecs)
+        mat[rewrite, :] = rewrite_vecs
+    h5r = HDF5VectorStorage[int, np.float32](file.name)  # type: ignore
+    assert len(h5r) == 501
+    _, ret_mat = h5r.get_matrix(keys, keep_order=True)
+    assert np.allclose(ret_mat, mat)
+    assert np.allclose(h5r[600], new_vecs[5])
+    os.unlink(file.name)
+
+
+def test_hdf5_quantization():
+    gen = np.random.default_rng()
+    mat = gen.uniform(-1.0, 1.0, size=(300, 32)).astype(np.float32)
+    # The per-dimension range is calibrated on the first batch
+    mat[0, :], mat[1, :] = -1.0, 1.0
+    keys = list(range(300))
+    for quantization, tolerance in [("float16", 1e-2), ("int8-row", 5e-2), ("int8-dim", 5e-2)]:
+        file = tempfile.NamedTemporaryFile(delete=False)
+        file.close()
+        with HDF5VectorStorage[int, np.float32](file.name, "a", quantization=quantization) as h5a:  # type: ignore
+            h5a.add_bulk_matrix(keys[:200], mat[:200, :])
+            h5a.add_bulk(keys[150:], list(mat[150:, :]))
+        h5r = HDF5VectorStorage[int, np.float32](file.name)  # type: ignore
+        assert h5r.quantization == quantization
+        _, ret_mat = h5r.get_matrix(keys, keep_order=True)
+        assert ret_mat.dtype == np.float32
+        assert np.abs(ret_mat - mat).max() < tolerance * np.abs(mat).max()
+        _, raw = h5r.get_quantized_matrix(keys[:10])
+        assert raw.codes.dtype == (np.float16 if quantization == "float16" else np.int8)
+        os.unlink(file.name)
+
+
+def test_hdf5_layout_options():
+    import h5py  # type: ignore
+    from instancelib.utils.hdf5 import auto_chunk_shape
+
+    assert auto_chunk_shape((768,), 4, 200) == (200, 768)
+    assert auto_chunk_shape((4096,), 4, 200) == (50, 4096)
+    assert auto_chunk_shape((16,), 4, 200) == (1000, 16)
+    file = tempfile.NamedTemporaryFile(delete=False)
+    file.close()
+    mat = np.random.default_rng().random((500, 16)).astype(np.float32)
+    with HDF5VectorStorage[int, np.float32](  # type: ignore
+            file.name, "a", chunks="auto", compression="gzip",
+            compression_opts=4, shuffle=True, chunk_cache_size=2 ** 22) as h5a:
+        h5a.add_bulk_matrix(list(range(500)), mat)
+    with h5py.File(file.name, "r") as hfile:
+        vectors = hfile["vectors"]
+        assert vectors.chunks == (1000, 16)
+        assert vectors.compression == "gzip" and vectors.shuffle
+    _, ret_mat = HDF5VectorStorage[int, np.float32](file.name).get_matrix(list(range(500)))  # type: ignore
+    assert np.allclose(ret_mat, mat)
+    os.unlink(file.name)
+
+
+def test_hdf5_delete_compact():
+    file = tempfile.NamedTemporaryFile(delete=False)
+    file.close()
+    mat = np.random.default_rng().random((400, 8))
+    with HDF5VectorStorage[int, np.float64](file.name, "a", quantization="int8-row") as h5a:  # type: ignore
+        h5a.add_bulk_matrix(list(range(400)), mat)
+        h5a.delete_bulk(list(range(0, 400, 2)))
+        del h5a[1]
+        assert len(h5a) == 199 and 1 not in h5a and 3 in h5a
+        assert h5a.fragmentation == 201 / 400
+    h5a = HDF5VectorStorage[int, np.float64](file.name, "a")  # type: ignore
+    assert len(h5a) == 199 and 0 not in h5a
+    assert list(h5a) == list(range(3, 400, 2))
+    keys, _ = h5a.get_matrix(list(range(10)))
+    assert list(keys) == [3, 5, 7, 9]
+    h5a.add_bulk_matrix([0], mat[:1])
+    assert 0 in h5a and len(h5a) == 200
+    size_before = os.path.getsize(file.name)
+    h5a.compact()
+    assert h5a.fragmentation == 0.0 and len(h5a.index) == 200
+    assert os.path.getsize(file.name) < size_before
+    keys, ret_mat = h5a.get_matrix([0, 5, 399], keep_order=True)
+    assert list(keys) == [0, 5, 399]
+    assert np.allclose(ret_mat, mat[[0, 5, 399]], atol=0.01)
+    # Deletes are persisted without closing the storage
+    h5a.delete_bulk([5])
+    h5a.delete_bulk([7])
+    h5a.add_bulk_matrix([5], mat[5:6])
+    h5r = HDF5VectorStorage[int, np.float64](file.name)  # type: ignore
+    assert len(h5r) == 199 and 5 in h5r and 7 not in h5r
+    h5a.close()
+    os.unlink(file.name)
+
+
+def test_cached_vector_storage():
+    from instancelib.instances.cachedvector import CachedVectorStorage
+    file = tempfile.NamedTemporaryFile(delete=False)
+    file.close()
+    mat = np.random.default_rng().random((100, 16)).astype(np.float32)
+    h5a = HDF5VectorStorage[int, np.float32](file.name, "a", session=True)  # type: ignore
+    h5a.add_bulk_matrix(list(range(100)), mat)
+    # Room for 10 vectors of 16 float32 values
+    cache = CachedVectorStorage(h5a, max_bytes=10 * 16 * 4)
+    keys, ret_mat = cache.get_matrix([5, 3, 4])
+    assert list(keys) == [5, 3, 4] and np.allclose(ret_mat, mat[[5, 3, 4]])
+    assert (cache.hits, cache.misses) == (0, 3)
+    keys, _ = cache.get_vectors([3, 4, 6, 1000])
+    assert list(keys) == [3, 4, 6]
+    assert (cache.hits, cache.misses) == (2, 5)
+    list(cache.get_vectors_chunked(list(range(20, 40)), 5))
+    assert cache.evictions == 14 and cache.nbytes == cache.max_bytes
+    cache.add_bulk_matrix([39], np.zeros((1, 16)))
+    assert np.allclose(cache[39], 0)
+    assert cache.stats()["entries"] == 10
+    keys, empty = cache.get_matrix([1000, 1001])
+    assert list(keys) == [] and empty.shape == (0, 16) and empty.dtype == mat.dtype
+    h5a.close()
+    os.unlink(file.name)
+    # A write that finishes during a cache miss must not leave the old vector cached
+    from instancelib.instances.memoryvectorstorage import DenseMemoryStorage
+    dense = DenseMemoryStorage[int]()
+    dense.add_bulk_matrix([1], np.zeros((1, 2)))
+    cache = CachedVectorStorage(dense)
+    read = dense.get_matrix
+
+    def racing_read(keys):
+        ret_keys, matrix = read(keys)
+        matrix = matrix.copy()
+        cache[1] = np.ones(2)
+        return ret_keys, matrix
+
+    dense.get_matrix = racing_read  # type: ignore
+    cache.get_vectors([1])
+    dense.get_matrix = read  # type: ignore
+    assert np.allclose(cache[1], 1)
+
+
+def test_arrow_storage():
+    import pytest
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq  # type: ignore
+    from instancelib.instances.arrow import (ArrowProviderRO, ArrowVectorStorage,
+                                             vectors_to_arrow)
+    folder = tempfile.mkdtemp()
+    mat = np.random.default_rng().random((250, 8)).astype(np.float32)
+    table = pa.table({
+        "key": pa.array(np.arange(250) * 2),
+        "data": [f"text {i}" for i in range(250)],
+        "vector": vectors_to_arrow(mat),
+    })
+    ipc_path = os.path.join(folder, "data.arrow")
+    with pa.ipc.new_file(ipc_path, table.schema) as writer:
+        for batch in table.to_batches(max_chunksize=100):
+            writer.write_batch(batch)
+    parquet_path = os.path.join(folder, "data.parquet")
+    pq.write_table(table, parquet_path, row_group_size=100)
+    for storage in (ArrowVectorStorage[int, np.float32].from_ipc(ipc_path),
+                    ArrowVectorStorage[int, np.float32].from_parquet(parquet_path)):
+        assert len(storage) == 250 and 4 in storage and 5 not in storage
+        keys, ret_mat = storage.get_matrix([498, 2, 1, 300])
+        assert list(keys) == [498, 2, 300]
+        assert np.array_equal(ret_mat, mat[[249, 1, 150]])
+        chunks = list(storage.matrices_chunker(60))
+        assert [len(k) for k, _ in chunks] == [60, 40] * 2 + [50]
+        assert np.array_equal(np.vstack([m for _, m in chunks]), mat)
+        storage.close()
+    view = ArrowVectorStorage[int, np.float32].from_ipc(ipc_path).get_matrix([10, 12, 14])[1]
+    assert not view.flags.owndata
+    provider = ArrowProviderRO.from_parquet(parquet_path)
+    assert len(provider) == 250
+    assert provider[20].data == "text 10"
+    assert np.array_equal(provider[20].vector, mat[10])
+    assert len(provider.with_vector) == 250 and not provider.without_vector
+    selected = [k for chunk in provider.data_chunker_selector([40, 2, 7, 20], 2) for k, _ in chunk]
+    assert selected == [40, 2, 20]
+    selected = [k for chunk in provider.vector_chunker_selector([40, 2, 20], 2) for k, _ in chunk]
+    assert selected == [40, 2, 20]
+
+
+def test_hdf5_swmr():
+    from io import UnsupportedOperation
+    file = tempfile.NamedTemporaryFile(delete=False)
+    file.close()
+    mat = np.random.default_rng().random((300, 8)).astype(np.float32)
+    writer = HDF5VectorStorage[int, np.float32](file.name, "w", swmr=True)  # type: ignore
+    writer.add_bulk_matrix(list(range(100)), mat[:100])
+    reader = HDF5VectorStorage[int, np.float32](file.name, "r", swmr=True)  # type: ignore
+    assert len(reader) == 100
+    writer.add_bulk_matrix(list(range(100, 250)), mat[100:250])
+    assert len(reader) == 100 and 240 not in reader
+    assert reader.refresh() == 150 and len(reader) == 250
+    keys, ret_mat = reader.get_matrix([240, 5], keep_order=True)
+    assert list(keys) == [240, 5] and np.allclose(ret_mat, mat[[240, 5]])
+    writer[5] = mat[0]
+    reader.reload()
+    assert np.allclose(reader[5], mat[0])
+    try:
+        writer.delete_bulk([1])
+        assert False
+    except UnsupportedOperation:
+        pass
+    writer.close()
+    reader.close()
+    assert len(HDF5VectorStorage[int, np.float32](file.name)) == 250  # type: ignore
+    os.unlink(file.name)
+
+
+def test_hdf5_pool_close_while_borrowed():
+    import threading
+    import h5py  # type: ignore
+    from instancelib.utils.hdf5 import HDF5HandlePool
+    file = tempfile.NamedTemporaryFile(delete=False)
+    file.close()
+    with h5py.File(file.name, "w") as hfile:
+        hfile["data"] = np.arange(10)
+    pool = HDF5HandlePool(file.name, "r", persistent=True, max_readers=1)
+
+    def read(handles):
+        with pool.acquire() as handle:
+            handles.append(handle)
+
+    handles = list()
+    with pool.acquire() as first:
+        pool.close()
+        assert first.file
+        thread = threading.Thread(target=read, args=(handles,))
+        thread.start()
+        thread.join(0.2)
+        # The lent handle still counts towards max_readers
+        assert thread.is_alive() and not handles
+    thread.join()
+    assert not first.file and handles[0].file
+    read(handles)
+    assert handles[1] is handles[0]
+    pool.close()
+    assert not handles[0].file
+    os.unlink(file.name)
+
+
+def test_hdf5_text_provider():
+    import pandas as pd
+    from instancelib.instances.hdf5pandas import HDF5TextProvider
+    data_file = tempfile.NamedTemporaryFile(suffix=".h5", delete=False)
+    vector_file = tempfile.NamedTemporaryFile(suffix=".h5", delete=False)
+    data_file.close()
+    vector_file.close()
+    df = pd.DataFrame({"id": [30, 10, 20, 40], "title": ["a", "b", "c", "d"], "body": ["w", "x", "y", "z"]})
+    df.to_hdf(data_file.name, key="docs", format="table")
+    with HDF5VectorStorage[int, np.float64](vector_file.name, "w") as h5w:  # type: ignore
+        h5w.add_bulk_matrix([10, 20], np.eye(2))
+    provider = HDF5TextProvider(data_file.name, vector_file.name, "docs", "id", ["title", "body"])
+    assert len(provider) == 4 and provider.key_list == [30, 10, 20, 40]
+    assert 20 in provider and 50 not in provider
+    assert provider[20].data == "c y" and np.allclose(provider[20].vector, [0, 1])
+    assert provider[30].vector is None
+    pairs = [pair for chunk in provider.data_chunker_selector([40, 50, 10, 40], 2) for pair in chunk]
+    assert pairs == [(40, "d z"), (10, "b x"), (40, "d z")]
+    assert [len(chunk) for chunk in provider.data_chunker(3)] == [3, 1]
+    instances = [ins.identifier for chunk in provider.instance_chunker(3) for ins in chunk]
+    assert instances == [30, 10, 20, 40]
+    chunks = [[ins.identifier for ins in chunk]
+              for chunk in provider.instance_chunker_selector([20, 50, 60, 70], 2)]
+    assert chunks == [[20]]
+    os.unlink(data_file.name)
+    os.unlink(vector_file.name)